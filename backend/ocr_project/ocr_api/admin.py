@@ -1,9 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.utils.html import format_html
-from django.db.models import Sum, Count, Q
 from django.utils.dateformat import format as date_format
-from .models import OCRFile, UserProfile
+from .analytics import user_usage
+from .models import OCRFile, UserProfile, OCRResultCache
 from datetime import datetime
 from .models import ChatRoom, Message
 
@@ -19,11 +19,19 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = ('sender__username', 'content')
     list_filter = ('is_read',)
 
-    
+
+@admin.register(OCRResultCache)
+class OCRResultCacheAdmin(admin.ModelAdmin):
+    list_display = ('file_sha256', 'model_name', 'size_bytes', 'hit_count', 'last_used_at')
+    search_fields = ('file_sha256',)
+    readonly_fields = ('key', 'file_sha256', 'model_name', 'size_bytes', 'hit_count', 'created_at', 'last_used_at')
+    ordering = ('-last_used_at',)
+
+
 class OCRFileInline(admin.TabularInline):
     model = OCRFile
     extra = 0
-    readonly_fields = ("file_name", "status", "uploaded_at", "pdf_size", "txt_size", "docx_size")
+    readonly_fields = ("file_name", "status", "uploaded_at", "pdf_size", "txt_size", "txt_stored_size", "docx_size")
     fields = ("file_name", "status", "uploaded_at")
     can_delete = True
 
@@ -49,18 +57,23 @@ class OCRFileAdmin(admin.ModelAdmin):
             "classes": ("collapse",)
         }),
         ("Storage Details", {
-            "fields": ("pdf_size", "txt_size", "docx_size", "formatted_total_size", "file_size_breakdown")
+            "fields": ("pdf_size", "txt_size", "txt_stored_size", "docx_size", "formatted_total_size", "file_size_breakdown")
         }),
         ("Timestamps", {
             "fields": ("uploaded_at", "formatted_date"),
             "classes": ("collapse",)
         }),
     )
+
+    def get_queryset(self, request):
+        # user_link shows the uploader on every row
+        return super().get_queryset(request).select_related("user")
     
     def status_badge(self, obj):
         colors = {
             'done': '#28a745',
             'pending': '#ffc107',
+            'processing': '#17a2b8',
             'error': '#dc3545'
         }
         color = colors.get(obj.status, '#6c757d')
@@ -76,13 +89,15 @@ class OCRFileAdmin(admin.ModelAdmin):
     formatted_date.short_description = "Uploaded On"
     
     def formatted_total_size(self, obj):
-        total = obj.pdf_size + obj.txt_size + obj.docx_size
+        total = obj.pdf_size + obj.txt_stored_size + obj.docx_size
         return self._format_bytes(total)
     formatted_total_size.short_description = "Total Size"
     
     def file_size_breakdown(self, obj):
         pdf = self._format_bytes(obj.pdf_size)
         txt = self._format_bytes(obj.txt_size)
+        if obj.txt_stored_size and obj.txt_stored_size != obj.txt_size:
+            txt += f" ({self._format_bytes(obj.txt_stored_size)} stored)"
         docx = self._format_bytes(obj.docx_size)
         return f"<strong>PDF:</strong> {pdf} | <strong>TXT:</strong> {txt} | <strong>DOCX:</strong> {docx}"
     file_size_breakdown.short_description = "File Size Breakdown"
@@ -120,6 +135,10 @@ class UserProfileAdmin(admin.ModelAdmin):
             "fields": ("total_uploads", "total_storage", "upload_stats")
         }),
     )
+
+    def get_queryset(self, request):
+        # Upload stats come from the user's UserUsage row, joined in the same query
+        return super().get_queryset(request).select_related("user", "user__usage")
     
     def username_display(self, obj):
         return format_html('<strong>{}</strong>', obj.user.username)
@@ -150,32 +169,25 @@ class UserProfileAdmin(admin.ModelAdmin):
     role_badge.short_description = "Role"
     
     def total_uploads(self, obj):
-        count = OCRFile.objects.filter(user=obj.user).count()
+        count = user_usage(obj.user).uploads
         return format_html('<span style="font-weight: bold; color: #007bff;">{}</span>', count)
     total_uploads.short_description = "Total Uploads"
     
     def total_storage(self, obj):
-        stats = OCRFile.objects.filter(user=obj.user).aggregate(
-            pdf=Sum('pdf_size'),
-            txt=Sum('txt_size'),
-            docx=Sum('docx_size')
-        )
-        total = (stats['pdf'] or 0) + (stats['txt'] or 0) + (stats['docx'] or 0)
-        return self._format_bytes(total)
+        return self._format_bytes(user_usage(obj.user).total_bytes)
     total_storage.short_description = "Total Storage Used"
     
     def upload_stats(self, obj):
-        stats = OCRFile.objects.filter(user=obj.user).values('status').annotate(count=Count('status'))
-        stats_dict = {s['status']: s['count'] for s in stats}
+        usage = user_usage(obj.user)
         return format_html(
             '<div style="padding: 10px; background-color: #f8f9fa; border-radius: 3px;">'
             '<p><strong style="color: #28a745;">✓ Completed:</strong> {}</p>'
             '<p><strong style="color: #ffc107;">⏳ Pending:</strong> {}</p>'
             '<p><strong style="color: #dc3545;">✗ Error:</strong> {}</p>'
             '</div>',
-            stats_dict.get('done', 0),
-            stats_dict.get('pending', 0),
-            stats_dict.get('error', 0)
+            usage.done,
+            usage.in_progress,
+            usage.errors
         )
     upload_stats.short_description = "Upload Status Summary"
     
@@ -213,6 +225,10 @@ class UserAdmin(admin.ModelAdmin):
         }),
     )
     inlines = [UserProfileInline, OCRFileInline]
+
+    def get_queryset(self, request):
+        # user_stats reads the UserUsage row, joined in the same query
+        return super().get_queryset(request).select_related("usage")
     
     def username_bold(self, obj):
         return format_html('<strong style="font-size: 14px;">{}</strong>', obj.username)
@@ -259,17 +275,7 @@ class UserAdmin(admin.ModelAdmin):
     last_login_display.short_description = "Last Login"
     
     def user_stats(self, obj):
-        file_stats = OCRFile.objects.filter(user=obj).aggregate(
-            count=Count('id'),
-            total_size=Sum('pdf_size') + Sum('txt_size') + Sum('docx_size')
-        )
-        total_files = file_stats['count'] or 0
-        total_size = file_stats['total_size'] or 0
-        formatted_size = self._format_bytes(total_size)
-        
-        status_stats = OCRFile.objects.filter(user=obj).values('status').annotate(count=Count('status'))
-        stats_dict = {s['status']: s['count'] for s in status_stats}
-        
+        usage = user_usage(obj)
         return format_html(
             '<div style="padding: 10px; background-color: #f8f9fa; border-radius: 3px;">'
             '<p><strong>Total Documents:</strong> {}</p>'
@@ -278,11 +284,11 @@ class UserAdmin(admin.ModelAdmin):
             '<p><strong style="color: #ffc107;">⏳ Pending:</strong> {}</p>'
             '<p><strong style="color: #dc3545;">✗ Error:</strong> {}</p>'
             '</div>',
-            total_files,
-            formatted_size,
-            stats_dict.get('done', 0),
-            stats_dict.get('pending', 0),
-            stats_dict.get('error', 0)
+            usage.uploads,
+            self._format_bytes(usage.total_bytes),
+            usage.done,
+            usage.in_progress,
+            usage.errors
         )
     user_stats.short_description = "Activity Statistics"
     
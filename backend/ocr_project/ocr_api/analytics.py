@@ -0,0 +1,257 @@
+"""
+Server-side analytics over the upload history.
+
+``OCRDailyStats`` keeps one row per upload day and uploader, and
+``UserUsage`` one row of totals per user. Whenever a job is created,
+finishes, gains a rendered output or is deleted, ``refresh_file_stats``
+recomputes its day's row and its uploader's counters with a GROUP BY over
+just those ``OCRFile`` rows, so both stay exact without rescanning the
+history. ``analytics_summary`` only aggregates rollup rows, and user lists
+read ``UserUsage`` directly.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import OCRDailyStats, OCRFile, UserUsage
+
+ROLLUP_FIELDS = [
+    "uploads", "done", "errors", "in_progress",
+    "pdf_bytes", "txt_bytes", "docx_bytes", "processing_ms", "timed_jobs",
+]
+USAGE_FIELDS = [
+    "uploads", "done", "errors", "in_progress",
+    "pdf_bytes", "txt_bytes", "docx_bytes", "last_upload_at",
+]
+BUCKETS = {
+    "day": F("day"),
+    "week": TruncWeek("day"),   # Monday of the week
+    "month": TruncMonth("day"),
+}
+
+
+def _file_aggregates():
+    """OCRFile aggregates matching the ``OCRDailyStats`` columns."""
+    return {
+        "uploads": Count("id"),
+        "done": Count("id", filter=Q(status="done")),
+        "errors": Count("id", filter=Q(status="error")),
+        "in_progress": Count("id", filter=Q(status__in=["pending", "processing"])),
+        "pdf_bytes": Coalesce(Sum("pdf_size"), 0),
+        "txt_bytes": Coalesce(Sum("txt_stored_size"), 0),
+        "docx_bytes": Coalesce(Sum("docx_size"), 0),
+        "processing_ms": Coalesce(Sum("timing__total_ms"), 0.0),
+        "timed_jobs": Count("timing__total_ms"),
+    }
+
+
+def _usage_aggregates():
+    """OCRFile aggregates matching the ``UserUsage`` columns."""
+    aggregates = {field: value for field, value in _file_aggregates().items() if field in USAGE_FIELDS}
+    aggregates["last_upload_at"] = Max("uploaded_at")
+    return aggregates
+
+
+def day_bounds(day):
+    """Aware ``[start, end)`` of a calendar day in the current timezone."""
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def refresh_day(day, user_id):
+    """Recompute the rollup row of one day and uploader from its files."""
+    start, end = day_bounds(day)
+    with transaction.atomic():
+        # Lock the row before aggregating, as refresh_user_usage does, so
+        # concurrent refreshes of one day are applied in order and the last
+        # one sees every change
+        locked = OCRDailyStats.objects.select_for_update()
+        if user_id is None:
+            # NULLs don't collide in the unique constraint: lock whatever rows
+            # exist and replace them rather than upsert
+            rows = list(locked.filter(day=day, user=None))
+        else:
+            rows = [locked.get_or_create(day=day, user_id=user_id)[0]]
+        values = OCRFile.objects.filter(
+            user_id=user_id, uploaded_at__gte=start, uploaded_at__lt=end
+        ).aggregate(**_file_aggregates())
+
+        if not values["uploads"] or user_id is None:
+            OCRDailyStats.objects.filter(id__in=[row.id for row in rows]).delete()
+            if values["uploads"]:
+                OCRDailyStats.objects.create(day=day, user=None, **values)
+        else:
+            stats = rows[0]
+            for field, value in values.items():
+                setattr(stats, field, value)
+            stats.save()
+
+
+def refresh_user_usage(user_id):
+    """Recompute the ``UserUsage`` counters of one user from their files."""
+    if user_id is None:
+        return
+    with transaction.atomic():
+        # Lock the row before aggregating, so concurrent refreshes of one
+        # user are applied in order and the last one sees every change
+        usage, _ = UserUsage.objects.select_for_update().get_or_create(user_id=user_id)
+        values = OCRFile.objects.filter(user_id=user_id).aggregate(**_usage_aggregates())
+        for field, value in values.items():
+            setattr(usage, field, value)
+        usage.save()
+
+
+def refresh_file_stats(ocr_file):
+    """Recompute the rollup row and user counters ``ocr_file`` counts towards."""
+    if ocr_file.uploaded_at is not None:
+        refresh_day(timezone.localdate(ocr_file.uploaded_at), ocr_file.user_id)
+    refresh_user_usage(ocr_file.user_id)
+
+
+def user_usage(user):
+    """The ``UserUsage`` of ``user``; an unsaved, all-zero one if they never uploaded."""
+    try:
+        return user.usage
+    except UserUsage.DoesNotExist:
+        return UserUsage(user=user)
+
+
+def daily_groups(files):
+    """
+    Fold ``files`` into ``{(day, user_id): rollup values}`` in one pass.
+
+    Days are taken in Python with ``timezone.localdate``, the same calendar
+    as ``day_bounds``; truncating in SQL would need the database's time zone
+    tables (MySQL's CONVERT_TZ returns NULL without them).
+    """
+    groups = {}
+    rows = files.values_list(
+        "uploaded_at", "user_id", "status", "pdf_size", "txt_stored_size", "docx_size", "timing__total_ms"
+    ).order_by().iterator(chunk_size=2000)
+    for uploaded_at, user_id, status, pdf_size, txt_size, docx_size, total_ms in rows:
+        key = (timezone.localdate(uploaded_at), user_id)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {field: 0 for field in ROLLUP_FIELDS}
+            group["processing_ms"] = 0.0
+        group["uploads"] += 1
+        if status == "done":
+            group["done"] += 1
+        elif status == "error":
+            group["errors"] += 1
+        else:
+            group["in_progress"] += 1
+        group["pdf_bytes"] += pdf_size
+        group["txt_bytes"] += txt_size
+        group["docx_bytes"] += docx_size
+        if total_ms is not None:
+            group["processing_ms"] += total_ms
+            group["timed_jobs"] += 1
+    return groups
+
+
+def rebuild_daily_stats():
+    """Recompute the whole rollup in one pass over the history. Returns the row count."""
+    rows = [
+        OCRDailyStats(day=day, user_id=user_id, **values)
+        for (day, user_id), values in daily_groups(OCRFile.objects.all()).items()
+    ]
+    with transaction.atomic():
+        OCRDailyStats.objects.all().delete()
+        OCRDailyStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_user_usage():
+    """Recompute every user's counters with one GROUP BY. Returns the row count."""
+    groups = (
+        OCRFile.objects
+        .exclude(user=None)
+        .values("user_id")
+        .annotate(**_usage_aggregates())
+        .order_by()
+    )
+    rows = [UserUsage(user_id=group["user_id"], **{f: group[f] for f in USAGE_FIELDS}) for group in groups]
+    with transaction.atomic():
+        UserUsage.objects.all().delete()
+        UserUsage.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _sums():
+    return {field: Coalesce(Sum(field), 0.0 if field == "processing_ms" else 0) for field in ROLLUP_FIELDS}
+
+
+def _avg_ms(values):
+    return round(values["processing_ms"] / values["timed_jobs"], 1) if values["timed_jobs"] else None
+
+
+def analytics_summary(user=None, date_from=None, date_to=None, bucket="day", top_users=0):
+    """
+    Upload analytics from the rollup, optionally for one ``user`` and an
+    inclusive ``date_from``/``date_to`` day range: a time series in
+    ``bucket`` periods, status and storage totals, and the ``top_users``
+    uploaders (0 to skip).
+    """
+    rows = OCRDailyStats.objects.all()
+    if user is not None:
+        rows = rows.filter(user=user)
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+
+    series = (
+        rows.annotate(period=BUCKETS[bucket])
+        .values("period")
+        .annotate(**_sums())
+        .order_by("period")
+    )
+    totals = rows.aggregate(**_sums())
+
+    result = {
+        "bucket": bucket,
+        "series": [
+            {
+                "period": item["period"].isoformat(),
+                "total": item["uploads"],
+                "done": item["done"],
+                "error": item["errors"],
+                "in_progress": item["in_progress"],
+                "avg_processing_ms": _avg_ms(item),
+            }
+            for item in series
+        ],
+        "status": {
+            "total": totals["uploads"],
+            "done": totals["done"],
+            "error": totals["errors"],
+            "in_progress": totals["in_progress"],
+        },
+        "storage": {
+            "pdf": totals["pdf_bytes"],
+            "txt": totals["txt_bytes"],
+            "docx": totals["docx_bytes"],
+            "total": totals["pdf_bytes"] + totals["txt_bytes"] + totals["docx_bytes"],
+        },
+        "avg_processing_ms": _avg_ms(totals),
+    }
+
+    if top_users:
+        top = (
+            rows.exclude(user=None)
+            .values("user__username")
+            .annotate(
+                uploads=Sum("uploads"),
+                storage=Sum(F("pdf_bytes") + F("txt_bytes") + F("docx_bytes")),
+            )
+            .order_by("-uploads", "user__username")[:top_users]
+        )
+        result["top_users"] = [
+            {"username": item["user__username"], "uploads": item["uploads"], "storage": item["storage"]}
+            for item in top
+        ]
+    return result
@@ -1,6 +1,14 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class OcrApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ocr_api'
+
+    def ready(self):
+        # Large uploads are spooled here; Django refuses to start if it is missing
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
@@ -0,0 +1,238 @@
+"""
+Pluggable OCR engines.
+
+The pipeline only talks to an ``OCRBackend``; which one is used comes from the
+``OCR_BACKEND`` setting (a dotted path) and ``OCR_BACKEND_OPTIONS`` (keyword
+arguments for its constructor). That keeps the Mistral client out of module
+import time, so the app and its tests start without an API key.
+
+- ``MistralBackend``   the hosted Mistral OCR API (default)
+- ``FakeOCRBackend``   deterministic stand-in with simulated latency, for CI and load tests
+- ``TesseractBackend`` offline engine, needs ``pytesseract`` and ``pdf2image`` installed
+"""
+from pathlib import Path
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from dotenv import load_dotenv
+from pypdf import PdfReader
+
+from .timing import timed
+
+
+def page_result(markdown, width=None, height=None, dpi=None, images=None):
+    """
+    One OCR'd page as returned by ``OCRBackend.process``: the markdown plus
+    whatever layout the engine reports (pixel dimensions, DPI and image
+    references without the image data).
+    """
+    return {
+        "markdown": markdown,
+        "width": width,
+        "height": height,
+        "dpi": dpi,
+        "images": images or [],
+    }
+
+
+def count_pages(input_path):
+    """Page count of a PDF, or None for images and unreadable files."""
+    if Path(input_path).suffix.lower() != ".pdf":
+        return None
+    try:
+        return len(PdfReader(input_path).pages)
+    except Exception:
+        return None
+
+
+class OCRBackend:
+    """
+    Interface every OCR engine implements.
+
+    ``prepare`` is called once per document and returns an opaque handle;
+    ``process`` may then be called several times (concurrently) with page
+    ranges of that document.
+    """
+    # Part of the result cache key, so results from different engines never mix
+    model_name = ""
+    options = {}
+
+    def prepare(self, input_path, file_name):
+        return input_path
+
+    def page_count(self, input_path):
+        return count_pages(input_path)
+
+    def process(self, handle, pages=None):
+        """Return ``page_result`` dicts for ``pages`` (0-based, None for all) in page order."""
+        raise NotImplementedError
+
+    def should_retry(self, exc):
+        """Whether a page range that raised ``exc`` is worth retrying (see ``pipeline.ocr_pages``)."""
+        return True
+
+
+class MistralBackend(OCRBackend):
+    model_name = "mistral-ocr-latest"
+    options = {"include_image_base64": False}
+
+    def __init__(self, api_key=None, model=None, server_url=None, client_options=None):
+        from .mistral_client import MistralClient
+
+        # Load API key from .env
+        load_dotenv()
+        api_key = api_key or os.getenv("MISTRAL_API_KEY")
+        if not api_key:
+            raise ImproperlyConfigured("MISTRAL_API_KEY not found in .env")
+        if model:
+            self.model_name = model
+        # Pooled, rate-limited and retrying; shared by every thread using this backend
+        self.client = MistralClient(
+            api_key,
+            server_url=server_url or os.getenv("MISTRAL_SERVER_URL") or None,
+            **{**getattr(settings, "MISTRAL_CLIENT_OPTIONS", {}), **(client_options or {})},
+        )
+
+    def prepare(self, input_path, file_name):
+        # Upload to Mistral Files API
+        with timed("remote_upload"):
+            uploaded = self.client.upload_file(input_path, file_name)
+        with timed("signed_url"):
+            signed = self.client.signed_url(uploaded.id, expiry=1)
+        return signed.url
+
+    def should_retry(self, exc):
+        # MistralClient already retried whatever was retryable; the rest (bad
+        # key, invalid pages, ...) fails the same way every time
+        return False
+
+    def process(self, handle, pages=None):
+        extra = {"pages": pages} if pages is not None else {}
+        ocr_response = self.client.process(
+            model=self.model_name,
+            document={"type": "document_url", "document_url": handle},
+            **self.options,
+            **extra
+        )
+        results = []
+        for page in sorted(ocr_response.pages, key=lambda page: page.index):
+            dimensions = page.dimensions
+            images = [
+                {
+                    "id": image.id,
+                    "bbox": [image.top_left_x, image.top_left_y, image.bottom_right_x, image.bottom_right_y],
+                }
+                for image in page.images or []
+            ]
+            results.append(page_result(
+                page.markdown,
+                width=dimensions.width if dimensions else None,
+                height=dimensions.height if dimensions else None,
+                dpi=dimensions.dpi if dimensions else None,
+                images=images,
+            ))
+        return results
+
+
+class FakeOCRBackend(OCRBackend):
+    """
+    Deterministic offline backend for CI and benchmarking.
+
+    Sleeps ``latency + page_latency * pages`` per call and returns markdown
+    derived from the file contents, so identical uploads give identical text.
+    Non-PDF inputs are treated as ``pages`` pages long.
+    """
+    model_name = "fake-ocr"
+
+    def __init__(self, latency=0.0, page_latency=0.0, pages=1):
+        self.latency = latency
+        self.page_latency = page_latency
+        self.pages = pages
+        self.options = {"pages": pages}
+
+    def prepare(self, input_path, file_name):
+        digest = hashlib.sha256(Path(input_path).read_bytes()).hexdigest()
+        count = count_pages(input_path) or self.pages
+        return {"file_name": file_name, "digest": digest, "pages": count}
+
+    def page_count(self, input_path):
+        return count_pages(input_path) or self.pages
+
+    def process(self, handle, pages=None):
+        if pages is None:
+            pages = list(range(handle["pages"]))
+        time.sleep(self.latency + self.page_latency * len(pages))
+        return [
+            page_result(
+                f"# {handle['file_name']}\n\nPage {index + 1} of {handle['pages']} ({handle['digest'][:12]})",
+                width=1700, height=2200, dpi=200,
+            )
+            for index in pages
+        ]
+
+
+class TesseractBackend(OCRBackend):
+    """Local Tesseract engine. PDFs are rasterised page by page with pdf2image."""
+    model_name = "tesseract"
+
+    def __init__(self, lang="eng", dpi=300):
+        try:
+            import pytesseract
+            from pdf2image import convert_from_path
+            from PIL import Image
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "TesseractBackend needs pytesseract, pdf2image and Pillow installed"
+            ) from exc
+        self._pytesseract = pytesseract
+        self._convert_from_path = convert_from_path
+        self._image = Image
+        self.lang = lang
+        self.dpi = dpi
+        self.options = {"lang": lang, "dpi": dpi}
+
+    def process(self, handle, pages=None):
+        if Path(handle).suffix.lower() != ".pdf":
+            images = [self._image.open(handle)]
+        elif pages is None:
+            images = self._convert_from_path(handle, dpi=self.dpi)
+        else:
+            # pdf2image pages are 1-based and inclusive
+            images = self._convert_from_path(
+                handle, dpi=self.dpi, first_page=pages[0] + 1, last_page=pages[-1] + 1
+            )
+        return [
+            page_result(
+                self._pytesseract.image_to_string(image, lang=self.lang),
+                width=image.width, height=image.height, dpi=self.dpi,
+            )
+            for image in images
+        ]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the configured OCR backend, created once per process."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend_class = import_string(
+                getattr(settings, "OCR_BACKEND", "ocr_api.backends.MistralBackend")
+            )
+            _backend = backend_class(**getattr(settings, "OCR_BACKEND_OPTIONS", {}))
+        return _backend
+
+
+def reset_backend():
+    """Forget the cached backend (e.g. after changing settings in tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = None
@@ -0,0 +1,150 @@
+"""
+Content-addressed cache of OCR results.
+
+Entries are keyed by the SHA-256 of the uploaded bytes plus the OCR model and
+options, and live in the ``OCRResultCache`` table. When the table grows past
+``OCR_CACHE_MAX_BYTES`` / ``OCR_CACHE_MAX_ENTRIES`` the least recently used
+entries are evicted.
+"""
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.db.models import F, Sum, Count
+from django.utils import timezone
+
+from .backends import page_result
+from .metrics import CACHE_LOOKUPS
+from .models import OCRResultCache
+
+# Pages are stored joined, as in the markdown output, with their start offsets
+PAGE_SEPARATOR = "\n\n"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def cache_enabled():
+    return getattr(settings, "OCR_CACHE_ENABLED", True)
+
+
+def cache_key(file_sha256, model_name, options=None):
+    """Combine the file hash with the model and options into one cache key."""
+    payload = json.dumps(
+        {"sha256": file_sha256, "model": model_name, "options": options or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    CACHE_LOOKUPS.inc(result="hit" if name == "hits" else "miss")
+
+
+def join_pages(pages):
+    """Join page markdown into one document plus the offsets where pages 2..n start."""
+    breaks = []
+    offset = 0
+    for page in pages[:-1]:
+        offset += len(page) + len(PAGE_SEPARATOR)
+        breaks.append(offset)
+    return PAGE_SEPARATOR.join(pages), breaks
+
+
+def split_pages(text, breaks):
+    """Inverse of ``join_pages``. Entries without breaks come back as a single page."""
+    starts = [0] + list(breaks)
+    ends = [start - len(PAGE_SEPARATOR) for start in breaks] + [len(text)]
+    return [text[start:end] for start, end in zip(starts, ends)]
+
+
+def entry_pages(entry):
+    """The ``page_result`` dicts stored in a cache entry."""
+    markdown = split_pages(entry.text, entry.page_breaks)
+    meta = entry.page_meta if len(entry.page_meta) == len(markdown) else [{}] * len(markdown)
+    return [page_result(text, **page_meta) for text, page_meta in zip(markdown, meta)]
+
+
+def get_cached_pages(file_sha256, model_name, options=None):
+    """Return cached ``page_result`` dicts for this file/model/options, or None on a miss."""
+    if not cache_enabled() or not file_sha256:
+        return None
+
+    key = cache_key(file_sha256, model_name, options)
+    entry = OCRResultCache.objects.filter(key=key).only("id", "text", "page_breaks", "page_meta").first()
+    if entry is None:
+        _count("misses")
+        return None
+
+    OCRResultCache.objects.filter(id=entry.id).update(
+        hit_count=F("hit_count") + 1, last_used_at=timezone.now()
+    )
+    _count("hits")
+    return entry_pages(entry)
+
+
+def store_pages(file_sha256, model_name, pages, options=None):
+    """Save OCR ``page_result`` dicts in the cache and evict old entries if over budget."""
+    if not cache_enabled() or not file_sha256:
+        return
+
+    text, breaks = join_pages([page["markdown"] for page in pages])
+    meta = [{k: v for k, v in page.items() if k != "markdown"} for page in pages]
+    OCRResultCache.objects.update_or_create(
+        key=cache_key(file_sha256, model_name, options),
+        defaults={
+            "file_sha256": file_sha256,
+            "model_name": model_name,
+            "text": text,
+            "page_breaks": breaks,
+            "page_meta": meta,
+            "size_bytes": len(text.encode("utf-8")),
+            "last_used_at": timezone.now(),
+        },
+    )
+    evict()
+
+
+def evict():
+    """Drop least recently used entries until the cache fits its limits."""
+    max_bytes = getattr(settings, "OCR_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+    max_entries = getattr(settings, "OCR_CACHE_MAX_ENTRIES", 10000)
+
+    totals = OCRResultCache.objects.aggregate(entries=Count("id"), size=Sum("size_bytes"))
+    entries = totals["entries"] or 0
+    size = totals["size"] or 0
+    if entries <= max_entries and size <= max_bytes:
+        return 0
+
+    evicted = []
+    oldest_first = OCRResultCache.objects.order_by("last_used_at").values_list("id", "size_bytes")
+    for entry_id, entry_size in oldest_first.iterator():
+        if entries <= max_entries and size <= max_bytes:
+            break
+        evicted.append(entry_id)
+        entries -= 1
+        size -= entry_size
+
+    OCRResultCache.objects.filter(id__in=evicted).delete()
+    return len(evicted)
+
+
+def cache_stats():
+    """Hit/miss counters for this process plus totals for the whole cache."""
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    totals = OCRResultCache.objects.aggregate(
+        entries=Count("id"), size=Sum("size_bytes"), hits=Sum("hit_count")
+    )
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        "entries": totals["entries"] or 0,
+        "size_bytes": totals["size"] or 0,
+        "total_hits": totals["hits"] or 0,
+    }
@@ -0,0 +1,85 @@
+"""
+Optional compression of stored text artifacts.
+
+With ``OCR_TEXT_COMPRESSION = "gzip"`` or ``"zstd"`` the canonical markdown is
+written as ``ocr_<name>.md.gz`` / ``.md.zst``. OCR text typically shrinks
+5-10x. Downloads send the compressed bytes as-is with ``Content-Encoding``
+when the client accepts that coding, and decompress on the fly otherwise
+(see ``downloads.py``). zstd needs the ``zstandard`` package.
+"""
+from pathlib import Path
+import gzip
+import io
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .storage import get_storage
+
+# Content-Encoding token -> file suffix
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise ImproperlyConfigured("zstd text compression needs the zstandard package installed") from exc
+    return zstandard
+
+
+def text_encoding():
+    """The configured encoding for new text artifacts, or None to store them raw."""
+    encoding = getattr(settings, "OCR_TEXT_COMPRESSION", None)
+    if encoding not in (None, *SUFFIXES):
+        raise ImproperlyConfigured(f"OCR_TEXT_COMPRESSION must be one of {list(SUFFIXES)} or None")
+    return encoding
+
+
+def path_encoding(path):
+    """Encoding of a stored file, from its suffix (None for raw files)."""
+    suffix = Path(path).suffix
+    for encoding, encoding_suffix in SUFFIXES.items():
+        if suffix == encoding_suffix:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0 makes identical text compress to identical bytes, and so the same ETag
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    return data
+
+
+def decode_stream(fileobj, encoding):
+    """Wrap a binary file object so reads return its decompressed bytes."""
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if encoding == "zstd":
+        return io.BufferedReader(_zstd().ZstdDecompressor().stream_reader(fileobj, closefd=True))
+    return fileobj
+
+
+def open_decoded(name):
+    """Open a stored file (see ``storage.py``) for reading its logical, decompressed bytes."""
+    return decode_stream(get_storage().open(name, "rb"), path_encoding(name))
+
+
+def accepts_encoding(request, encoding):
+    """Whether the request's ``Accept-Encoding`` allows ``encoding`` (q > 0)."""
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    for item in header.split(","):
+        token, _, params = item.strip().partition(";")
+        if token.strip().lower() not in (encoding, "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
@@ -0,0 +1,74 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.db.models import Q
+
+from .models import ChatRoom
+from .realtime import bind_server_loop, chat_group, jobs_group
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live events for one ChatRoom: new, edited and deleted-for-everyone
+    messages, and read receipts.
+
+    Connect to ``ws/chat/<room_id>/?token=<JWT access token>``. Sending still
+    goes through the REST endpoints; this socket is receive-only.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        self.room_id = self.scope["url_route"]["kwargs"]["room_id"]
+
+        if not user or not user.is_authenticated or not await self.is_member(user):
+            await self.close(code=4403)
+            return
+
+        self.group_name = chat_group(self.room_id)
+        bind_server_loop()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def chat_event(self, event):
+        await self.send_json({"event": event["event"], "message": event["message"]})
+
+    async def chat_read(self, event):
+        await self.send_json({"event": "messages.read", "reader": event["reader"], "up_to": event["up_to"]})
+
+    @database_sync_to_async
+    def is_member(self, user):
+        return ChatRoom.objects.filter(
+            Q(user1=user) | Q(user2=user), id=self.room_id
+        ).exists()
+
+
+class JobProgressConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Stage transitions of the connected user's OCR jobs (queued, uploading,
+    ocr with page counts, rendering, done/error), pushed by the workers.
+
+    Connect to ``ws/jobs/?token=<JWT access token>``. Events for jobs that
+    changed before the socket opened are not replayed; fetch
+    ``jobs/<id>/`` once after connecting to catch up.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.group_name = jobs_group(user.id)
+        bind_server_loop()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def job_progress(self, event):
+        await self.send_json({"event": "job.progress", "job": event["job"]})
@@ -0,0 +1,213 @@
+"""
+Serving stored OCR artifacts.
+
+``serve_file`` adds what a plain ``FileResponse`` lacks for large outputs:
+strong ETags and Last-Modified (so repeat downloads are a 304), single
+byte-range requests (206, so interrupted downloads resume), and an optional
+hand-off of the bytes to the front proxy via ``X-Accel-Redirect`` (nginx) or
+``X-Sendfile`` (Apache/lighttpd), per ``OCR_DOWNLOAD_OFFLOAD``. Compressed
+text artifacts (``compression.py``) are passed through with
+``Content-Encoding`` or decompressed, depending on ``Accept-Encoding``. With
+remote storage and ``OCR_STORAGE_PRESIGNED_DOWNLOADS`` clients are redirected
+to a presigned URL and fetch the bytes from the object store directly.
+"""
+from pathlib import Path
+from urllib.parse import quote
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_etags, parse_http_date_safe
+
+from .compression import accepts_encoding, open_decoded, path_encoding
+from .storage import get_storage, local_path
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(digest, coding=""):
+    """
+    Strong ETag for a stored artifact, from the SHA-256 of its stored bytes
+    (recorded when it is written, see ``renderers.py``), so identical content
+    keeps its tag across rewrites. ``coding`` tells the compressed and
+    decompressed representations of one file apart.
+    """
+    tag = f"{digest[:32]}-{coding}" if coding else digest[:32]
+    return f'"{tag}"'
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """
+    Whether a client's partial copy, identified by its ``If-Range`` header,
+    is still current. An entity tag must match ours strongly (RFC 9110
+    13.1.5, so weak tags never do); a date must equal Last-Modified.
+    """
+    if if_range.startswith(('"', 'W/"')):
+        return etag in parse_etags(if_range)
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def stored_stat(name):
+    """``(local_path, size, mtime_ns)`` of a stored file; ``local_path`` is None on remote storage."""
+    path = local_path(name)
+    if path is not None:
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+    storage = get_storage()
+    modified = storage.get_modified_time(name)
+    return None, storage.size(name), int(modified.timestamp()) * 10**9
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns None to serve the whole file (no header, a multi-range request
+    or a unit we don't support) and raises ValueError if it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _read_range(name, start, end):
+    with get_storage().open(name, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _read_decoded(name):
+    with open_decoded(name) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _offload_response(path):
+    if path is None:
+        return None
+    mode = getattr(settings, "OCR_DOWNLOAD_OFFLOAD", None)
+    if mode == "x-accel-redirect":
+        # nginx maps this internal location onto MEDIA_ROOT
+        relative = Path(path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+        prefix = getattr(settings, "OCR_DOWNLOAD_ACCEL_PREFIX", "/protected-media/")
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = quote(prefix.rstrip("/") + "/" + relative.as_posix())
+        return response
+    if mode == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = str(Path(path).resolve())
+        return response
+    return None
+
+
+def _presigned_redirect(name, download_name, encoding):
+    storage = get_storage()
+    if not getattr(settings, "OCR_STORAGE_PRESIGNED_DOWNLOADS", False) or not hasattr(storage, "presigned_url"):
+        return None
+    content_type, _ = mimetypes.guess_type(download_name)
+    url = storage.presigned_url(
+        name,
+        download_name=download_name,
+        content_type=content_type or "application/octet-stream",
+        content_encoding=encoding,
+    )
+    response = HttpResponseRedirect(url)
+    # The URL expires, so the redirect itself must not be cached
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def serve_file(request, name, download_name, digest):
+    """
+    Return a conditional, range-aware (or offloaded) attachment response for
+    the stored file ``name``, whose bytes hash to ``digest``. Compressed text
+    artifacts are sent with ``Content-Encoding`` if the client accepts it,
+    else decompressed on the fly.
+    """
+    path, size, mtime_ns = stored_stat(name)
+    encoding = path_encoding(name)
+    send_stored = encoding is None or accepts_encoding(request, encoding)
+    etag = file_etag(digest, "" if send_stored else "identity")
+    last_modified = mtime_ns // 10**9
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None and send_stored:
+        if path is None:
+            redirect = _presigned_redirect(name, download_name, encoding)
+            if redirect is not None:
+                return redirect
+        response = _offload_response(path)
+    if response is None:
+        if send_stored:
+            response = _file_response(request, name, size, etag, last_modified)
+        else:
+            response = StreamingHttpResponse(_read_decoded(name))
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Ranges are offsets into the stored bytes, so not offered while decompressing
+    response["Accept-Ranges"] = "bytes" if send_stored else "none"
+    # Private to the user, but revalidated with the ETag instead of re-downloaded
+    response["Cache-Control"] = "private, no-cache"
+    if encoding is not None:
+        response["Vary"] = "Accept-Encoding"
+    if response.status_code in (200, 206):
+        content_type, _ = mimetypes.guess_type(download_name)
+        response["Content-Type"] = content_type or "application/octet-stream"
+        response["Content-Disposition"] = content_disposition_header(True, download_name)
+        if encoding is not None and send_stored:
+            response["Content-Encoding"] = encoding
+    return response
+
+
+def _file_response(request, name, size, etag, last_modified):
+    range_header = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if range_header and if_range and not if_range_matches(if_range, etag, last_modified):
+        # The client's partial copy is stale: send the whole file
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        return FileResponse(get_storage().open(name, "rb"))
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(name, start, end), status=206)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    return response
@@ -0,0 +1,95 @@
+"""
+Streaming ZIP export of OCR outputs.
+
+``zip_stream`` builds the archive incrementally: ``zipfile`` writes into a
+small buffer that is drained after every chunk, and entries use data
+descriptors because the output is never seeked. Memory stays at roughly one
+read chunk no matter how many files or how large the archive gets.
+"""
+import zipfile
+
+from django.utils import timezone
+
+from .compression import open_decoded
+from .renderers import ensure_artifact
+from .storage import get_storage
+
+CHUNK_SIZE = 64 * 1024
+
+# Formats that are already compressed are stored as-is; deflating them again
+# costs CPU for no gain
+STORED_FORMATS = {"pdf", "docx"}
+
+
+class _StreamBuffer:
+    """Write-only file object for ``ZipFile`` whose contents are drained by the caller."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Yield (at most one chunk of) everything written since the last drain."""
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks = []
+            yield data
+
+
+def export_entries(ocr_files, formats, prefix_user=False):
+    """
+    Yield ``(ocr_file, ext, arcname)`` for every requested output of every file.
+    With ``prefix_user`` entries go under a ``<username>/`` folder. Files
+    whose names only differ in extension (``a.pdf``, ``a.png``) would share
+    an arcname, so later ones get their job id appended.
+    """
+    seen = set()
+    for ocr_file in ocr_files:
+        stem = ocr_file.file_name.rsplit(".", 1)[0]
+        folder = f"{ocr_file.user.username}/" if prefix_user and ocr_file.user else ""
+        for ext in formats:
+            if ext in ocr_file.output_formats:
+                arcname = f"{folder}ocr_{stem}.{ext}"
+                suffix = f"_{ocr_file.id}"
+                while arcname in seen:
+                    arcname = f"{folder}ocr_{stem}{suffix}.{ext}"
+                    suffix += f"_{ocr_file.id}"
+                seen.add(arcname)
+                yield ocr_file, ext, arcname
+
+
+def zip_stream(entries):
+    """Yield a ZIP archive of ``export_entries`` output chunk by chunk."""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w") as archive:
+        for ocr_file, ext, arcname in entries:
+            # PDF/DOCX that were never downloaded are rendered on the way out
+            name = ensure_artifact(ocr_file, ext)
+            if name is None:
+                continue
+
+            modified = timezone.localtime(get_storage().get_modified_time(name))
+            info = zipfile.ZipInfo(arcname, date_time=modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED if ext in STORED_FORMATS else zipfile.ZIP_DEFLATED
+            # Compressed text artifacts go into the archive decompressed
+            with open_decoded(name) as src, archive.open(info, mode="w", force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    # Central directory, written when the archive is closed
+    yield from buffer.drain()
@@ -0,0 +1,283 @@
+"""
+Background OCR job queue.
+
+``OCRUploadView`` only stores the upload and creates an ``OCRFile`` row in
+``pending``. Workers claim pending rows with a conditional UPDATE, so the
+database itself is the queue and several processes (web workers or
+``manage.py run_ocr_worker``) can share it without an external broker.
+
+Set ``OCR_JOB_QUEUE = "thread"`` to skip DB polling and hand jobs straight to
+an in-process thread pool instead. Either way, server processes call
+``resume_jobs`` at startup so jobs orphaned by a restart are picked up again.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import OCRFile
+from .pipeline import process_ocr_file, set_stage
+from .analytics import refresh_file_stats
+from .metrics import OCR_JOBS, OCR_PAGES
+from .realtime import broadcast_job_event
+from .renderers import delete_artifacts
+from .storage import delete_file
+from .timing import collect_timings, save_timings, timed
+from .uploads import apply_retention
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_workers = []
+_executor = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def claim_job(job_id):
+    """Atomically move a job from pending to processing. Returns True if we won it."""
+    return OCRFile.objects.filter(id=job_id, status="pending").update(
+        status="processing", started_at=timezone.now()
+    ) == 1
+
+
+def claim_next_job():
+    """
+    Claim the oldest pending job, or return None if the queue is empty.
+
+    Users already running ``OCR_MAX_JOBS_PER_USER`` jobs are skipped, so one
+    big batch cannot starve everybody else's uploads.
+    """
+    batch = _setting("OCR_WORKER_THREADS", 2) * 2
+    pending = OCRFile.objects.filter(status="pending")
+
+    per_user_cap = _setting("OCR_MAX_JOBS_PER_USER", 0)
+    if per_user_cap:
+        busy_users = (
+            OCRFile.objects
+            .filter(status="processing")
+            .values("user")
+            .annotate(running=Count("id"))
+            .filter(running__gte=per_user_cap)
+            .values("user")
+        )
+        pending = pending.exclude(user__in=busy_users)
+
+    candidates = pending.order_by("uploaded_at", "id").values_list("id", flat=True)[:batch]
+    for job_id in candidates:
+        if claim_job(job_id):
+            return job_id
+    return None
+
+
+def requeue_stale_jobs():
+    """Put jobs left in processing by a crashed worker back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=_setting("OCR_JOB_STALE_AFTER", 3600))
+    return OCRFile.objects.filter(status="processing", started_at__lt=cutoff).update(
+        status="pending", stage="queued", started_at=None, page_count=None, pages_done=0
+    )
+
+
+class JobAborted(Exception):
+    """The job's row was deleted while the job ran."""
+
+
+def _finish_job(ocr_file, timings):
+    """Mark a processed job done, or raise ``JobAborted`` if its row is gone."""
+    ocr_file.status = "done"
+    ocr_file.stage = "done"
+    ocr_file.error_message = ""
+    ocr_file.finished_at = timezone.now()
+    with transaction.atomic():
+        with timed("db_write"):
+            # Not save(): that would INSERT the row again if it was deleted meanwhile
+            updated = OCRFile.objects.filter(id=ocr_file.id, status="processing").update(
+                status=ocr_file.status,
+                stage=ocr_file.stage,
+                error_message=ocr_file.error_message,
+                finished_at=ocr_file.finished_at,
+                txt_size=ocr_file.txt_size,
+                txt_stored_size=ocr_file.txt_stored_size,
+                output_digests=ocr_file.output_digests,
+            )
+        if not updated:
+            raise JobAborted(ocr_file.id)
+        save_timings(ocr_file, timings)
+        refresh_file_stats(ocr_file)
+
+
+def _fail_job(ocr_file, timings, exc):
+    # The status change and the counters it feeds commit together
+    with transaction.atomic():
+        set_stage(
+            ocr_file, "error", status="error", error_message=str(exc), finished_at=timezone.now()
+        )
+        save_timings(ocr_file, timings)
+        refresh_file_stats(ocr_file)
+    OCR_JOBS.inc(status="error")
+    apply_retention(ocr_file, failed=True)
+
+
+def _discard_job(ocr_file):
+    """Clean up after a job whose row was deleted while it ran."""
+    # Unless a new upload of the same name already took over the output names
+    if not OCRFile.objects.filter(user_id=ocr_file.user_id, file_name=ocr_file.file_name).exists():
+        delete_artifacts(ocr_file)
+    delete_file(ocr_file.input_path)
+
+
+def mark_job_failed(job_id, exc):
+    """Last resort for a job whose own error handling failed: flag it errored if it still runs."""
+    try:
+        OCRFile.objects.filter(id=job_id, status="processing").update(
+            status="error", stage="error", error_message=str(exc), finished_at=timezone.now()
+        )
+    except Exception:
+        logger.exception("Failed to mark OCR job %s as errored", job_id)
+
+
+def execute_job(job_id):
+    """Run a claimed job to completion and record done/error on its row."""
+    ocr_file = None
+    with collect_timings() as timings:
+        try:
+            ocr_file = OCRFile.objects.get(id=job_id)
+            process_ocr_file(ocr_file)
+            _finish_job(ocr_file, timings)
+        except Exception as exc:
+            # Deleting the row mid-job also surfaces as an IntegrityError from the page writes
+            deleted = isinstance(exc, (OCRFile.DoesNotExist, JobAborted))
+            if deleted or not OCRFile.objects.filter(id=job_id).exists():
+                logger.warning("OCR job %s was deleted while it ran", job_id)
+                if ocr_file is not None:
+                    _discard_job(ocr_file)
+                return
+            if ocr_file is None:
+                raise
+            logger.exception("OCR job %s failed", job_id)
+            _fail_job(ocr_file, timings, exc)
+            return
+
+    OCR_JOBS.inc(status="done")
+    OCR_PAGES.inc(ocr_file.page_count or 0, source="cache" if timings.cache_hit else "ocr")
+    broadcast_job_event(ocr_file)
+    apply_retention(ocr_file)
+
+
+def run_job(job_id):
+    """``execute_job`` for the worker loops: a job that blows up never takes its worker down."""
+    try:
+        execute_job(job_id)
+    except Exception as exc:
+        logger.exception("OCR job %s crashed", job_id)
+        mark_job_failed(job_id, exc)
+
+
+def drain_queue():
+    """
+    Thread queue task: run claimable jobs until there are none left.
+
+    Claiming goes through ``claim_next_job``, so ``OCR_MAX_JOBS_PER_USER``
+    holds here too; a job skipped because its user is at the cap is picked
+    up by the task that finishes one of that user's jobs.
+    """
+    try:
+        while True:
+            try:
+                job_id = claim_next_job()
+            except Exception:
+                # The future swallows exceptions, so log it here
+                logger.exception("Failed to poll the OCR job queue")
+                return
+            if job_id is None:
+                return
+            run_job(job_id)
+            close_old_connections()
+    finally:
+        close_old_connections()
+
+
+def worker_loop():
+    """Poll the database queue forever, executing one job at a time."""
+    poll_interval = _setting("OCR_JOB_POLL_INTERVAL", 2.0)
+    while True:
+        close_old_connections()
+        try:
+            job_id = claim_next_job()
+        except Exception:
+            logger.exception("Failed to poll the OCR job queue")
+            job_id = None
+
+        if job_id is None:
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+            continue
+
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
+
+
+def start_workers(count=None, daemon=True):
+    """Start the database queue worker threads once per process."""
+    with _lock:
+        if _workers:
+            return _workers
+        requeue_stale_jobs()
+        count = count or _setting("OCR_WORKER_THREADS", 2)
+        for i in range(count):
+            worker = threading.Thread(target=worker_loop, name=f"ocr-worker-{i}", daemon=daemon)
+            worker.start()
+            _workers.append(worker)
+        return _workers
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting("OCR_WORKER_THREADS", 2),
+                thread_name_prefix="ocr-job",
+            )
+        return _executor
+
+
+def resume_jobs():
+    """
+    Pick up jobs left over by a restart when a server process starts (see
+    asgi.py/wsgi.py), instead of waiting for the next upload: start the
+    database queue workers, or set the thread pool draining pending jobs.
+    """
+    try:
+        if _setting("OCR_JOB_QUEUE", "database") == "thread":
+            requeue_stale_jobs()
+            for _ in range(_setting("OCR_WORKER_THREADS", 2)):
+                _get_executor().submit(drain_queue)
+        elif _setting("OCR_RUN_WORKERS_IN_PROCESS", True):
+            start_workers()
+    except Exception:
+        logger.exception("Failed to resume the OCR job queue")
+    finally:
+        close_old_connections()
+
+
+def enqueue_job(ocr_file):
+    """Hand a pending ``OCRFile`` to the configured worker pool."""
+    broadcast_job_event(ocr_file)
+    if _setting("OCR_JOB_QUEUE", "database") == "thread":
+        _get_executor().submit(drain_queue)
+        return
+
+    if _setting("OCR_RUN_WORKERS_IN_PROCESS", True):
+        start_workers()
+    _wakeup.set()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ocr_api.analytics import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily analytics rollup (OCRDailyStats) from the whole upload history'
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {count} daily stats row(s)'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from ocr_api.backends import page_result
+from ocr_api.cache import entry_pages
+from ocr_api.models import OCRFile, OCRResultCache
+from ocr_api.pages import save_pages
+from ocr_api.renderers import load_text
+
+
+class Command(BaseCommand):
+    help = 'Store per-page results (and so the search index) for finished documents that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every finished document, not only missing ones')
+
+    def handle(self, *args, **options):
+        files = OCRFile.objects.filter(status='done')
+        if not options['all']:
+            files = files.filter(pages__isnull=True)
+
+        indexed_count = 0
+        for ocr_file in files.iterator():
+            # Page boundaries survive in the result cache; otherwise store the text as one page
+            cached = OCRResultCache.objects.filter(file_sha256=ocr_file.sha256).exclude(page_breaks=[]).first() \
+                if ocr_file.sha256 else None
+            if cached:
+                pages = entry_pages(cached)
+            else:
+                text = load_text(ocr_file)
+                if text is None:
+                    self.stdout.write(self.style.WARNING(f'⚠ No OCR text on disk for "{ocr_file.file_name}"'))
+                    continue
+                pages = [page_result(text)]
+
+            save_pages(ocr_file, pages)
+            indexed_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {indexed_count} document(s)'))
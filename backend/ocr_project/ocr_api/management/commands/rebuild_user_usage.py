@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+
+from ocr_api.analytics import rebuild_user_usage
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user upload counters (UserUsage) from all uploaded files'
+
+    def handle(self, *args, **options):
+        count = rebuild_user_usage()
+        idle = User.objects.filter(usage__isnull=True).count()
+
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS('✓ No uploads to count'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Successfully rebuilt usage counters for {count} user(s)')
+            )
+        if idle:
+            self.stdout.write(self.style.SUCCESS(f'✓ {idle} user(s) without uploads count as zero'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from ocr_api.jobs import start_workers
+
+
+class Command(BaseCommand):
+    help = 'Run OCR worker threads that process pending jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Number of worker threads (defaults to OCR_WORKER_THREADS)')
+
+    def handle(self, *args, **options):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            self.stdout.write(self.style.WARNING(
+                '⚠ CHANNEL_LAYERS uses the in-memory layer: job progress from this process will not '
+                'reach WebSocket clients (clients fall back to polling). Set CHANNEL_LAYER_BACKEND to a shared layer.'
+            ))
+        workers = start_workers(options['threads'], daemon=False)
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Started {len(workers)} OCR worker thread(s), waiting for jobs...')
+        )
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,353 @@
+"""
+Operational metrics in the Prometheus text exposition format.
+
+A deliberately small registry: counters and histograms are plain Python
+numbers behind a per-metric lock, so recording one costs a dict lookup and
+an addition. ``/metrics`` renders them (see ``views.metrics``).
+
+Gunicorn/daphne run several worker processes, and a scrape only reaches one
+of them. With ``OCR_METRICS_DIR`` set, every process writes a snapshot of its
+counters there every ``OCR_METRICS_FLUSH_INTERVAL`` seconds and at exit, and
+a scrape adds up all snapshots plus its own live values (the same model as
+``prometheus_client``'s multiprocess mode; clear the directory when the
+service is (re)deployed). Queue depth and in-flight jobs are read from the
+database at scrape time, so they are exact across processes.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast API calls up to multi-minute OCR jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return json.dumps([str(labels[name]) for name in labelnames])
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.start_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, self.labelnames, json.loads(key), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.registry = registry
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        # First bucket whose upper bound is >= value; the last slot is +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            entry["buckets"][index] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+        self.registry.start_flusher()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: {**entry, "buckets": list(entry["buckets"])} for key, entry in self._values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for key, entry in values.items():
+            current = total.setdefault(key, {"buckets": [0] * len(entry["buckets"]), "sum": 0.0, "count": 0})
+            current["buckets"] = [a + b for a, b in zip(current["buckets"], entry["buckets"])]
+            current["sum"] += entry["sum"]
+            current["count"] += entry["count"]
+
+    def samples(self, values):
+        for key, entry in sorted(values.items()):
+            label_values = json.loads(key)
+            cumulative = 0
+            bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, entry["buckets"]):
+                cumulative += count
+                yield f"{self.name}_bucket", self.labelnames + ("le",), label_values + [bound], cumulative
+            yield f"{self.name}_sum", self.labelnames, label_values, entry["sum"]
+            yield f"{self.name}_count", self.labelnames, label_values, entry["count"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        # Per process: set on first use, so workers forked from a preloaded
+        # master each get their own snapshot file and flusher thread
+        self._flusher_pid = None
+        self._snapshot_name = None
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames, registry=self))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets, registry=self))
+
+    def gauge(self, name, documentation):
+        """Register a gauge computed at scrape time by the decorated function."""
+        def decorator(func):
+            self._gauges[name] = (documentation, func)
+            return func
+        return decorator
+
+    # Multi-process support
+
+    def _directory(self):
+        return getattr(settings, "OCR_METRICS_DIR", None)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def flush(self):
+        """Write this process's values to ``OCR_METRICS_DIR`` (atomically)."""
+        directory = self._directory()
+        if not directory or self._snapshot_name is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_name, os.path.join(directory, self._snapshot_name))
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def start_flusher(self):
+        """
+        Start flushing periodically and at exit, once per process, on the
+        first recorded value. A no-op without ``OCR_METRICS_DIR``.
+        """
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._snapshot_name = f"metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+            if not self._directory():
+                return
+            interval = getattr(settings, "OCR_METRICS_FLUSH_INTERVAL", 10)
+
+            def loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.flush()
+                    except Exception:
+                        logger.exception("Failed to write metrics snapshot")
+
+            threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    def collect(self):
+        """Values summed over every process's snapshot and this process's live values."""
+        totals = {name: {} for name in self._metrics}
+        directory = self._directory()
+        if directory:
+            own = os.path.join(directory, self._snapshot_name or "")
+            for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for name, values in snapshot.items():
+                    if name in self._metrics:
+                        self._metrics[name].merge(totals[name], values)
+        for name, metric in self._metrics.items():
+            metric.merge(totals[name], metric.snapshot())
+        return totals
+
+    def render(self):
+        """The text exposition format (version 0.0.4)."""
+        totals = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, labelnames, label_values, value in metric.samples(totals[name]):
+                lines.append(f"{sample_name}{_format_labels(labelnames, label_values)} {_format_value(value)}")
+        for name, (documentation, func) in self._gauges.items():
+            try:
+                value = func(totals)
+            except Exception:
+                logger.exception("Failed to compute gauge %s", name)
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                labelname, values = value["label"], value["values"]
+                for label_value, sample in values.items():
+                    lines.append(f"{name}{_format_labels((labelname,), [label_value])} {_format_value(sample)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, label_values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, label_values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    "ocr_http_request_duration_seconds",
+    "Time to produce a response, by view (URL name) and status class.",
+    ("view", "method", "status"),
+)
+OCR_PAGES = registry.counter(
+    "ocr_pages_processed_total",
+    "Pages of finished jobs, by where the text came from; rate() gives pages per second.",
+    ("source",),
+)
+OCR_JOBS = registry.counter(
+    "ocr_jobs_finished_total",
+    "OCR jobs finished, by outcome.",
+    ("status",),
+)
+CACHE_LOOKUPS = registry.counter(
+    "ocr_cache_lookups_total",
+    "OCR result cache lookups, by result.",
+    ("result",),
+)
+RENDER_DURATION = registry.histogram(
+    "ocr_render_duration_seconds",
+    "Time to build a PDF/DOCX output.",
+    ("format",),
+)
+BYTES_WRITTEN = registry.counter(
+    "ocr_storage_bytes_written_total",
+    "Bytes written to storage (MEDIA_ROOT or S3), by top-level folder.",
+    ("storage", "folder"),
+)
+
+
+@registry.gauge("ocr_cache_hit_ratio", "OCR result cache hits / lookups, across processes.")
+def _cache_hit_ratio(totals):
+    lookups = totals[CACHE_LOOKUPS.name]
+    hits = lookups.get(json.dumps(["hit"]), 0)
+    total = sum(lookups.values())
+    return round(hits / total, 4) if total else 0.0
+
+
+@registry.gauge("ocr_jobs", "OCR jobs currently queued or being processed.")
+def _jobs_by_status(totals):
+    from django.db.models import Count
+
+    from .models import OCRFile
+
+    counts = dict(
+        OCRFile.objects.filter(status__in=["pending", "processing"])
+        .values_list("status")
+        .annotate(n=Count("id"))
+    )
+    return {"label": "status", "values": {
+        "queued": counts.get("pending", 0),
+        "in_flight": counts.get("processing", 0),
+    }}
+
+
+def record_bytes_written(storage, name, size):
+    if size:
+        folder = name.replace("\\", "/").lstrip("/").split("/", 1)[0]
+        BYTES_WRITTEN.inc(size, storage=storage, folder=folder)
+
+
+class MetricsMiddleware:
+    """Record request latency per view. Streaming bodies are timed up to the first byte."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            view=(match.url_name or match.view_name) if match else "unmatched",
+            method=request.method,
+            status=f"{response.status_code // 100}xx",
+        )
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0013_ocrfile_job_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('file_sha256', models.CharField(db_index=True, max_length=64)),
+                ('model_name', models.CharField(max_length=100)),
+                ('text', models.TextField()),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ocrfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
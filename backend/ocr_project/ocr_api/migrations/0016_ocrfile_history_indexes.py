@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0015_ocrbatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ocrfile',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='ocrfile_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ocrfile',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='ocrfile_history_idx'),
+        ),
+    ]
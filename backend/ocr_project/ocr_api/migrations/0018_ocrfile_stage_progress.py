@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0017_message_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrfile',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrfile',
+            name='pages_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ocrfile',
+            name='stage',
+            field=models.CharField(choices=[('queued', 'Queued'), ('uploading', 'Uploading'), ('ocr', 'OCR'), ('rendering', 'Rendering'), ('done', 'Done'), ('error', 'Error')], default='queued', max_length=10),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'ocr_api_ocrpage_fts'
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, content='ocr_api_ocrpage', content_rowid='id')",
+    f"""CREATE TRIGGER ocr_api_ocrpage_ai AFTER INSERT ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER ocr_api_ocrpage_ad AFTER DELETE ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER ocr_api_ocrpage_au AFTER UPDATE ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS ocr_api_ocrpage_ai",
+    "DROP TRIGGER IF EXISTS ocr_api_ocrpage_ad",
+    "DROP TRIGGER IF EXISTS ocr_api_ocrpage_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute("CREATE FULLTEXT INDEX ocrpage_text_ft ON ocr_api_ocrpage (text)")
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS:
+            schema_editor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute("DROP INDEX ocrpage_text_ft ON ocr_api_ocrpage")
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0018_ocrfile_stage_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrresultcache',
+            name='page_breaks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='OCRPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('ocr_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='ocr_api.ocrfile')),
+            ],
+            options={
+                'ordering': ['ocr_file', 'page_number'],
+                'constraints': [models.UniqueConstraint(fields=('ocr_file', 'page_number'), name='unique_ocr_page')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
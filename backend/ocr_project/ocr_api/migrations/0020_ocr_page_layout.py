@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+from django.db import migrations, models
+
+FTS_TABLE = 'ocr_api_ocrpage_fts'
+
+SQLITE_FTS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS ocr_api_ocrpage_ai AFTER INSERT ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ocr_api_ocrpage_ad AFTER DELETE ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ocr_api_ocrpage_au AFTER UPDATE ON ocr_api_ocrpage BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def restore_sqlite_fts(apps, schema_editor):
+    # SQLite adds columns by rebuilding the table, which drops its triggers
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0019_ocr_pages_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrpage',
+            name='dpi',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrpage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrpage',
+            name='images',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='ocrpage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ocrresultcache',
+            name='page_meta',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(restore_sqlite_fts, migrations.RunPython.noop),
+    ]
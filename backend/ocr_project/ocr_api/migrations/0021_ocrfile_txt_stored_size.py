@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_txt_size(apps, schema_editor):
+    # Existing text outputs were all written uncompressed
+    OCRFile = apps.get_model('ocr_api', 'OCRFile')
+    OCRFile.objects.update(txt_stored_size=F('txt_size'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0020_ocr_page_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrfile',
+            name='txt_stored_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_txt_size, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0021_ocrfile_txt_stored_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRTiming',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue_wait_ms', models.FloatField(blank=True, null=True)),
+                ('local_write_ms', models.FloatField(blank=True, null=True)),
+                ('remote_upload_ms', models.FloatField(blank=True, null=True)),
+                ('signed_url_ms', models.FloatField(blank=True, null=True)),
+                ('ocr_process_ms', models.FloatField(blank=True, null=True)),
+                ('output_write_ms', models.FloatField(blank=True, null=True)),
+                ('pdf_build_ms', models.FloatField(blank=True, null=True)),
+                ('docx_build_ms', models.FloatField(blank=True, null=True)),
+                ('db_write_ms', models.FloatField(blank=True, null=True)),
+                ('total_ms', models.FloatField(blank=True, null=True)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('ocr_file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timing', to='ocr_api.ocrfile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # Same single pass as ocr_api.analytics.daily_groups, on the historical
+    # models; days are computed in Python so MySQL needs no time zone tables
+    OCRFile = apps.get_model('ocr_api', 'OCRFile')
+    OCRDailyStats = apps.get_model('ocr_api', 'OCRDailyStats')
+    groups = {}
+    rows = OCRFile.objects.values_list(
+        'uploaded_at', 'user_id', 'status', 'pdf_size', 'txt_stored_size', 'docx_size', 'timing__total_ms'
+    ).order_by().iterator(chunk_size=2000)
+    for uploaded_at, user_id, status, pdf_size, txt_size, docx_size, total_ms in rows:
+        key = (timezone.localdate(uploaded_at), user_id)
+        group = groups.setdefault(key, {
+            'uploads': 0, 'done': 0, 'errors': 0, 'in_progress': 0,
+            'pdf_bytes': 0, 'txt_bytes': 0, 'docx_bytes': 0, 'processing_ms': 0.0, 'timed_jobs': 0,
+        })
+        group['uploads'] += 1
+        if status == 'done':
+            group['done'] += 1
+        elif status == 'error':
+            group['errors'] += 1
+        else:
+            group['in_progress'] += 1
+        group['pdf_bytes'] += pdf_size
+        group['txt_bytes'] += txt_size
+        group['docx_bytes'] += docx_size
+        if total_ms is not None:
+            group['processing_ms'] += total_ms
+            group['timed_jobs'] += 1
+    OCRDailyStats.objects.bulk_create(
+        [OCRDailyStats(day=day, user_id=user_id, **values) for (day, user_id), values in groups.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0022_ocr_timing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('uploads', models.PositiveIntegerField(default=0)),
+                ('done', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('in_progress', models.PositiveIntegerField(default=0)),
+                ('pdf_bytes', models.BigIntegerField(default=0)),
+                ('txt_bytes', models.BigIntegerField(default=0)),
+                ('docx_bytes', models.BigIntegerField(default=0)),
+                ('processing_ms', models.FloatField(default=0)),
+                ('timed_jobs', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ocr_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'user'), name='unique_daily_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
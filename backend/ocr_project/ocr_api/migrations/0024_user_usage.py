@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_user_usage(apps, schema_editor):
+    # Same GROUP BY as ocr_api.analytics.rebuild_user_usage, on the historical models
+    OCRFile = apps.get_model('ocr_api', 'OCRFile')
+    UserUsage = apps.get_model('ocr_api', 'UserUsage')
+    groups = (
+        OCRFile.objects
+        .exclude(user=None)
+        .values('user_id')
+        .annotate(
+            uploads=Count('id'),
+            done=Count('id', filter=Q(status='done')),
+            errors=Count('id', filter=Q(status='error')),
+            in_progress=Count('id', filter=Q(status__in=['pending', 'processing'])),
+            pdf_bytes=Coalesce(Sum('pdf_size'), 0),
+            txt_bytes=Coalesce(Sum('txt_stored_size'), 0),
+            docx_bytes=Coalesce(Sum('docx_size'), 0),
+            last_upload_at=Max('uploaded_at'),
+        )
+        .order_by()
+    )
+    UserUsage.objects.bulk_create([UserUsage(**group) for group in groups], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0023_ocr_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uploads', models.PositiveIntegerField(default=0)),
+                ('done', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('in_progress', models.PositiveIntegerField(default=0)),
+                ('pdf_bytes', models.BigIntegerField(default=0)),
+                ('txt_bytes', models.BigIntegerField(default=0)),
+                ('docx_bytes', models.BigIntegerField(default=0)),
+                ('last_upload_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:07
+
+from django.db import migrations
+
+FORMATS = ['pdf', 'txt', 'docx']
+
+
+def backfill_output_formats(apps, schema_editor):
+    # Jobs from before 0013 only recorded their formats as non-empty URLs
+    OCRFile = apps.get_model('ocr_api', 'OCRFile')
+    files = OCRFile.objects.only('id', 'output_formats', 'pdf_url', 'txt_url', 'docx_url')
+    changed = []
+    for ocr_file in files.iterator(chunk_size=1000):
+        if ocr_file.output_formats:
+            continue
+        ocr_file.output_formats = [ext for ext in FORMATS if getattr(ocr_file, f'{ext}_url')]
+        if ocr_file.output_formats:
+            changed.append(ocr_file)
+    OCRFile.objects.bulk_update(changed, ['output_formats'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ocr_api', '0025_ocrfile_output_digests'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_output_formats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,169 @@
+"""
+Managed HTTP client for the Mistral API.
+
+One ``MistralClient`` is shared by every worker thread of a process (it lives
+on the cached ``MistralBackend``) and adds what the bare SDK client lacks:
+
+- a pooled ``httpx.Client`` with connect and read timeouts
+- retries of 429s, 5xx responses and connection errors, with exponential
+  backoff and full jitter, honouring ``Retry-After``
+- a token bucket in front of every request, so a burst of uploads queues
+  for a token instead of tripping the API's rate limit
+
+Point ``server_url`` at a local fake server to exercise it in tests.
+"""
+from email.utils import parsedate_to_datetime
+import logging
+import random
+import threading
+import time
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: timeouts, rate limiting and server-side failures
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RateLimitTimeout(Exception):
+    """No request token became available within the acquire timeout."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills ``rate`` tokens per second up to
+    ``capacity``. ``acquire`` blocks until a token is free, so callers queue
+    in arrival order rather than fail. A ``rate`` of 0 disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to ``timeout`` seconds (forever if None)."""
+        if not self.rate:
+            return
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and self._clock() + wait > deadline:
+                raise RateLimitTimeout(f"No Mistral request token within {timeout}s")
+            self._sleep(wait)
+
+
+def backoff_delay(attempt, base, cap):
+    """Full-jitter exponential backoff: uniform in ``[0, min(cap, base * 2**attempt)]``."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after(headers):
+    """Seconds requested by a ``Retry-After`` header (delta or HTTP date), or None."""
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - timezone.now()).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class MistralClient:
+    """
+    Thread-safe wrapper around ``mistralai.Mistral``. ``call`` runs one SDK
+    operation under the rate limiter and retry policy; ``upload_file``,
+    ``signed_url`` and ``process`` are the operations the OCR backend uses.
+    """
+
+    def __init__(self, api_key, server_url=None, timeout=120.0, connect_timeout=10.0,
+                 max_connections=20, max_retries=4, backoff=0.5, backoff_max=30.0,
+                 rate=5.0, burst=10, acquire_timeout=600.0):
+        import httpx
+        from mistralai import Mistral
+
+        self._httpx = httpx
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.bucket = TokenBucket(rate, burst)
+        # One pooled connection set for all threads; keep-alive avoids a TLS
+        # handshake per page range
+        self.http = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.sdk = Mistral(
+            api_key=api_key,
+            server_url=server_url,
+            client=self.http,
+            timeout_ms=int(timeout * 1000),
+        )
+
+    def _retry_reason(self, exc):
+        """Why ``exc`` is worth retrying, or None if it is not."""
+        from mistralai.models import MistralError
+
+        if isinstance(exc, MistralError):
+            if exc.status_code in RETRY_STATUSES:
+                return f"HTTP {exc.status_code}", retry_after(exc.headers)
+            return None
+        if isinstance(exc, self._httpx.TransportError):
+            return type(exc).__name__, None
+        return None
+
+    def call(self, operation, *args, **kwargs):
+        """Run ``operation(*args, **kwargs)`` with rate limiting and retries."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(self.acquire_timeout)
+            try:
+                return operation(*args, **kwargs)
+            except Exception as exc:
+                retry = self._retry_reason(exc)
+                if retry is None or attempt == self.max_retries:
+                    raise
+                reason, requested = retry
+                delay = backoff_delay(attempt, self.backoff, self.backoff_max)
+                if requested is not None:
+                    delay = max(delay, min(requested, self.backoff_max))
+                logger.warning(
+                    "Mistral %s failed (%s), retrying in %.1fs (%d/%d)",
+                    getattr(operation, "__name__", "call"), reason, delay, attempt + 1, self.max_retries,
+                )
+                time.sleep(delay)
+
+    def upload_file(self, path, file_name):
+        """Upload a local file for OCR; the file is reopened on every attempt."""
+        def upload():
+            with open(path, "rb") as f:
+                return self.sdk.files.upload(file={"file_name": file_name, "content": f}, purpose="ocr")
+        return self.call(upload)
+
+    def signed_url(self, file_id, expiry=1):
+        return self.call(self.sdk.files.get_signed_url, file_id=file_id, expiry=expiry)
+
+    def process(self, **kwargs):
+        return self.call(self.sdk.ocr.process, **kwargs)
+
+    def close(self):
+        self.http.close()
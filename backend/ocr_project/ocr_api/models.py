@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Q
+from django.utils import timezone
 
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -22,9 +23,29 @@ class UserProfile(models.Model):
         return f"{self.user.username} - {self.role}"
 
 
+class OCRBatch(models.Model):
+    """A group of files uploaded together through ``upload/batch/``."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ocr_batches')
+    output_formats = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.user.username})"
+
+
 class OCRFile(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('error', 'Error'),
+    ]
+    # Finer-grained progress within a job, streamed to clients (see realtime.py)
+    STAGE_CHOICES = [
+        ('queued', 'Queued'),
+        ('uploading', 'Uploading'),
+        ('ocr', 'OCR'),
+        ('rendering', 'Rendering'),
         ('done', 'Done'),
         ('error', 'Error'),
     ]
@@ -35,17 +56,165 @@ class OCRFile(models.Model):
     docx_url = models.URLField()
     pdf_size = models.BigIntegerField(default=0)   # in bytes
     txt_size = models.BigIntegerField(default=0)
+    txt_stored_size = models.BigIntegerField(default=0)  # on disk, smaller than txt_size when compressed
     docx_size = models.BigIntegerField(default=0)
+    # SHA-256 of each stored output ("txt" is the canonical markdown), for strong download ETags
+    output_digests = models.JSONField(default=dict, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
 
+    # Background job bookkeeping (see ocr_api/jobs.py)
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    output_formats = models.JSONField(default=list, blank=True)
+    input_path = models.CharField(max_length=500, blank=True, default="")
+    error_message = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    batch = models.ForeignKey(OCRBatch, null=True, blank=True, on_delete=models.SET_NULL, related_name='files')
+    stage = models.CharField(max_length=10, choices=STAGE_CHOICES, default='queued')
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    pages_done = models.PositiveIntegerField(default=0)
+
     class Meta:
         unique_together = ('user', 'file_name')
+        # Keyset pagination of the history page (see OCRHistoryView)
+        indexes = [
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='ocrfile_user_history_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='ocrfile_history_idx'),
+        ]
 
     def __str__(self):
         return self.file_name
-    
+
+
+class OCRResultCache(models.Model):
+    """
+    OCR output keyed by the content hash of the uploaded bytes plus the model
+    and options used, so re-uploads of the same document skip Mistral entirely.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    file_sha256 = models.CharField(max_length=64, db_index=True)
+    model_name = models.CharField(max_length=100)
+    text = models.TextField()
+    page_breaks = models.JSONField(default=list, blank=True)  # offsets where pages 2..n start in text
+    page_meta = models.JSONField(default=list, blank=True)    # per-page dimensions and image refs
+    size_bytes = models.BigIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.file_sha256[:12]} ({self.model_name})"
+
+
+class OCRPage(models.Model):
+    """
+    One page of a document's OCR result: its markdown plus the layout the
+    engine reported, so single pages can be read without the whole document
+    (see ocr_api/pages.py). Also the unit of the full-text search index
+    (see ocr_api/search.py); the FULLTEXT index (MySQL) or FTS5 table
+    (SQLite) over ``text`` is created in migration 0019. On SQLite, schema
+    changes to this table drop the FTS triggers; recreate them in the same
+    migration (see 0020).
+    """
+    ocr_file = models.ForeignKey(OCRFile, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()  # 1-based
+    text = models.TextField()
+    width = models.PositiveIntegerField(null=True, blank=True)   # pixels
+    height = models.PositiveIntegerField(null=True, blank=True)
+    dpi = models.PositiveIntegerField(null=True, blank=True)
+    images = models.JSONField(default=list, blank=True)  # [{"id", "bbox": [x1, y1, x2, y2]}]
+
+    class Meta:
+        ordering = ['ocr_file', 'page_number']
+        constraints = [
+            models.UniqueConstraint(fields=['ocr_file', 'page_number'], name='unique_ocr_page'),
+        ]
+
+    def __str__(self):
+        return f"{self.ocr_file.file_name} p.{self.page_number}"
+
+
+class OCRTiming(models.Model):
+    """
+    Where one job's time went, per pipeline stage, in milliseconds (see
+    ocr_api/timing.py). Stages that did not run (cache hits skip the remote
+    ones, PDF/DOCX are only built on first download) stay null.
+    """
+    ocr_file = models.OneToOneField(OCRFile, on_delete=models.CASCADE, related_name='timing')
+    queue_wait_ms = models.FloatField(null=True, blank=True)      # uploaded -> claimed by a worker
+    local_write_ms = models.FloatField(null=True, blank=True)     # storing the upload
+    remote_upload_ms = models.FloatField(null=True, blank=True)   # files.upload
+    signed_url_ms = models.FloatField(null=True, blank=True)      # files.get_signed_url
+    ocr_process_ms = models.FloatField(null=True, blank=True)     # ocr.process, all page ranges
+    output_write_ms = models.FloatField(null=True, blank=True)    # canonical markdown
+    pdf_build_ms = models.FloatField(null=True, blank=True)
+    docx_build_ms = models.FloatField(null=True, blank=True)
+    db_write_ms = models.FloatField(null=True, blank=True)        # pages, result cache and job row
+    total_ms = models.FloatField(null=True, blank=True)           # claimed -> finished
+    cache_hit = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Timing of {self.ocr_file.file_name}"
+
+
+class OCRDailyStats(models.Model):
+    """
+    Daily rollup of ``OCRFile`` per uploader and upload day (in TIME_ZONE), so
+    analytics never scan the whole history (see ocr_api/analytics.py). A
+    row is recomputed from its day's files whenever one of them changes;
+    ``manage.py rebuild_daily_stats`` recomputes everything.
+    """
+    day = models.DateField()
+    # Rows of deleted users keep counting towards totals, like their files
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='ocr_daily_stats')
+    uploads = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    in_progress = models.PositiveIntegerField(default=0)   # pending or processing
+    pdf_bytes = models.BigIntegerField(default=0)
+    txt_bytes = models.BigIntegerField(default=0)          # as stored, i.e. compressed
+    docx_bytes = models.BigIntegerField(default=0)
+    processing_ms = models.FloatField(default=0)           # sum of OCRTiming.total_ms
+    timed_jobs = models.PositiveIntegerField(default=0)    # jobs with a total_ms
+
+    class Meta:
+        # Also serves range filters on day
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user'], name='unique_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user_id}"
+
+
+class UserUsage(models.Model):
+    """
+    Per-user upload counters, so user lists and the admin read totals from
+    one row instead of aggregating ``OCRFile`` per user. Recomputed under a
+    row lock whenever one of the user's files changes (see
+    ocr_api/analytics.py); ``manage.py rebuild_user_usage`` recomputes all.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='usage')
+    uploads = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    in_progress = models.PositiveIntegerField(default=0)   # pending or processing
+    pdf_bytes = models.BigIntegerField(default=0)
+    txt_bytes = models.BigIntegerField(default=0)          # as stored, i.e. compressed
+    docx_bytes = models.BigIntegerField(default=0)
+    last_upload_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total_bytes(self):
+        return self.pdf_bytes + self.txt_bytes + self.docx_bytes
+
+    def __str__(self):
+        return f"Usage of {self.user.username}"
+
+
 class ChatRoom(models.Model):
     """
     Represents a 1-to-1 chat between two users.
@@ -89,8 +258,6 @@ class ChatRoom(models.Model):
         return ChatRoom.objects.create(user1=user_a, user2=user_b)
 
 
-from django.utils import timezone
-
 class Message(models.Model):
     room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -98,6 +265,7 @@ class Message(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     edited_at = models.DateTimeField(null=True, blank=True)  # ✅ ADD THIS
+    updated_at = models.DateTimeField(auto_now=True)  # any change, for ?since= sync
 
     is_read = models.BooleanField(default=False)
     deleted_for = models.ManyToManyField(User, blank=True, related_name="deleted_messages")
@@ -106,4 +274,7 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['room', '-created_at'])]
+        indexes = [
+            models.Index(fields=['room', '-created_at']),
+            models.Index(fields=['room', 'updated_at'], name='message_room_updated_idx'),
+        ]
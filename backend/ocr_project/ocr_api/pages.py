@@ -0,0 +1,44 @@
+"""
+Per-page OCR results.
+
+Every finished job keeps its pages as ``OCRPage`` rows: markdown, pixel
+dimensions, DPI and image references. Previews, search and re-renders read
+just the pages they need, and nothing has to be OCR'd again to recover page
+boundaries.
+"""
+from django.db import transaction
+
+from .cache import PAGE_SEPARATOR
+from .models import OCRPage
+
+
+def save_pages(ocr_file, pages):
+    """Replace the stored pages of ``ocr_file`` with ``page_result`` dicts, in page order."""
+    with transaction.atomic():
+        OCRPage.objects.filter(ocr_file=ocr_file).delete()
+        OCRPage.objects.bulk_create([
+            OCRPage(
+                ocr_file=ocr_file,
+                page_number=number,
+                text=page["markdown"],
+                width=page.get("width"),
+                height=page.get("height"),
+                dpi=page.get("dpi"),
+                images=page.get("images") or [],
+            )
+            for number, page in enumerate(pages, start=1)
+        ])
+
+
+def read_pages(ocr_file, first=1, last=None):
+    """Stored pages ``first``..``last`` (1-based, inclusive) of ``ocr_file``."""
+    pages = OCRPage.objects.filter(ocr_file=ocr_file, page_number__gte=first)
+    if last is not None:
+        pages = pages.filter(page_number__lte=last)
+    return pages.order_by("page_number")
+
+
+def load_page_text(ocr_file):
+    """The document markdown rebuilt from its pages, or None if none are stored."""
+    texts = list(read_pages(ocr_file).values_list("text", flat=True))
+    return PAGE_SEPARATOR.join(texts) if texts else None
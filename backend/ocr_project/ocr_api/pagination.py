@@ -0,0 +1,57 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page, JSON-encoded and then
+base64'd so clients treat it as an opaque token. The next page is fetched with
+a ``WHERE (key) < (cursor)`` filter that rides the index, instead of an
+OFFSET that gets slower the deeper you page.
+"""
+import base64
+import json
+
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    payload = [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor into ``size`` raw values, raising ``InvalidCursor`` if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def decode_datetime_cursor(cursor):
+    """Decode a ``(datetime, id)`` cursor as produced by ``encode_cursor(dt, id)``."""
+    timestamp, row_id = decode_cursor(cursor, 2)
+    parsed = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+    if parsed is None or not isinstance(row_id, int):
+        raise InvalidCursor("Invalid cursor")
+    return parsed, row_id
+
+
+def decode_id_cursor(cursor):
+    """Decode an ``id`` cursor as produced by ``encode_cursor(id)``."""
+    (row_id,) = decode_cursor(cursor, 1)
+    if not isinstance(row_id, int):
+        raise InvalidCursor("Invalid cursor")
+    return row_id
+
+
+def parse_limit(request, default=50, maximum=500):
+    try:
+        limit = int(request.GET.get("limit", default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
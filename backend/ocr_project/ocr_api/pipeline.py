@@ -0,0 +1,140 @@
+"""
+OCR processing pipeline.
+
+Everything that used to happen inside ``OCRUploadView.post`` lives here so it
+can run from a background worker (see ``jobs.py``) instead of the HTTP request.
+The OCR engine itself is whatever ``backends.get_backend()`` returns.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import time
+
+from django.conf import settings
+
+from .backends import get_backend
+from .cache import PAGE_SEPARATOR, get_cached_pages, store_pages
+from .models import OCRFile
+from .realtime import broadcast_job_event
+from .renderers import write_markdown
+from .pages import save_pages
+from .storage import local_copy
+from .timing import current_timings, timed
+
+logger = logging.getLogger(__name__)
+
+
+def page_chunks(page_count, chunk_size):
+    """Split ``range(page_count)`` into consecutive lists of 0-based page indexes."""
+    return [
+        list(range(start, min(start + chunk_size, page_count)))
+        for start in range(0, page_count, chunk_size)
+    ]
+
+
+def ocr_pages(backend, handle, pages=None):
+    """
+    OCR one page range of a prepared document, retrying just this range on
+    failures the backend deems retryable. Returns the pages in page order.
+    """
+    retries = getattr(settings, "OCR_CHUNK_RETRIES", 2)
+    delay = getattr(settings, "OCR_CHUNK_RETRY_DELAY", 1.0)
+
+    for attempt in range(retries + 1):
+        try:
+            return backend.process(handle, pages)
+        except Exception as exc:
+            if attempt == retries or not backend.should_retry(exc):
+                raise
+            logger.warning("OCR of pages %s failed, retrying (%d/%d)", pages, attempt + 1, retries)
+            time.sleep(delay * (2 ** attempt))
+
+
+def run_ocr(backend, input_path, file_name, on_stage=None):
+    """
+    Run a document through ``backend`` and return a ``page_result`` dict per page.
+
+    ``on_stage(stage, **fields)`` is called as the job moves through
+    uploading and ocr, and with the running ``pages_done`` after each chunk.
+    """
+    on_stage = on_stage or (lambda stage, **fields: None)
+
+    on_stage("uploading")
+    handle = backend.prepare(input_path, file_name)
+
+    # Large PDFs are OCR'd as concurrent page ranges instead of one long request
+    page_count = backend.page_count(input_path)
+    on_stage("ocr", page_count=page_count, pages_done=0)
+    if (
+        not getattr(settings, "OCR_PARALLEL_PAGES", True)
+        or page_count is None
+        or page_count < getattr(settings, "OCR_PARALLEL_MIN_PAGES", 20)
+    ):
+        with timed("ocr_process"):
+            results = ocr_pages(backend, handle)
+        on_stage("ocr", page_count=page_count or len(results), pages_done=len(results))
+    else:
+        chunks = page_chunks(page_count, getattr(settings, "OCR_PAGE_CHUNK_SIZE", 10))
+        max_workers = getattr(settings, "OCR_MAX_CONCURRENT_CHUNKS", 4)
+        # Wall-clock time of the whole fan-out, not the sum of the concurrent requests
+        with timed("ocr_process"), ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-chunk") as pool:
+            futures = {pool.submit(ocr_pages, backend, handle, pages): pages for pages in chunks}
+            # Progress is reported from this thread so the chunk threads never touch the DB
+            pages_done = 0
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    # Don't pay for the page ranges of a job that has already failed
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+                pages_done += len(futures[future])
+                on_stage("ocr", pages_done=pages_done)
+            # Dicts keep insertion order, i.e. page order
+            results = [page for future in futures for page in future.result()]
+
+    return results
+
+
+def set_stage(ocr_file, stage, **fields):
+    """Record a job's progress on its row and push it to the owner's clients."""
+    fields["stage"] = stage
+    for name, value in fields.items():
+        setattr(ocr_file, name, value)
+    OCRFile.objects.filter(id=ocr_file.id).update(**fields)
+    broadcast_job_event(ocr_file)
+
+
+def process_ocr_file(ocr_file):
+    """
+    Run OCR for a claimed job and persist the canonical markdown plus the
+    per-page results (which also feed the search index).
+
+    PDF/DOCX are rendered lazily on first download (see ``renderers.py``).
+    Sizes are set on ``ocr_file`` but not saved; the caller owns the status
+    transition and the final ``save()``.
+    """
+    backend = get_backend()
+
+    def on_stage(stage, **fields):
+        set_stage(ocr_file, stage, **fields)
+
+    # Identical bytes already OCR'd with the same engine skip the backend entirely
+    pages = get_cached_pages(ocr_file.sha256, backend.model_name, backend.options)
+    if pages is None:
+        # Engines need a real file; on remote storage the input is fetched to a temp copy
+        with local_copy(ocr_file.input_path) as input_path:
+            pages = run_ocr(backend, input_path, ocr_file.file_name, on_stage)
+        with timed("db_write"):
+            store_pages(ocr_file.sha256, backend.model_name, pages, backend.options)
+    elif current_timings() is not None:
+        current_timings().cache_hit = True
+
+    # txt downloads are served from the markdown, so its size is the txt size
+    on_stage("rendering", page_count=len(pages), pages_done=len(pages))
+    with timed("output_write"):
+        ocr_file.txt_size, ocr_file.txt_stored_size = write_markdown(
+            ocr_file, PAGE_SEPARATOR.join(page["markdown"] for page in pages)
+        )
+    with timed("db_write"):
+        save_pages(ocr_file, pages)
@@ -0,0 +1,122 @@
+"""
+Server push over WebSockets (Django Channels).
+
+Views and OCR workers call the ``broadcast_*`` helpers after changing data;
+connected consumers in ``consumers.py`` receive the event through the
+channel layer.
+The layer comes from ``CHANNEL_LAYERS``: in-process by default, or a shared
+one (e.g. channels_redis) when several app nodes, or a separate
+``run_ocr_worker`` process, must reach the same clients.
+
+Events are mostly sent from plain threads (OCR workers). The in-memory
+layer's queues belong to the server's event loop and are not thread-safe,
+so consumers register that loop on connect and sends are handed to it.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# The event loop serving this process's WebSocket consumers, if any
+_server_loop = None
+
+
+def bind_server_loop():
+    """Remember the running loop as the one consumers live on (called from ``connect``)."""
+    global _server_loop
+    _server_loop = asyncio.get_running_loop()
+
+
+def _log_failure(group):
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to publish event to %s", group, exc_info=future.exception())
+    return callback
+
+
+def chat_group(room_id):
+    return f"chat_{room_id}"
+
+
+def jobs_group(user_id):
+    return f"jobs_{user_id}"
+
+
+def _group_send(group, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    loop = _server_loop
+    try:
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                loop.create_task(channel_layer.group_send(group, payload)).add_done_callback(_log_failure(group))
+            else:
+                # Thread-safe handoff; don't block the worker on delivery
+                asyncio.run_coroutine_threadsafe(
+                    channel_layer.group_send(group, payload), loop
+                ).add_done_callback(_log_failure(group))
+        elif isinstance(channel_layer, InMemoryChannelLayer):
+            # No consumer has connected to this process, so nobody could receive it
+            return
+        else:
+            async_to_sync(channel_layer.group_send)(group, payload)
+    except Exception:
+        # Push is best effort; clients can always resync over REST with ?since=
+        logger.exception("Failed to publish event to %s", group)
+
+
+def broadcast_chat_event(event, message):
+    """Push ``message.created`` / ``message.updated`` / ``message.deleted`` to a room."""
+    from .serializers import MessageSerializer
+
+    _group_send(chat_group(message.room_id), {
+        "type": "chat.event",
+        "event": event,
+        "message": MessageSerializer(message).data,
+    })
+
+
+def broadcast_read_receipt(room_id, reader_id, up_to=None):
+    """Tell a room that ``reader_id`` has read the other member's messages (up to ``up_to``)."""
+    _group_send(chat_group(room_id), {
+        "type": "chat.read",
+        "reader": reader_id,
+        "up_to": up_to,
+    })
+
+
+def job_progress(ocr_file):
+    """Progress snapshot of an ``OCRFile`` job, as sent to clients."""
+    now = timezone.now()
+    elapsed = (ocr_file.finished_at or now) - ocr_file.started_at if ocr_file.started_at else None
+    return {
+        "job_id": ocr_file.id,
+        "file_name": ocr_file.file_name,
+        "status": ocr_file.status,
+        "stage": ocr_file.stage,
+        "page_count": ocr_file.page_count,
+        "pages_done": ocr_file.pages_done,
+        "queued_for": round(((ocr_file.started_at or now) - ocr_file.uploaded_at).total_seconds(), 3),
+        "elapsed": round(elapsed.total_seconds(), 3) if elapsed is not None else None,
+        "error": ocr_file.error_message or None,
+    }
+
+
+def broadcast_job_event(ocr_file):
+    """Push the job's current stage to its owner's ``jobs_<user_id>`` group."""
+    if ocr_file.user_id is None:
+        return
+    payload = {"type": "job.progress", "job": job_progress(ocr_file)}
+    # Inside a transaction, wait for the commit so clients that refetch the
+    # job on an event see the new state (immediate otherwise)
+    transaction.on_commit(lambda: _group_send(jobs_group(ocr_file.user_id), payload))
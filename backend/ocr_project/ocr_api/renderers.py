@@ -0,0 +1,235 @@
+"""
+Output renderers for OCR results.
+
+Jobs only persist the canonical OCR markdown (``ocr_<name>.md``, optionally
+compressed, see ``compression.py``). PDF and DOCX are rendered the first time
+someone downloads them and kept next to the markdown in the configured
+storage (``storage.py``), so later downloads are served as stored.
+"""
+from pathlib import Path
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet
+from docx import Document
+
+from .analytics import refresh_file_stats
+from .compression import SUFFIXES, compress, open_decoded, text_encoding
+from .models import OCRFile
+from .pages import load_page_text
+from .storage import delete_file, get_storage
+from .metrics import RENDER_DURATION
+from .timing import record_timing
+
+
+def build_pdf(final_text, pdf_path):
+    doc = SimpleDocTemplate(str(pdf_path), pagesize=A4,
+                            rightMargin=40, leftMargin=40,
+                            topMargin=40, bottomMargin=40)
+    story = []
+    styles = getSampleStyleSheet()
+    normal_style = styles['Normal']
+
+    for paragraph in final_text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if paragraph:
+            story.append(Paragraph(paragraph.replace("\n", "<br/>"), normal_style))
+            story.append(Spacer(1, 12))
+    doc.build(story)
+
+
+def build_docx(final_text, docx_path):
+    docx_doc = Document()
+    for paragraph in final_text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if paragraph:
+            docx_doc.add_paragraph(paragraph)
+            docx_doc.add_paragraph("")
+    docx_doc.save(docx_path)
+
+
+# txt is served from the canonical markdown itself, so it has no renderer
+RENDERERS = {
+    "pdf": build_pdf,
+    "docx": build_docx,
+}
+FORMATS = ["pdf", "txt", "docx"]
+
+
+def artifact_name(ocr_file, ext):
+    """Storage name of the ``ext`` output for ``ocr_file`` (see ``storage.py``)."""
+    base_name = Path(ocr_file.file_name).stem
+    return f"outputs/{ocr_file.user_id}/ocr_{base_name}.{ext}"
+
+
+def markdown_name(ocr_file, encoding=None):
+    """Name of the canonical markdown, with a ``.gz`` / ``.zst`` suffix if compressed."""
+    name = artifact_name(ocr_file, "md")
+    if encoding:
+        name += SUFFIXES[encoding]
+    return name
+
+
+def markdown_variants(ocr_file):
+    """Every name the markdown may be stored under, the configured encoding first."""
+    preferred = text_encoding()
+    encodings = [preferred] + [e for e in [None, *SUFFIXES] if e != preferred]
+    return [markdown_name(ocr_file, encoding) for encoding in encodings]
+
+
+def find_markdown(ocr_file):
+    """Name of the stored markdown (compressed or not), or None."""
+    storage = get_storage()
+    for name in markdown_variants(ocr_file):
+        if storage.exists(name):
+            return name
+    return None
+
+
+def _sha256(f):
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: f.read(64 * 1024), b""):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_digest(name):
+    """SHA-256 of a stored file's bytes."""
+    with get_storage().open(name, "rb") as f:
+        return _sha256(f)
+
+
+def _record_digest(ocr_file, ext, digest):
+    ocr_file.output_digests = {**ocr_file.output_digests, ext: digest}
+    OCRFile.objects.filter(id=ocr_file.id).update(output_digests=ocr_file.output_digests)
+
+
+def artifact_digest(ocr_file, ext, name):
+    """
+    SHA-256 of the stored ``ext`` output ``name``, as recorded when it was
+    written. Outputs from before digests were recorded are hashed once here.
+    """
+    digest = ocr_file.output_digests.get(ext)
+    if digest is None:
+        digest = file_digest(name)
+        _record_digest(ocr_file, ext, digest)
+    return digest
+
+
+def write_markdown(ocr_file, final_text):
+    """
+    Persist the canonical OCR text for a job, compressed per
+    ``OCR_TEXT_COMPRESSION``. Returns ``(logical_size, stored_size)`` in bytes.
+    Sets, but does not save, the new ``output_digests`` on ``ocr_file``.
+    """
+    encoding = text_encoding()
+    data = final_text.encode("utf-8")
+    stored = compress(data, encoding)
+    md_name = markdown_name(ocr_file, encoding)
+    get_storage().save(md_name, ContentFile(stored))
+
+    # Drop copies written under another compression setting so they can't shadow this one
+    for name in markdown_variants(ocr_file):
+        if name != md_name:
+            delete_file(name)
+    # Outputs rendered from the previous text are stale now
+    delete_rendered(ocr_file)
+    ocr_file.output_digests = {"txt": hashlib.sha256(stored).hexdigest()}
+    return len(data), len(stored)
+
+
+def load_text(ocr_file):
+    """
+    Read the canonical OCR text. Falls back to the stored pages, then to a
+    legacy eager .txt output.
+    """
+    md_name = find_markdown(ocr_file)
+    if md_name is not None:
+        with open_decoded(md_name) as f:
+            return f.read().decode("utf-8")
+
+    text = load_page_text(ocr_file)
+    if text is not None:
+        return text
+
+    txt_name = artifact_name(ocr_file, "txt")
+    if get_storage().exists(txt_name):
+        with get_storage().open(txt_name, "rb") as f:
+            return f.read().decode("utf-8")
+    return None
+
+
+def ensure_artifact(ocr_file, ext):
+    """
+    Return the storage name of the ``ext`` output for ``ocr_file``, rendering
+    and storing it first if needed. Returns None if there is no OCR text to
+    render from.
+    """
+    if ext == "txt":
+        # May be compressed; downloads.serve_file handles the Content-Encoding
+        md_name = find_markdown(ocr_file)
+        if md_name is not None:
+            return md_name
+
+    storage = get_storage()
+    name = artifact_name(ocr_file, ext)
+    if storage.exists(name):
+        if ext in RENDERERS and not getattr(ocr_file, f"{ext}_size"):
+            # Rendered by another process, or before the size was tracked
+            size = storage.size(name)
+            with transaction.atomic():
+                OCRFile.objects.filter(id=ocr_file.id).update(**{f"{ext}_size": size})
+                setattr(ocr_file, f"{ext}_size", size)
+                refresh_file_stats(ocr_file)
+        return name
+    if ext not in RENDERERS:
+        return None
+
+    final_text = load_text(ocr_file)
+    if final_text is None:
+        return None
+
+    # Render to a local temp file; the storage swaps it in whole, so concurrent
+    # downloads never see a partial file
+    fd, tmp_name = tempfile.mkstemp(suffix=f".{ext}")
+    os.close(fd)
+    try:
+        started = time.perf_counter()
+        RENDERERS[ext](final_text, tmp_name)
+        build_ms = (time.perf_counter() - started) * 1000
+        size = os.path.getsize(tmp_name)
+        with open(tmp_name, "rb") as f:
+            digest = _sha256(f)
+            f.seek(0)
+            storage.save(name, File(f))
+    finally:
+        os.unlink(tmp_name)
+
+    with transaction.atomic():
+        OCRFile.objects.filter(id=ocr_file.id).update(**{f"{ext}_size": size})
+        setattr(ocr_file, f"{ext}_size", size)
+        _record_digest(ocr_file, ext, digest)
+        record_timing(ocr_file, f"{ext}_build", build_ms)
+        refresh_file_stats(ocr_file)
+    RENDER_DURATION.observe(build_ms / 1000, format=ext)
+    return name
+
+
+def delete_rendered(ocr_file):
+    """Remove the PDF/DOCX outputs of ``ocr_file`` so they are rendered again from new text."""
+    for ext in RENDERERS:
+        delete_file(artifact_name(ocr_file, ext))
+
+
+def delete_artifacts(ocr_file):
+    """Remove the markdown and every rendered output for ``ocr_file``."""
+    names = markdown_variants(ocr_file) + [artifact_name(ocr_file, ext) for ext in FORMATS]
+    for name in names:
+        delete_file(name)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path("ws/chat/<int:room_id>/", consumers.ChatConsumer.as_asgi()),
+    path("ws/jobs/", consumers.JobProgressConsumer.as_asgi()),
+]
@@ -0,0 +1,89 @@
+"""
+Full-text search over extracted OCR pages.
+
+Each finished job's pages are stored as ``OCRPage`` rows (see ``pages.py``).
+The database does the indexing and ranking:
+
+- MySQL: a FULLTEXT index on ``text``, ranked with ``MATCH ... AGAINST``
+- SQLite (dev): an external-content FTS5 table kept in sync by triggers,
+  ranked with ``bm25()``
+- anything else: unranked ``icontains`` matching, fine for small data sets
+
+The index and triggers are created in migration 0019.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import OCRPage
+
+FTS_TABLE = "ocr_api_ocrpage_fts"
+SNIPPET_CHARS = 160
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def query_terms(query):
+    return [term.lower() for term in _WORD_RE.findall(query)]
+
+
+def _ranked(pages, query, terms):
+    table = OCRPage._meta.db_table
+    vendor = connection.vendor
+
+    if vendor == "mysql":
+        score = RawSQL(f"MATCH ({table}.text) AGAINST (%s IN NATURAL LANGUAGE MODE)", [query])
+        return pages.annotate(score=score).filter(score__gt=0)
+
+    if vendor == "sqlite":
+        # Quote every term so user input can't be parsed as FTS5 syntax; terms are ANDed
+        match = " ".join(f'"{term}"' for term in terms)
+        # bm25() is lower-is-better, negate it so every backend sorts by -score
+        score = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id",
+            [match],
+        )
+        matched = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        return pages.filter(id__in=matched).annotate(score=score)
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(text__icontains=term)
+    return pages.filter(condition).annotate(score=Value(1.0, output_field=FloatField()))
+
+
+def make_snippet(text, terms, width=SNIPPET_CHARS):
+    """Plain-text excerpt of ``text`` centred on the first matching term."""
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [p for p in positions if p >= 0]
+    start = max(min(positions) - width // 3, 0) if positions else 0
+    end = min(start + width, len(text))
+
+    snippet = " ".join(text[start:end].split())
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet += "…"
+    return snippet
+
+
+def search_pages(files, query, limit=20):
+    """
+    Best matching pages of ``files`` (an OCRFile queryset) for ``query``.
+    Returns ``(page, score, snippet)`` tuples, best first.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    pages = OCRPage.objects.filter(ocr_file__in=files)
+    pages = (
+        _ranked(pages, query, terms)
+        .select_related("ocr_file", "ocr_file__user")
+        .order_by("-score", "ocr_file_id", "page_number")[:limit]
+    )
+    return [(page, page.score, make_snippet(page.text, terms)) for page in pages]
@@ -127,6 +127,32 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         fields = ('id', 'user1', 'user2', 'created_at')
 
 
+class ConversationSerializer(serializers.ModelSerializer):
+    """A ChatRoom from one member's point of view, built from the annotations in ``chat_conversations``."""
+    other_user = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ChatRoom
+        fields = ('id', 'other_user', 'last_message', 'unread_count', 'created_at')
+
+    def get_other_user(self, room):
+        me = self.context["request"].user
+        other = room.user2 if room.user1_id == me.id else room.user1
+        return ChatUserSerializer(other).data
+
+    def get_last_message(self, room):
+        if room.last_message_id is None:
+            return None
+        return {
+            "id": room.last_message_id,
+            "sender": room.last_message_sender,
+            "content": room.last_message_content,
+            "created_at": serializers.DateTimeField().to_representation(room.last_message_at),
+        }
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(source="sender.username", read_only=True)
 
@@ -140,6 +166,7 @@ class MessageSerializer(serializers.ModelSerializer):
             "content",
             "created_at",
             "edited_at",
+            "updated_at",
             "is_edited",
             "is_deleted_for_everyone",
         ]
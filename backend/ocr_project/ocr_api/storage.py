@@ -0,0 +1,237 @@
+"""
+Storage for uploaded inputs and OCR outputs.
+
+Everything under ``uploads/`` and ``outputs/`` goes through the Django
+``Storage`` returned by ``get_storage()``. Its class comes from
+``OCR_STORAGE`` and its constructor kwargs from ``OCR_STORAGE_OPTIONS``,
+just like the OCR backend.
+
+- ``OCRFileSystemStorage``  MEDIA_ROOT on local disk (default)
+- ``S3Storage``             any S3-compatible object store (AWS, MinIO, ...),
+                            needs ``boto3``; lets several app nodes share files
+
+Unlike Django's defaults both overwrite existing names, because every
+artifact has one canonical name per document.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.module_loading import import_string
+
+from .metrics import record_bytes_written
+
+CHUNK_SIZE = 64 * 1024
+
+
+class OCRFileSystemStorage(FileSystemStorage):
+    """
+    Local disk storage that overwrites in place. Writes go to a temp file
+    that is renamed over the target, so readers never see a partial file,
+    and uploads already spooled to disk are moved rather than copied.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        if hasattr(content, "temporary_file_path"):
+            content.file.flush()
+            shutil.move(content.temporary_file_path(), full_path)
+        else:
+            fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in content.chunks(CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(tmp_name, full_path)
+            finally:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+
+        # Temp files are created 0600; apply FILE_UPLOAD_PERMISSIONS so a front
+        # proxy serving offloaded downloads can read them
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        record_bytes_written("filesystem", name, content.size)
+        return name
+
+
+class S3Storage(Storage):
+    """
+    S3-compatible object storage.
+
+    Large files are sent as multipart uploads (boto3 managed transfers, split
+    at ``multipart_threshold`` into ``multipart_chunk_size`` parts), and
+    downloads can be handed to clients as presigned URLs (``presigned_url``).
+    Point ``endpoint_url`` at MinIO or another stand-in for local testing.
+    Unset options fall back to ``OCR_S3_*`` environment variables.
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region_name=None, access_key=None,
+                 secret_key=None, prefix="", multipart_threshold=8 * 1024 * 1024,
+                 multipart_chunk_size=8 * 1024 * 1024, presign_expiry=300):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError as exc:
+            raise ImproperlyConfigured("S3Storage needs boto3 installed") from exc
+
+        self.bucket = bucket or os.getenv("OCR_S3_BUCKET")
+        if not self.bucket:
+            raise ImproperlyConfigured("S3Storage needs a bucket (OCR_S3_BUCKET)")
+        self.prefix = prefix.strip("/")
+        self.presign_expiry = presign_expiry
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunk_size,
+        )
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or os.getenv("OCR_S3_ENDPOINT_URL"),
+            region_name=region_name or os.getenv("OCR_S3_REGION"),
+            aws_access_key_id=access_key or os.getenv("OCR_S3_ACCESS_KEY"),
+            aws_secret_access_key=secret_key or os.getenv("OCR_S3_SECRET_KEY"),
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def _key(self, name):
+        name = name.replace("\\", "/").lstrip("/")
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def _head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, "seek"):
+            content.seek(0)
+        self.client.upload_fileobj(content, self.bucket, self._key(name), Config=self.transfer_config)
+        record_bytes_written("s3", name, content.size)
+        return name
+
+    def _open(self, name, mode="rb"):
+        if "w" in mode:
+            raise ValueError("S3Storage files are written with save()")
+        # Spool the object so callers get a seekable file without holding it all in memory
+        spooled = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16)
+        self.client.download_fileobj(self.bucket, self._key(name), spooled, Config=self.transfer_config)
+        spooled.seek(0)
+        return File(spooled, name=name)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        return self._head(name)["ContentLength"]
+
+    def get_modified_time(self, name):
+        return self._head(name)["LastModified"]
+
+    def url(self, name):
+        return self.presigned_url(name)
+
+    def presigned_url(self, name, download_name=None, content_type=None, content_encoding=None, expiry=None):
+        """A time-limited GET URL, optionally forcing the download filename and headers."""
+        params = {"Bucket": self.bucket, "Key": self._key(name)}
+        if download_name:
+            params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
+        if content_type:
+            params["ResponseContentType"] = content_type
+        if content_encoding:
+            params["ResponseContentEncoding"] = content_encoding
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expiry or self.presign_expiry
+        )
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Return the configured storage, created once per process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            storage_class = import_string(
+                getattr(settings, "OCR_STORAGE", "ocr_api.storage.OCRFileSystemStorage")
+            )
+            _storage = storage_class(**getattr(settings, "OCR_STORAGE_OPTIONS", {}))
+        return _storage
+
+
+def reset_storage():
+    """Forget the cached storage (e.g. after changing settings in tests)."""
+    global _storage
+    with _storage_lock:
+        _storage = None
+
+
+def local_path(name):
+    """Filesystem path of a stored file, or None if the storage is not on local disk."""
+    if os.path.isabs(name):
+        # Inputs recorded before storage names were introduced
+        return name
+    try:
+        return get_storage().path(name)
+    except NotImplementedError:
+        return None
+
+
+@contextmanager
+def local_copy(name):
+    """
+    Yield a local filesystem path for a stored file, downloading it to a
+    temp file first when the storage is remote (e.g. OCR engines that need
+    a real file).
+    """
+    path = local_path(name)
+    if path is not None:
+        yield path
+        return
+
+    fd, tmp_name = tempfile.mkstemp(suffix=Path(name).suffix)
+    try:
+        with os.fdopen(fd, "wb") as dest, get_storage().open(name, "rb") as src:
+            for chunk in src.chunks(CHUNK_SIZE):
+                dest.write(chunk)
+        yield tmp_name
+    finally:
+        os.unlink(tmp_name)
+
+
+def delete_file(name):
+    """Delete a stored file if it exists."""
+    if not name:
+        return
+    if os.path.isabs(name):
+        Path(name).unlink(missing_ok=True)
+        return
+    storage = get_storage()
+    if storage.exists(name):
+        storage.delete(name)
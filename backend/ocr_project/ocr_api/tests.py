@@ -1,3 +1,1397 @@
-from django.test import TestCase
+from datetime import timedelta
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import httpx
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import jobs
+from .analytics import (
+    ROLLUP_FIELDS, USAGE_FIELDS, rebuild_daily_stats, refresh_day, refresh_file_stats, refresh_user_usage, user_usage,
+)
+from .backends import FakeOCRBackend, get_backend, page_result, reset_backend
+from .cache import get_cached_pages, store_pages
+from .models import (
+    ChatRoom, Message, OCRDailyStats, OCRFile, OCRPage, OCRResultCache, OCRTiming, UserProfile, UserUsage,
+)
+from .pages import save_pages
+from .pagination import encode_cursor
+from .pipeline import page_chunks, process_ocr_file, run_ocr
+from .compression import accepts_encoding
+from .downloads import serve_file
+from .metrics import OCR_JOBS, OCR_PAGES, Registry
+from .mistral_client import MistralClient, RateLimitTimeout, TokenBucket, backoff_delay
+from .renderers import RENDERERS, artifact_name, find_markdown, load_text, write_markdown
+from .routing import websocket_urlpatterns
+from .search import search_pages
+from .storage import OCRFileSystemStorage, S3Storage, get_storage, reset_storage
+from .timing import percentile, stage_percentiles
+from .ws_auth import JWTAuthMiddleware
+
+
+class AdminChangelistQueryTests(TestCase):
+    """The user changelists must not run queries per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("Admin", "admin@example.com", "password")
+        UserProfile.objects.create(user=cls.admin, role="admin")
+        cls.add_users(3)
+
+    @classmethod
+    def add_users(cls, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(f"user{i}", f"user{i}@example.com", "password")
+            UserProfile.objects.create(user=user)
+            for status in ("done", "error", "pending"):
+                OCRFile.objects.create(
+                    user=user,
+                    file_name=f"{status}.pdf",
+                    status=status,
+                    pdf_size=1000,
+                    txt_stored_size=200,
+                )
+            refresh_user_usage(user.id)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_changelist_queries(self, url_name, expected):
+        url = reverse(url_name)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # Ten times the rows, same number of queries
+        self.add_users(27)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_user_profile_changelist(self):
+        response = self.assert_changelist_queries("admin:ocr_api_userprofile_changelist", 5)
+        self.assertContains(response, "3.52 KB")
+
+    def test_user_changelist(self):
+        self.assert_changelist_queries("admin:auth_user_changelist", 5)
+
+    def test_user_change_form_stats(self):
+        user = User.objects.get(username="user1")
+        response = self.client.get(reverse("admin:auth_user_change", args=[user.id]))
+        self.assertContains(response, "<strong>Total Documents:</strong> 3", html=False)
+
+
+class OCRJobTestMixin:
+    """Jobs run inline on the fake backend, with files in a throwaway MEDIA_ROOT."""
+    backend_options = {"pages": 2}
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        ocr_settings = override_settings(
+            MEDIA_ROOT=media_root,
+            OCR_BACKEND="ocr_api.backends.FakeOCRBackend",
+            OCR_BACKEND_OPTIONS=self.backend_options,
+            OCR_STORAGE="ocr_api.storage.OCRFileSystemStorage",
+            OCR_STORAGE_OPTIONS={},
+            OCR_TEXT_COMPRESSION=None,
+            OCR_UPLOAD_RETENTION="delete",
+            OCR_JOB_QUEUE="database",
+            OCR_RUN_WORKERS_IN_PROCESS=False,
+            OCR_MAX_JOBS_PER_USER=2,
+        )
+        ocr_settings.enable()
+        self.addCleanup(ocr_settings.disable)
+        for reset in (reset_backend, reset_storage):
+            reset()
+            self.addCleanup(reset)
+
+        self.user = User.objects.create_user("alice", "alice@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_job(self, file_name="scan.png", data=b"scan", status="pending", user=None, **fields):
+        user = user or self.user
+        input_path = f"uploads/{user.id}/{file_name}"
+        get_storage().save(input_path, ContentFile(data))
+        return OCRFile.objects.create(
+            user=user,
+            file_name=file_name,
+            status=status,
+            sha256=hashlib.sha256(data).hexdigest(),
+            output_formats=["txt"],
+            input_path=input_path,
+            **fields,
+        )
+
+    def download(self, ocr_file, ext="txt", **headers):
+        return self.client.get(
+            reverse("ocr-download", args=[ocr_file.file_name]), {"ext": ext}, **headers
+        )
+
+    def run_job(self, ocr_file):
+        self.assertTrue(jobs.claim_job(ocr_file.id))
+        jobs.execute_job(ocr_file.id)
+        ocr_file.refresh_from_db()
+        return ocr_file
+
+
+class JobQueueTests(OCRJobTestMixin, TestCase):
+    def test_claim_job_only_once(self):
+        job = self.make_job()
+        self.assertTrue(jobs.claim_job(job.id))
+        self.assertFalse(jobs.claim_job(job.id))
+
+    def test_claim_next_job_skips_users_at_their_cap(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.make_job("a.png", status="processing")
+        self.make_job("b.png", status="processing")
+        waiting = self.make_job("c.png")
+        other = self.make_job("d.png", user=bob)
+
+        self.assertEqual(jobs.claim_next_job(), other.id)
+        self.assertIsNone(jobs.claim_next_job())
+
+        OCRFile.objects.filter(file_name="a.png").update(status="done")
+        self.assertEqual(jobs.claim_next_job(), waiting.id)
+
+    def test_execute_job(self):
+        job = self.run_job(self.make_job())
+        self.assertEqual((job.status, job.stage), ("done", "done"))
+        self.assertEqual(job.page_count, 2)
+        self.assertGreater(job.txt_size, 0)
+        self.assertEqual(job.pages.count(), 2)
+        self.assertFalse(get_storage().exists(job.input_path))
+
+    def test_failed_job_is_marked_errored(self):
+        with mock.patch("ocr_api.jobs.process_ocr_file", side_effect=RuntimeError("boom")), \
+                self.assertLogs("ocr_api.jobs", "ERROR"):
+            job = self.run_job(self.make_job())
+        self.assertEqual((job.status, job.error_message), ("error", "boom"))
+
+    def test_crashing_job_does_not_stop_the_queue(self):
+        first = self.make_job("a.png")
+        second = self.make_job("b.png")
+        with mock.patch("ocr_api.jobs.process_ocr_file", side_effect=RuntimeError("boom")), \
+                mock.patch("ocr_api.jobs._fail_job", side_effect=RuntimeError("db gone")), \
+                self.assertLogs("ocr_api.jobs", "ERROR"):
+            jobs.drain_queue()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.error_message), ("error", "db gone"))
+        self.assertEqual(second.status, "error")
+
+    def test_missing_job_is_skipped(self):
+        job = self.make_job()
+        self.assertTrue(jobs.claim_job(job.id))
+        OCRFile.objects.filter(id=job.id).delete()
+        with self.assertLogs("ocr_api.jobs", "WARNING"):
+            jobs.run_job(job.id)
+        self.assertFalse(OCRFile.objects.filter(id=job.id).exists())
+
+    def test_delete_refuses_running_jobs(self):
+        job = self.make_job(status="processing")
+        response = self.client.delete(reverse("ocr-delete", args=[job.file_name]))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(OCRFile.objects.filter(id=job.id).exists())
+
+
+class DeletedJobTests(OCRJobTestMixin, TransactionTestCase):
+    """A row deleted while its job runs must stay deleted."""
+
+    def test_job_deleted_while_processing(self):
+        job = self.make_job()
+
+        def delete_then_save(ocr_file, pages):
+            OCRFile.objects.filter(id=ocr_file.id).delete()
+            save_pages(ocr_file, pages)
+
+        with mock.patch("ocr_api.pipeline.save_pages", side_effect=delete_then_save), \
+                self.assertLogs("ocr_api.jobs", "WARNING"):
+            self.assertTrue(jobs.claim_job(job.id))
+            jobs.run_job(job.id)
+
+        self.assertFalse(OCRFile.objects.filter(id=job.id).exists())
+        self.assertFalse(OCRPage.objects.filter(ocr_file_id=job.id).exists())
+        self.assertFalse(get_storage().exists(job.input_path))
+        self.assertFalse(get_storage().exists(f"outputs/{self.user.id}/ocr_scan.md"))
+
+    def test_job_deleted_before_finishing(self):
+        job = self.make_job()
+
+        def process_then_delete(ocr_file):
+            process_ocr_file(ocr_file)
+            OCRFile.objects.filter(id=ocr_file.id).delete()
+
+        with mock.patch("ocr_api.jobs.process_ocr_file", side_effect=process_then_delete), \
+                self.assertLogs("ocr_api.jobs", "WARNING"):
+            self.assertTrue(jobs.claim_job(job.id))
+            jobs.run_job(job.id)
+
+        self.assertFalse(OCRFile.objects.filter(id=job.id).exists())
+
+
+@override_settings(OCR_CACHE_ENABLED=True, OCR_CACHE_MAX_BYTES=10 ** 9, OCR_CACHE_MAX_ENTRIES=2)
+class ResultCacheTests(OCRJobTestMixin, TestCase):
+    def pages(self, *texts):
+        return [page_result(text, width=100, height=200) for text in texts]
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(get_cached_pages("a" * 64, "model"))
+        store_pages("a" * 64, "model", self.pages("one", "two"), {"dpi": 200})
+
+        self.assertEqual(get_cached_pages("a" * 64, "model", {"dpi": 200}), self.pages("one", "two"))
+        # Another model or options is another entry
+        self.assertIsNone(get_cached_pages("a" * 64, "model"))
+        self.assertIsNone(get_cached_pages("a" * 64, "other", {"dpi": 200}))
+        self.assertEqual(OCRResultCache.objects.get().hit_count, 1)
+
+    def test_evicts_least_recently_used(self):
+        store_pages("a" * 64, "model", self.pages("a"))
+        store_pages("b" * 64, "model", self.pages("b"))
+        get_cached_pages("a" * 64, "model")
+        store_pages("c" * 64, "model", self.pages("c"))
+
+        self.assertEqual(
+            sorted(OCRResultCache.objects.values_list("file_sha256", flat=True)),
+            ["a" * 64, "c" * 64],
+        )
+
+    @override_settings(OCR_CACHE_MAX_ENTRIES=10, OCR_CACHE_MAX_BYTES=3)
+    def test_evicts_down_to_the_byte_budget(self):
+        store_pages("a" * 64, "model", self.pages("aa"))
+        store_pages("b" * 64, "model", self.pages("bb"))
+        self.assertEqual(list(OCRResultCache.objects.values_list("file_sha256", flat=True)), ["b" * 64])
+
+    def test_reupload_skips_the_backend(self):
+        first = self.run_job(self.make_job("a.png", data=b"same"))
+        with mock.patch.object(FakeOCRBackend, "process") as process:
+            second = self.run_job(self.make_job("b.png", data=b"same"))
+        process.assert_not_called()
+        self.assertEqual(second.pages.count(), first.pages.count())
+        self.assertTrue(second.timing.cache_hit)
+
+
+class LazyRenderTests(OCRJobTestMixin, TestCase):
+    def test_renders_on_first_download_only(self):
+        job = self.run_job(self.make_job())
+        pdf_name = artifact_name(job, "pdf")
+        self.assertFalse(get_storage().exists(pdf_name))
+
+        response = self.download(job, "pdf")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        job.refresh_from_db()
+        self.assertEqual(job.pdf_size, get_storage().size(pdf_name))
+        self.assertIsNotNone(job.timing.pdf_build_ms)
+
+        build_pdf = mock.Mock()
+        with mock.patch.dict(RENDERERS, pdf=build_pdf):
+            self.assertEqual(self.download(job, "pdf").status_code, 200)
+        build_pdf.assert_not_called()
+
+    def test_new_text_drops_rendered_outputs(self):
+        job = self.run_job(self.make_job())
+        self.download(job, "docx")
+        self.assertTrue(get_storage().exists(artifact_name(job, "docx")))
+
+        write_markdown(job, "new text")
+        self.assertFalse(get_storage().exists(artifact_name(job, "docx")))
+
+    def test_not_ready(self):
+        job = self.make_job()
+        self.assertEqual(self.download(job, "pdf").status_code, 409)
+
+
+@override_settings(
+    OCR_PARALLEL_PAGES=True,
+    OCR_PARALLEL_MIN_PAGES=5,
+    OCR_PAGE_CHUNK_SIZE=2,
+    OCR_MAX_CONCURRENT_CHUNKS=2,
+    OCR_CHUNK_RETRIES=0,
+)
+class ParallelPagesTests(TestCase):
+    def setUp(self):
+        self.backend = FakeOCRBackend(pages=7)
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+            f.write(b"scan")
+        self.addCleanup(os.unlink, f.name)
+        self.input_path = f.name
+
+    def test_page_chunks(self):
+        self.assertEqual(page_chunks(5, 2), [[0, 1], [2, 3], [4]])
+
+    def test_results_in_page_order(self):
+        stages = []
+        pages = run_ocr(self.backend, self.input_path, "doc.png", lambda stage, **fields: stages.append(fields))
+        numbers = [re.search(r"Page (\d+) of 7", page["markdown"]).group(1) for page in pages]
+        self.assertEqual(numbers, [str(n) for n in range(1, 8)])
+        self.assertEqual(stages[-1], {"pages_done": 7})
+
+    def test_failed_chunk_cancels_the_rest(self):
+        calls = []
+        process = self.backend.process
+
+        def fail_first(handle, pages=None):
+            calls.append(pages)
+            if pages == [0, 1]:
+                raise RuntimeError("boom")
+            return process(handle, pages)
+
+        self.backend.process = fail_first
+        with override_settings(OCR_MAX_CONCURRENT_CHUNKS=1), self.assertRaises(RuntimeError):
+            run_ocr(self.backend, self.input_path, "doc.png")
+        self.assertEqual(calls, [[0, 1]])
+
+
+class BackendSettingsTests(TestCase):
+    def setUp(self):
+        reset_backend()
+        self.addCleanup(reset_backend)
+
+    @override_settings(OCR_BACKEND="ocr_api.backends.FakeOCRBackend", OCR_BACKEND_OPTIONS={"pages": 3})
+    def test_configured_backend(self):
+        backend = get_backend()
+        self.assertIsInstance(backend, FakeOCRBackend)
+        self.assertEqual(backend.options, {"pages": 3})
+        self.assertIs(get_backend(), backend)
+
+    def test_fake_backend_is_deterministic(self):
+        backend = FakeOCRBackend(pages=2)
+        handle = {"file_name": "a.png", "digest": "0" * 64, "pages": 2}
+        self.assertEqual(backend.process(handle), backend.process(handle))
+        self.assertEqual(len(backend.process(handle, [1])), 1)
+
+
+class UploadTests(OCRJobTestMixin, TestCase):
+    def upload(self, name, data):
+        with self.captureOnCommitCallbacks():
+            return self.client.post(
+                reverse("ocr-upload"),
+                {"file": SimpleUploadedFile(name, data), "output_formats": '["txt"]'},
+            )
+
+    def assert_stored(self, response, data):
+        self.assertEqual(response.status_code, 202)
+        job = OCRFile.objects.get(id=response.data["job_id"])
+        self.assertEqual((job.status, job.output_formats), ("pending", ["txt"]))
+        self.assertEqual(job.sha256, hashlib.sha256(data).hexdigest())
+        with get_storage().open(job.input_path) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_small_upload_is_hashed_in_memory(self):
+        data = b"small scan"
+        self.assert_stored(self.upload("small.png", data), data)
+
+    def test_large_upload_is_moved_into_place(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        data = os.urandom(64 * 1024)
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024, FILE_UPLOAD_TEMP_DIR=temp_dir):
+            self.assert_stored(self.upload("large.png", data), data)
+        self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_reupload_while_processing_is_rejected(self):
+        job = self.make_job("busy.png", status="processing")
+        response = self.upload("busy.png", b"again")
+        self.assertEqual((response.status_code, response.data["job_id"]), (409, job.id))
+
+
+class BatchUploadTests(OCRJobTestMixin, TestCase):
+    def upload(self, *names):
+        files = [SimpleUploadedFile(name, name.encode()) for name in names]
+        with self.captureOnCommitCallbacks():
+            return self.client.post(
+                reverse("ocr-batch-upload"), {"files": files, "output_formats": '["txt"]'}
+            )
+
+    def test_batch(self):
+        self.make_job("busy.png", status="processing")
+        response = self.upload("a.png", "b.png", "busy.png")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([job["file_name"] for job in response.data["jobs"]], ["a.png", "b.png"])
+        self.assertEqual([job["file_name"] for job in response.data["rejected"]], ["busy.png"])
+
+        batch_url = reverse("ocr-batch-status", args=[response.data["batch_id"]])
+        self.assertEqual(self.client.get(batch_url).data["progress"], 0)
+        jobs.drain_queue()
+        status = self.client.get(batch_url).data
+        self.assertEqual((status["counts"]["done"], status["complete"]), (2, True))
+
+    @override_settings(OCR_BATCH_MAX_FILES=2)
+    def test_too_many_files(self):
+        self.assertEqual(self.upload("a.png", "b.png", "c.png").status_code, 400)
+        self.assertFalse(OCRFile.objects.exists())
+
+    def test_other_users_batch(self):
+        response = self.upload("a.png")
+        self.client.force_authenticate(User.objects.create_user("bob", "bob@example.com", "password"))
+        batch_url = reverse("ocr-batch-status", args=[response.data["batch_id"]])
+        self.assertEqual(self.client.get(batch_url).status_code, 403)
+
+
+class HistoryPaginationTests(OCRJobTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Ties on uploaded_at must not drop or repeat rows across pages
+        uploaded_at = timezone.now()
+        for i in range(5):
+            self.make_job(f"{i}.png", status="done")
+        OCRFile.objects.update(uploaded_at=uploaded_at)
+
+    def history(self, **params):
+        return self.client.get(reverse("ocr-history"), params)
+
+    def test_pages_through_everything_once(self):
+        names = []
+        params = {"limit": 2, "fields": "file_name"}
+        while True:
+            response = self.history(**params)
+            self.assertEqual(response.status_code, 200)
+            names += [item["file_name"] for item in response.data["results"]]
+            if not response.data["next_cursor"]:
+                break
+            params["cursor"] = response.data["next_cursor"]
+        self.assertEqual(names, [f"{i}.png" for i in reversed(range(5))])
+
+    def test_field_selection(self):
+        response = self.history(fields="file_name,status,bogus")
+        self.assertEqual(set(response.data["results"][0]), {"file_name", "status"})
+        self.assertEqual(self.history(fields="bogus").status_code, 400)
+
+    def test_tampered_cursors(self):
+        for cursor in ("not base64!", encode_cursor("yesterday", 1), encode_cursor(timezone.now(), "1"),
+                       encode_cursor(timezone.now()), encode_cursor({"id": 1}, 1)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.history(cursor=cursor).status_code, 400)
+
+    def test_only_own_files(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.make_job("bob.png", user=bob, status="done")
+        names = [item["file_name"] for item in self.history(fields="file_name").data["results"]]
+        self.assertNotIn("bob.png", names)
+
+
+class AllUsersViewTests(OCRJobTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("Admin", "admin@example.com", "password")
+        UserProfile.objects.create(user=self.admin, role="admin")
+        for status in ("done", "error"):
+            self.make_job(f"{status}.png", status=status, pdf_size=100, txt_stored_size=20)
+        refresh_user_usage(self.user.id)
+        self.client.force_authenticate(self.admin)
+
+    def users(self, **params):
+        return self.client.get(reverse("auth-users"), params)
+
+    def test_pages_with_usage(self):
+        response = self.users(limit=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["summary"], {"total": 2, "admins": 1, "active": 1})
+        alice = response.data["results"][0]
+        self.assertEqual((alice["username"], alice["total_uploads"], alice["total_size"]), ("alice", 2, 240))
+
+        response = self.users(limit=1, cursor=response.data["next_cursor"])
+        self.assertEqual([user["username"] for user in response.data["results"]], ["Admin"])
+        self.assertIsNone(response.data["next_cursor"])
+        self.assertNotIn("summary", response.data)
+
+    def test_tampered_cursors(self):
+        for cursor in ("garbage", encode_cursor("1"), encode_cursor([1]), encode_cursor(1, 2)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.users(cursor=cursor).status_code, 400)
+
+    def test_user_documents(self):
+        url = reverse("auth-user-documents", args=["alice"])
+        response = self.client.get(url, {"limit": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+        response = self.client.get(url, {"limit": 1, "cursor": response.data["next_cursor"]})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next_cursor"])
+        self.assertEqual(self.client.get(url, {"cursor": encode_cursor(1, 1)}).status_code, 400)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.users().status_code, 403)
+
+
+class ChatTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.room = ChatRoom.get_or_create_room(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(room=self.room, sender=self.bob, content=f"message {i}")
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.messages_url = f"/api/ocr/chat/messages/{self.room.id}/"
+
+
+class ChatHistoryTests(ChatTestMixin, TestCase):
+    def contents(self, response):
+        return [message["content"] for message in response.data["results"]]
+
+    def test_pages_backwards_in_time(self):
+        response = self.client.get(self.messages_url, {"limit": 2})
+        self.assertEqual(self.contents(response), ["message 3", "message 4"])
+        response = self.client.get(self.messages_url, {"limit": 2, "cursor": response.data["next_cursor"]})
+        self.assertEqual(self.contents(response), ["message 1", "message 2"])
+        response = self.client.get(self.messages_url, {"limit": 2, "cursor": response.data["next_cursor"]})
+        self.assertEqual(self.contents(response), ["message 0"])
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_since_id_returns_new_and_edited_messages(self):
+        since = self.messages[2].id
+        edited = self.messages[0]
+        edited.content = "edited"
+        edited.save()
+        response = self.client.get(self.messages_url, {"since": since})
+        self.assertEqual(self.contents(response), ["edited", "message 3", "message 4"])
+
+    def test_since_timestamp(self):
+        response = self.client.get(self.messages_url, {"limit": 1})
+        Message.objects.create(room=self.room, sender=self.bob, content="later")
+        response = self.client.get(self.messages_url, {"since": response.data["server_time"].isoformat()})
+        self.assertEqual(self.contents(response), ["later"])
+
+    def test_bad_since_and_cursor(self):
+        self.assertEqual(self.client.get(self.messages_url, {"since": "yesterday"}).status_code, 400)
+        self.assertEqual(self.client.get(self.messages_url, {"cursor": encode_cursor(1, 1)}).status_code, 400)
+
+
+def websocket(path, user=None):
+    """A communicator for ``path`` on the WebSocket router, authenticated as ``user``."""
+    if user is not None:
+        path += f"?token={AccessToken.for_user(user)}"
+    return WebsocketCommunicator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), path)
+
+
+class ChatSocketTests(ChatTestMixin, TransactionTestCase):
+    async def test_receives_new_messages(self):
+        communicator = websocket(f"ws/chat/{self.room.id}/", self.alice)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        self.client.force_authenticate(self.bob)
+        await sync_to_async(self.client.post)(self.messages_url, {"content": "hello"})
+        event = await communicator.receive_json_from(timeout=2)
+        self.assertEqual((event["event"], event["message"]["content"]), ("message.created", "hello"))
+        await communicator.disconnect()
+
+    async def test_rejects_outsiders(self):
+        carol = await sync_to_async(User.objects.create_user)("carol", "carol@example.com", "password")
+        for user in (None, carol):
+            communicator = websocket(f"ws/chat/{self.room.id}/", user)
+            connected, code = await communicator.connect()
+            self.assertEqual((connected, code), (False, 4403))
+
+
+class JobProgressSocketTests(OCRJobTestMixin, TransactionTestCase):
+    async def test_streams_stages_to_the_owner(self):
+        communicator = websocket("ws/jobs/", self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        job = await sync_to_async(self.make_job)()
+        await sync_to_async(self.run_job)(job)
+        stages = []
+        while not stages or stages[-1] != "done":
+            event = await communicator.receive_json_from(timeout=2)
+            self.assertEqual((event["event"], event["job"]["job_id"]), ("job.progress", job.id))
+            stages.append(event["job"]["stage"])
+        self.assertEqual(stages, ["uploading", "ocr", "ocr", "rendering", "done"])
+        await communicator.disconnect()
+
+    async def test_requires_authentication(self):
+        connected, code = await websocket("ws/jobs/").connect()
+        self.assertEqual((connected, code), (False, 4401))
+
+
+class ConversationTests(ChatTestMixin, TestCase):
+    def conversations(self):
+        return self.client.get(reverse("chat-conversations")).data
+
+    def test_preview_and_unread_count_in_one_query(self):
+        for i in range(3):
+            other = User.objects.create_user(f"other{i}", f"other{i}@example.com", "password")
+            ChatRoom.get_or_create_room(self.alice, other)
+        with self.assertNumQueries(1):
+            rooms = self.conversations()
+        self.assertEqual(len(rooms), 4)
+        self.assertEqual(rooms[0]["other_user"]["username"], "bob")
+        self.assertEqual(rooms[0]["last_message"]["content"], "message 4")
+        self.assertEqual(rooms[0]["unread_count"], 5)
+        self.assertIsNone(rooms[1]["last_message"])
+
+    def test_mark_read(self):
+        url = reverse("chat-mark-read", args=[self.room.id])
+        Message.objects.create(room=self.room, sender=self.alice, content="mine")
+        response = self.client.post(url, {"up_to": self.messages[2].id})
+        self.assertEqual(response.data, {"marked_read": 3})
+        self.assertEqual(self.conversations()[0]["unread_count"], 2)
+
+        self.assertEqual(self.client.post(url, {"up_to": "x"}).status_code, 400)
+        self.assertEqual(self.client.post(url).data, {"marked_read": 2})
+        self.assertFalse(Message.objects.get(content="mine").is_read)
+
+    def test_mark_read_in_other_rooms(self):
+        carol = User.objects.create_user("carol", "carol@example.com", "password")
+        self.client.force_authenticate(carol)
+        self.assertEqual(self.client.post(reverse("chat-mark-read", args=[self.room.id])).status_code, 404)
+
+
+class DownloadTests(OCRJobTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.run_job(self.make_job())
+        self.body = b"".join(self.download(self.job).streaming_content)
+
+    def test_strong_content_etag(self):
+        response = self.download(self.job)
+        self.assertEqual(response["ETag"], f'"{hashlib.sha256(self.body).hexdigest()[:32]}"')
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        # Rewriting identical text keeps the tag
+        write_markdown(self.job, self.body.decode())
+        self.assertEqual(self.download(self.job)["ETag"], response["ETag"])
+
+    def test_not_modified(self):
+        etag = self.download(self.job)["ETag"]
+        self.assertEqual(self.download(self.job, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.download(self.job, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_ranges(self):
+        response = self.download(self.job, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 2-5/{len(self.body)}")
+        self.assertEqual(b"".join(response.streaming_content), self.body[2:6])
+
+        response = self.download(self.job, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(response.streaming_content), self.body[-3:])
+        self.assertEqual(self.download(self.job, HTTP_RANGE=f"bytes={len(self.body)}-").status_code, 416)
+
+    def test_if_range(self):
+        response = self.download(self.job)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        for if_range, status in ((etag, 206), (last_modified, 206), ('"stale"', 200),
+                                 (f"W/{etag}", 200), ("Mon, 01 Jan 2001 00:00:00 GMT", 200)):
+            with self.subTest(if_range=if_range):
+                response = self.download(self.job, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)
+
+    def test_legacy_row_is_hashed_once(self):
+        etag = self.download(self.job)["ETag"]
+        OCRFile.objects.filter(id=self.job.id).update(output_digests={})
+        self.assertEqual(self.download(self.job)["ETag"], etag)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.output_digests["txt"][:32], etag.strip('"'))
+
+    def test_rendered_outputs_get_digests(self):
+        response = self.download(self.job, "docx")
+        body = b"".join(response.streaming_content)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.output_digests["docx"], hashlib.sha256(body).hexdigest())
+
+    @override_settings(OCR_TEXT_COMPRESSION="gzip")
+    def test_compressed_text(self):
+        job = self.run_job(self.make_job("zipped.png"))
+        stored = self.download(job, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(stored["Content-Encoding"], "gzip")
+        decoded = self.download(job)
+        self.assertFalse(decoded.has_header("Content-Encoding"))
+        self.assertEqual(decoded["Accept-Ranges"], "none")
+        self.assertEqual(gzip.decompress(b"".join(stored.streaming_content)), b"".join(decoded.streaming_content))
+        self.assertNotEqual(stored["ETag"], decoded["ETag"])
+
+
+class ExportTests(OCRJobTestMixin, TestCase):
+    def export(self, **data):
+        response = self.client.post(reverse("ocr-export-zip"), data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_entry_names_are_unique(self):
+        self.run_job(self.make_job("a.jpg"))
+        second = self.run_job(self.make_job("a.png"))
+        OCRFile.objects.filter(id=second.id).update(output_formats=["txt", "docx"])
+        self.make_job("pending.png")
+
+        archive = self.export()
+        self.assertEqual(archive.namelist(), ["ocr_a.txt", f"ocr_a_{second.id}.txt", "ocr_a.docx"])
+        self.assertEqual(archive.getinfo("ocr_a.txt").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo("ocr_a.docx").compress_type, zipfile.ZIP_STORED)
+        self.assertTrue(archive.read("ocr_a.txt").startswith(b"# a."))
+
+    def test_filters(self):
+        job = self.run_job(self.make_job("a.png"))
+        self.run_job(self.make_job("b.png"))
+        self.assertEqual(self.export(ids=[job.id]).namelist(), ["ocr_a.txt"])
+        self.assertEqual(self.export(formats=["pdf"]).namelist(), [])
+        response = self.client.post(reverse("ocr-export-zip"), {"ids": ["1"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_export_has_user_folders(self):
+        self.run_job(self.make_job("a.png"))
+        self.client.force_authenticate(User.objects.create_user("Admin", "admin@example.com", "password"))
+        self.assertEqual(self.export().namelist(), ["alice/ocr_a.txt"])
+
+
+class OutputFormatsBackfillTests(TransactionTestCase):
+    migrate_from = ("ocr_api", "0025_ocrfile_output_digests")
+    migrate_to = ("ocr_api", "0026_backfill_output_formats")
+
+    def tearDown(self):
+        MigrationExecutor(connection).migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_formats_from_urls(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_from])
+        OldOCRFile = executor.loader.project_state([self.migrate_from]).apps.get_model("ocr_api", "OCRFile")
+        legacy = OldOCRFile.objects.create(file_name="old.pdf", pdf_url="http://x/a.pdf", txt_url="http://x/a.txt")
+        current = OldOCRFile.objects.create(file_name="new.pdf", txt_url="http://x/b.txt", output_formats=["docx"])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([self.migrate_to])
+        self.assertEqual(OCRFile.objects.get(id=legacy.id).output_formats, ["pdf", "txt"])
+        self.assertEqual(OCRFile.objects.get(id=current.id).output_formats, ["docx"])
+
+
+# InnoDB FULLTEXT indexes only see committed rows, and TestCase never commits
+@skipUnless(connection.vendor == "sqlite", "exercises the SQLite FTS5 index and its triggers")
+class SearchTests(OCRJobTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = self.make_job("report.png", status="done")
+        save_pages(self.job, [page_result("quarterly revenue grew"), page_result("revenue revenue table")])
+
+    def search(self, query, files=None):
+        files = OCRFile.objects.filter(status="done") if files is None else files
+        return [(page.ocr_file_id, page.page_number) for page, _, _ in search_pages(files, query)]
+
+    def test_ranked_matches(self):
+        self.assertEqual(self.search("revenue"), [(self.job.id, 2), (self.job.id, 1)])
+        # Terms are ANDed, and FTS syntax in the query is just text
+        self.assertEqual(self.search("quarterly revenue"), [(self.job.id, 1)])
+        self.assertEqual(self.search('revenue" OR "x'), [])
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_index_follows_page_changes(self):
+        save_pages(self.job, [page_result("annual summary")])
+        self.assertEqual(self.search("revenue"), [])
+        self.assertEqual(self.search("annual"), [(self.job.id, 1)])
+
+        OCRPage.objects.filter(ocr_file=self.job).update(text="monthly summary")
+        self.assertEqual(self.search("annual"), [])
+        self.assertEqual(self.search("monthly"), [(self.job.id, 1)])
+
+        OCRFile.objects.filter(id=self.job.id).delete()
+        self.assertEqual(self.search("monthly", OCRFile.objects.all()), [])
+
+    def test_view_is_scoped_to_the_user(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        other = self.make_job("other.png", user=bob, status="done")
+        save_pages(other, [page_result("revenue elsewhere")])
+        pending = self.make_job("pending.png")
+        save_pages(pending, [page_result("revenue pending")])
+
+        response = self.client.get(reverse("ocr-search"), {"q": "revenue"})
+        self.assertEqual({hit["job_id"] for hit in response.data["results"]}, {self.job.id})
+        self.assertIn("revenue", response.data["results"][0]["snippet"])
+        self.assertEqual(self.client.get(reverse("ocr-search")).status_code, 400)
+
+
+class MetricsEndpointTests(TestCase):
+    @override_settings(OCR_METRICS_TOKEN=None, INTERNAL_IPS=[])
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    @override_settings(OCR_METRICS_TOKEN=None, INTERNAL_IPS=["127.0.0.1"])
+    def test_open_to_internal_ips(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE", response.content)
+
+    @override_settings(OCR_METRICS_TOKEN="secret", INTERNAL_IPS=["127.0.0.1"])
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        # Claim this process's flusher up front so no thread or atexit hook is started
+        self.registry._flusher_pid = os.getpid()
+        self.registry._snapshot_name = "metrics-self.json"
+        self.jobs = self.registry.counter("jobs_total", "Jobs.", ("status",))
+        self.latency = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+
+    def test_render(self):
+        self.jobs.inc(status="done")
+        self.jobs.inc(2, status="done")
+        self.jobs.inc(status='say "hi"')
+        for value in (0.05, 0.1, 0.5, 3):
+            self.latency.observe(value)
+
+        self.assertEqual(self.registry.render().splitlines(), [
+            "# HELP jobs_total Jobs.",
+            "# TYPE jobs_total counter",
+            'jobs_total{status="done"} 3',
+            'jobs_total{status="say \\"hi\\""} 1',
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            "latency_seconds_sum 3.65",
+            "latency_seconds_count 4",
+        ])
+
+    def test_rejects_bad_labels_and_duplicates(self):
+        with self.assertRaises(ValueError):
+            self.jobs.inc(outcome="done")
+        with self.assertRaises(ValueError):
+            self.registry.counter("jobs_total", "Again.")
+
+    def test_gauges(self):
+        self.registry.gauge("answer", "Computed at scrape time.")(lambda totals: 42)
+        self.registry.gauge("queue", "By label.")(lambda totals: {"label": "state", "values": {"queued": 1}})
+        with self.assertLogs("ocr_api.metrics", "ERROR"):
+            self.registry.gauge("broken", "Raises.")(lambda totals: 1 / 0)
+            lines = self.registry.render().splitlines()
+        self.assertIn("answer 42", lines)
+        self.assertIn('queue{state="queued"} 1', lines)
+        self.assertFalse(any(line.startswith("broken") for line in lines))
+
+    def test_sums_other_processes_snapshots(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(OCR_METRICS_DIR=directory):
+            self.jobs.inc(status="done")
+            self.registry.flush()
+            # Another worker's snapshot, plus junk that must not break the scrape
+            other = Registry()
+            other.counter("jobs_total", "Jobs.", ("status",))._values = {'["done"]': 4, '["error"]': 1}
+            with open(os.path.join(directory, "metrics-other.json"), "w") as f:
+                json.dump(other.snapshot(), f)
+            with open(os.path.join(directory, "metrics-junk.json"), "w") as f:
+                f.write("{")
+
+            # Our own snapshot is stale; live values count instead
+            self.jobs.inc(status="done")
+            self.assertEqual(self.registry.collect()["jobs_total"], {'["done"]': 6, '["error"]': 1})
+
+
+class JobMetricsTests(OCRJobTestMixin, TestCase):
+    @override_settings(OCR_CHUNK_RETRIES=0)
+    def test_finished_jobs_are_counted(self):
+        done, pages = OCR_JOBS.snapshot().get('["done"]', 0), OCR_PAGES.snapshot().get('["ocr"]', 0)
+        self.run_job(self.make_job())
+        self.assertEqual(OCR_JOBS.snapshot()['["done"]'], done + 1)
+        self.assertEqual(OCR_PAGES.snapshot()['["ocr"]'], pages + 2)
+
+        errors = OCR_JOBS.snapshot().get('["error"]', 0)
+        job = self.make_job("b.png", data=b"other")
+        with mock.patch.object(FakeOCRBackend, "process", side_effect=ValueError("boom")), \
+                self.assertLogs("ocr_api.jobs", "ERROR"):
+            self.run_job(job)
+        self.assertEqual(OCR_JOBS.snapshot()['["error"]'], errors + 1)
+
+
+class JobPagesTests(OCRJobTestMixin, TestCase):
+    backend_options = {"pages": 12}
+
+    def pages(self, job, **params):
+        return self.client.get(reverse("ocr-job-pages", args=[job.id]), params)
+
+    def test_page_ranges(self):
+        job = self.run_job(self.make_job())
+        response = self.pages(job)
+        self.assertEqual(response.data["page_count"], 12)
+        self.assertEqual([page["page"] for page in response.data["pages"]], list(range(1, 11)))
+        self.assertEqual(response.data["pages"][0]["width"], 1700)
+
+        response = self.pages(job, **{"from": 11, "to": 99})
+        self.assertEqual([page["page"] for page in response.data["pages"]], [11, 12])
+        self.assertEqual(self.pages(job, **{"from": "x"}).status_code, 400)
+
+    def test_pages_rebuild_the_text(self):
+        job = self.run_job(self.make_job())
+        text = b"".join(self.download(job).streaming_content).decode()
+        self.assertEqual(text, "\n\n".join(page.text for page in job.pages.all()))
+
+    def test_not_ready_or_not_yours(self):
+        self.assertEqual(self.pages(self.make_job("pending.png")).status_code, 409)
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.assertEqual(self.pages(self.make_job("bob.png", user=bob, status="done")).status_code, 403)
+
+
+class TextCompressionTests(OCRJobTestMixin, TestCase):
+    text = "# Scan\n\n" + "The same line of OCR text, over and over.\n" * 200
+
+    def test_gzip_round_trip(self):
+        job = self.make_job(status="done")
+        with override_settings(OCR_TEXT_COMPRESSION="gzip"):
+            logical, stored = write_markdown(job, self.text)
+            self.assertEqual(find_markdown(job), artifact_name(job, "md") + ".gz")
+            self.assertEqual(logical, len(self.text.encode()))
+            self.assertLess(stored, logical / 5)
+            self.assertEqual(load_text(job), self.text)
+
+        # Switching the setting off replaces the compressed copy
+        write_markdown(job, self.text)
+        self.assertEqual(find_markdown(job), artifact_name(job, "md"))
+        self.assertFalse(get_storage().exists(artifact_name(job, "md") + ".gz"))
+
+    def test_accepts_encoding(self):
+        for header, accepted in (("gzip, deflate", True), ("br;q=1, gzip;q=0", False), ("*", True),
+                                 ("GZIP; q=0.5", True), ("deflate", False), ("", False)):
+            with self.subTest(header=header):
+                request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(accepts_encoding(request, "gzip"), accepted)
+
+
+class FileSystemStorageTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.storage = OCRFileSystemStorage(location=location, file_permissions_mode=0o644)
+
+    def mode(self, name):
+        return os.stat(self.storage.path(name)).st_mode & 0o777
+
+    def test_overwrites_in_place_with_upload_permissions(self):
+        self.storage.save("outputs/1/a.md", ContentFile(b"old"))
+        self.assertEqual(self.storage.save("outputs/1/a.md", ContentFile(b"new")), "outputs/1/a.md")
+        with self.storage.open("outputs/1/a.md") as f:
+            self.assertEqual(f.read(), b"new")
+        self.assertEqual(self.mode("outputs/1/a.md"), 0o644)
+        self.assertEqual(os.listdir(self.storage.path("outputs/1")), ["a.md"])
+
+    def test_moves_spooled_uploads(self):
+        upload = TemporaryUploadedFile("a.png", "image/png", 4, None)
+        upload.write(b"scan")
+        spooled = upload.temporary_file_path()
+        self.storage.save("uploads/1/a.png", upload)
+        upload.close()
+        self.assertFalse(os.path.exists(spooled))
+        self.assertEqual(self.mode("uploads/1/a.png"), 0o644)
+
+
+class S3StorageTests(TestCase):
+    """S3Storage against a stubbed boto3 client; no requests leave the process."""
+
+    def setUp(self):
+        self.storage = S3Storage(
+            bucket="ocr",
+            endpoint_url="http://minio.test:9000",
+            region_name="us-east-1",
+            access_key="key",
+            secret_key="secret",
+            prefix="media",
+            multipart_threshold=1024,
+            multipart_chunk_size=5 * 1024 * 1024,
+        )
+        # Parts go up in order, so the stubbed responses line up with the calls
+        self.storage.transfer_config.use_threads = False
+        self.stub = Stubber(self.storage.client)
+        self.stub.activate()
+        self.addCleanup(self.stub.deactivate)
+
+        self.calls = []
+        self.storage.client.meta.events.register("before-parameter-build.s3", self.record_call)
+
+    def record_call(self, params, model, **kwargs):
+        self.calls.append((model.name, params.get("Key"), params.get("PartNumber")))
+
+    def test_large_files_go_up_in_parts(self):
+        self.stub.add_response("create_multipart_upload", {"UploadId": "upload"})
+        self.stub.add_response("upload_part", {"ETag": '"part1"'})
+        self.stub.add_response("upload_part", {"ETag": '"part2"'})
+        self.stub.add_response("complete_multipart_upload", {})
+        self.storage.save("outputs/1/big.pdf", ContentFile(b"x" * (6 * 1024 * 1024)))
+
+        self.stub.add_response("put_object", {})
+        self.storage.save("outputs/1/small.md", ContentFile(b"small"))
+
+        self.stub.assert_no_pending_responses()
+        self.assertEqual(self.calls, [
+            ("CreateMultipartUpload", "media/outputs/1/big.pdf", None),
+            ("UploadPart", "media/outputs/1/big.pdf", 1),
+            ("UploadPart", "media/outputs/1/big.pdf", 2),
+            ("CompleteMultipartUpload", "media/outputs/1/big.pdf", None),
+            ("PutObject", "media/outputs/1/small.md", None),
+        ])
+
+    def test_open_and_exists(self):
+        self.stub.add_response("head_object", {"ContentLength": 5})
+        self.stub.add_response("get_object", {"Body": StreamingBody(io.BytesIO(b"hello"), 5), "ContentLength": 5})
+        with self.storage.open("outputs/1/a.md") as f:
+            self.assertEqual(f.read(), b"hello")
+
+        self.stub.add_client_error("head_object", service_error_code="404", http_status_code=404)
+        self.assertFalse(self.storage.exists("outputs/1/missing.md"))
+        self.stub.add_client_error("head_object", service_error_code="403", http_status_code=403)
+        with self.assertRaises(Exception):
+            self.storage.exists("outputs/1/forbidden.md")
+
+    def test_presigned_url(self):
+        url = urlsplit(self.storage.presigned_url(
+            "outputs/1/a.md.gz", download_name="ocr_a.txt", content_type="text/plain", content_encoding="gzip",
+        ))
+        query = parse_qs(url.query)
+        self.assertEqual((url.netloc, url.path), ("minio.test:9000", "/ocr/media/outputs/1/a.md.gz"))
+        self.assertEqual(query["response-content-disposition"], ['attachment; filename="ocr_a.txt"'])
+        self.assertEqual(query["response-content-encoding"], ["gzip"])
+        self.assertEqual(query["X-Amz-Expires"], ["300"])
+        self.assertIn("X-Amz-Signature", query)
+
+    @override_settings(OCR_STORAGE_PRESIGNED_DOWNLOADS=True)
+    def test_downloads_redirect_to_the_object_store(self):
+        modified = timezone.now()
+        for _ in range(2):
+            self.stub.add_response("head_object", {"ContentLength": 5, "LastModified": modified})
+        request = RequestFactory().get("/")
+        with mock.patch("ocr_api.downloads.get_storage", return_value=self.storage), \
+                mock.patch("ocr_api.storage.get_storage", return_value=self.storage):
+            response = serve_file(request, "outputs/1/a.pdf", "ocr_a.pdf", "0" * 64)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith("http://minio.test:9000/ocr/media/outputs/1/a.pdf?"))
+        self.assertEqual(response["Cache-Control"], "private, no-store")
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def test_bursts_then_waits_for_refills(self):
+        bucket = TokenBucket(2, capacity=3, clock=self.clock, sleep=self.sleep)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.sleeps, [])
+        bucket.acquire()
+        self.assertEqual(self.sleeps, [0.5])
+
+        # Idle time refills up to capacity, no further
+        self.now += 60
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.sleeps, [0.5])
+
+    def test_times_out_instead_of_waiting_forever(self):
+        bucket = TokenBucket(0.1, capacity=1, clock=self.clock, sleep=self.sleep)
+        bucket.acquire()
+        with self.assertRaises(RateLimitTimeout):
+            bucket.acquire(timeout=5)
+        self.assertEqual(self.sleeps, [])
+
+    def test_zero_rate_disables_limiting(self):
+        bucket = TokenBucket(0, clock=self.clock, sleep=self.sleep)
+        for _ in range(100):
+            bucket.acquire(timeout=0)
+        self.assertEqual(self.sleeps, [])
+
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(10):
+            self.assertLessEqual(backoff_delay(attempt, 0.5, 4.0), min(4.0, 0.5 * 2 ** attempt))
+
+
+class MistralClientTests(TestCase):
+    """MistralClient against an httpx mock transport; no requests leave the process."""
+
+    def setUp(self):
+        self.responses = []
+        self.requests = []
+        handler = self.handle
+
+        class MockClient(httpx.Client):
+            def __init__(self, **kwargs):
+                super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+        with mock.patch("httpx.Client", MockClient):
+            self.client = MistralClient("key", server_url="https://mistral.test", max_retries=2, rate=0)
+        self.addCleanup(self.client.close)
+
+        patcher = mock.patch("ocr_api.mistral_client.time.sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, request):
+        self.requests.append(request.url.path)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def signed_url(self):
+        with self.assertLogs("ocr_api.mistral_client", "WARNING") as logs:
+            return self.client.signed_url("file-1").url, logs.output
+
+    def test_retries_rate_limits_and_server_errors(self):
+        self.responses = [
+            httpx.Response(429, json={"message": "slow down"}),
+            httpx.Response(503, json={"message": "unavailable"}),
+            httpx.Response(200, json={"url": "https://files.test/1"}),
+        ]
+        url, logs = self.signed_url()
+        self.assertEqual(url, "https://files.test/1")
+        self.assertEqual(self.requests, ["/v1/files/file-1/url"] * 3)
+        self.assertEqual(len(logs), 2)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_honours_retry_after(self):
+        self.responses = [
+            httpx.Response(429, headers={"Retry-After": "3"}, json={"message": "slow down"}),
+            httpx.Response(200, json={"url": "https://files.test/1"}),
+        ]
+        self.signed_url()
+        self.sleep.assert_called_once_with(3.0)
+
+    def test_retries_connection_errors(self):
+        self.responses = [
+            httpx.ConnectError("refused"),
+            httpx.Response(200, json={"url": "https://files.test/1"}),
+        ]
+        url, logs = self.signed_url()
+        self.assertEqual(url, "https://files.test/1")
+        self.assertIn("ConnectError", logs[0])
+
+    def test_gives_up_after_max_retries(self):
+        self.responses = [httpx.Response(500, json={"message": "boom"}) for _ in range(3)]
+        with self.assertLogs("ocr_api.mistral_client", "WARNING"), self.assertRaises(Exception) as cm:
+            self.client.signed_url("file-1")
+        self.assertEqual(cm.exception.status_code, 500)
+        self.assertEqual(len(self.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.responses = [httpx.Response(401, json={"message": "bad key"})]
+        with self.assertRaises(Exception) as cm:
+            self.client.signed_url("file-1")
+        self.assertEqual(cm.exception.status_code, 401)
+        self.assertEqual(len(self.requests), 1)
+        self.sleep.assert_not_called()
+
+    def test_waits_for_a_request_token(self):
+        self.client.bucket = mock.Mock()
+        self.responses = [httpx.Response(200, json={"url": "https://files.test/1"})]
+        self.client.signed_url("file-1")
+        self.client.bucket.acquire.assert_called_once_with(self.client.acquire_timeout)
+
+
+class TimingTests(OCRJobTestMixin, TestCase):
+    def test_jobs_record_their_stages(self):
+        timing = self.run_job(self.make_job("a.png")).timing
+        self.assertFalse(timing.cache_hit)
+        for stage in ("queue_wait", "ocr_process", "output_write", "db_write", "total"):
+            self.assertIsNotNone(getattr(timing, f"{stage}_ms"), stage)
+        self.assertIsNone(timing.pdf_build_ms)
+
+        # Same bytes again: answered from the result cache, no OCR stage
+        timing = self.run_job(self.make_job("b.png")).timing
+        self.assertTrue(timing.cache_hit)
+        self.assertIsNone(timing.ocr_process_ms)
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, q) for q in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 99), 7)
+
+        for i, ms in enumerate([10.0, 20.0, 30.0, 40.0]):
+            OCRTiming.objects.create(ocr_file=self.make_job(f"{i}.png", data=str(i).encode()), total_ms=ms)
+        stats = stage_percentiles(OCRTiming.objects.all())
+        self.assertEqual(stats["total"], {"count": 4, "mean": 25.0, "p50": 20.0, "p95": 40.0, "p99": 40.0})
+        self.assertEqual(stats["pdf_build"]["count"], 0)
+        self.assertIsNone(stats["pdf_build"]["p50"])
+
+    def test_stats_endpoint(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        OCRTiming.objects.create(ocr_file=self.make_job("a.png"), total_ms=10.0)
+        OCRTiming.objects.create(ocr_file=self.make_job("b.png", user=bob), total_ms=30.0)
+        url = reverse("ocr-timing-stats")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["stages"]["total"]["count"], 1)
+
+        self.client.force_authenticate(User.objects.create_superuser("Admin", "admin@example.com", "password"))
+        self.assertEqual(self.client.get(url).data["stages"]["total"]["mean"], 20.0)
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(url, {"date_from": tomorrow}).data["stages"]["total"]["count"], 0)
+        self.assertEqual(self.client.get(url, {"date_to": "yesterday"}).status_code, 400)
+
+    def test_history_timing_fields(self):
+        ocr_file = self.run_job(self.make_job())
+        item = self.client.get(reverse("ocr-history"), {"fields": "processing_time,timing"}).data["results"][0]
+        self.assertEqual(item["processing_time"], ocr_file.timing.total_ms)
+        self.assertEqual(item["timing"]["total"], ocr_file.timing.total_ms)
+        self.assertFalse(item["timing"]["cache_hit"])
+
+
+class DailyStatsTests(OCRJobTestMixin, TestCase):
+    def rollup(self):
+        return {
+            (row.day, row.user_id): {field: getattr(row, field) for field in ROLLUP_FIELDS}
+            for row in OCRDailyStats.objects.all()
+        }
+
+    def upload(self, name, data=b"scan"):
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(
+                reverse("ocr-upload"),
+                {"file": SimpleUploadedFile(name, data), "output_formats": '["txt"]'},
+            )
+        return OCRFile.objects.get(id=response.data["job_id"])
+
+    def test_follows_jobs_and_matches_a_rebuild(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        first = self.upload("a.png")
+        self.upload("b.png", b"other")
+        today = timezone.localdate()
+        self.assertEqual(self.rollup()[(today, self.user.id)]["in_progress"], 2)
+
+        self.run_job(first)
+        yesterday = self.make_job("c.png", user=bob)
+        OCRFile.objects.filter(id=yesterday.id).update(uploaded_at=timezone.now() - timedelta(days=1))
+        yesterday.refresh_from_db()
+        refresh_file_stats(yesterday)
+
+        row = self.rollup()[(today, self.user.id)]
+        self.assertEqual((row["uploads"], row["done"], row["in_progress"], row["timed_jobs"]), (2, 1, 1, 1))
+        self.assertEqual(row["txt_bytes"], first.txt_stored_size)
+
+        incremental = self.rollup()
+        self.assertEqual(rebuild_daily_stats(), 2)
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_rows_of_deleted_users_are_replaced(self):
+        job = self.make_job(status="done")
+        refresh_file_stats(job)
+        self.user.delete()
+        today = timezone.localdate()
+        refresh_day(today, None)
+        refresh_day(today, None)
+        self.assertEqual(OCRDailyStats.objects.filter(day=today, user=None).count(), 1)
+
+        OCRFile.objects.all().delete()
+        refresh_day(today, None)
+        self.assertFalse(OCRDailyStats.objects.exists())
+
+    def test_rows_without_uploads_are_dropped(self):
+        job = self.make_job(status="done")
+        refresh_file_stats(job)
+        job.delete()
+        refresh_file_stats(job)
+        self.assertFalse(OCRDailyStats.objects.exists())
+
+    def test_analytics_endpoint(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        for job in (self.make_job("a.png", status="done"), self.make_job("b.png", status="error"),
+                    self.make_job("c.png", user=bob, status="done")):
+            refresh_file_stats(job)
+        url = reverse("ocr-analytics")
+
+        data = self.client.get(url).data
+        self.assertEqual(data["status"], {"total": 2, "done": 1, "error": 1, "in_progress": 0})
+        self.assertEqual(data["series"][0]["period"], timezone.localdate().isoformat())
+        self.assertNotIn("top_users", data)
+
+        self.client.force_authenticate(User.objects.create_superuser("Admin", "admin@example.com", "password"))
+        data = self.client.get(url, {"bucket": "month", "top": 1}).data
+        self.assertEqual(data["status"]["total"], 3)
+        self.assertEqual(data["series"][0]["period"], timezone.localdate().replace(day=1).isoformat())
+        self.assertEqual([user["username"] for user in data["top_users"]], ["alice"])
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(url, {"date_from": tomorrow}).data["status"]["total"], 0)
+        self.assertEqual(self.client.get(url, {"bucket": "year"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"date_to": "soon"}).status_code, 400)
+
+
+class UserUsageTests(OCRJobTestMixin, TestCase):
+    def usage(self):
+        # Fresh user: the reverse one-to-one caches a missing row
+        usage = user_usage(User.objects.get(id=self.user.id))
+        return {field: getattr(usage, field) for field in USAGE_FIELDS}
+
+    def test_follows_the_job_lifecycle(self):
+        self.assertEqual(user_usage(self.user).pk, None)
+        self.assertEqual(user_usage(self.user).total_bytes, 0)
+
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(
+                reverse("ocr-upload"),
+                {"file": SimpleUploadedFile("a.png", b"scan"), "output_formats": '["txt"]'},
+            )
+        job = OCRFile.objects.get(id=response.data["job_id"])
+        self.assertEqual((self.usage()["uploads"], self.usage()["in_progress"]), (1, 1))
+        self.assertEqual(self.usage()["last_upload_at"], job.uploaded_at)
+
+        job = self.run_job(job)
+        usage = self.usage()
+        self.assertEqual((usage["done"], usage["in_progress"], usage["txt_bytes"]), (1, 0, job.txt_stored_size))
+
+        self.assertEqual(self.client.delete(reverse("ocr-delete", args=["a.png"])).status_code, 200)
+        self.assertEqual((self.usage()["uploads"], self.usage()["txt_bytes"]), (0, 0))
+
+    def test_rebuild_matches_incremental_counters(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "password")
+        User.objects.create_user("carol", "carol@example.com", "password")
+        self.run_job(self.make_job("a.png"))
+        for job in (self.make_job("b.png", status="error"), self.make_job("c.png", user=bob)):
+            refresh_file_stats(job)
+        incremental = {usage.user_id: usage for usage in UserUsage.objects.all()}
+
+        out = io.StringIO()
+        call_command("rebuild_user_usage", stdout=out)
+        self.assertIn("rebuilt usage counters for 2 user(s)", out.getvalue())
+        self.assertIn("1 user(s) without uploads", out.getvalue())
+        rebuilt = {usage.user_id: usage for usage in UserUsage.objects.all()}
+        self.assertEqual(set(rebuilt), set(incremental))
+        for user_id, usage in rebuilt.items():
+            for field in USAGE_FIELDS:
+                self.assertEqual(getattr(usage, field), getattr(incremental[user_id], field), field)
+
+    def test_ignores_files_without_a_user(self):
+        refresh_user_usage(None)
+        self.assertFalse(UserUsage.objects.exists())
@@ -0,0 +1,136 @@
+"""
+Per-stage timing of OCR jobs.
+
+A worker runs each job inside ``collect_timings()``; code below it (the
+pipeline, backends) marks stages with ``timed("ocr_process")`` and
+``save_timings`` stores the totals on the job's ``OCRTiming`` row. Stages
+that happen outside the worker (storing the upload, building PDF/DOCX on
+first download) are written directly with ``reset_timing`` /
+``record_timing``. ``stage_percentiles`` turns a set of rows into
+p50/p95/p99 per stage.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import time
+
+from .models import OCRTiming
+
+STAGES = [
+    "queue_wait",
+    "local_write",
+    "remote_upload",
+    "signed_url",
+    "ocr_process",
+    "output_write",
+    "pdf_build",
+    "docx_build",
+    "db_write",
+    "total",
+]
+PERCENTILES = [50, 95, 99]
+
+
+class JobTimings:
+    """Stage durations (ms) collected while one job runs."""
+
+    def __init__(self):
+        self.stages = {}
+        self.cache_hit = False
+
+    def add(self, stage, ms):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+
+_current = ContextVar("ocr_job_timings", default=None)
+
+
+def current_timings():
+    """The ``JobTimings`` being collected in this context, or None."""
+    return _current.get()
+
+
+@contextmanager
+def collect_timings():
+    timings = JobTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(stage):
+    """Add the wall-clock time of the block to ``stage``; a no-op outside ``collect_timings``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add(stage, (time.perf_counter() - start) * 1000)
+
+
+def _ms(start, end):
+    return round((end - start).total_seconds() * 1000, 1) if start and end else None
+
+
+def save_timings(ocr_file, timings):
+    """Store a finished (or failed) job's collected timings on its ``OCRTiming`` row."""
+    fields = {f"{stage}_ms": round(ms, 1) for stage, ms in timings.stages.items()}
+    fields["queue_wait_ms"] = _ms(ocr_file.uploaded_at, ocr_file.started_at)
+    fields["total_ms"] = _ms(ocr_file.started_at, ocr_file.finished_at)
+    fields["cache_hit"] = timings.cache_hit
+    OCRTiming.objects.update_or_create(ocr_file_id=ocr_file.id, defaults=fields)
+
+
+def reset_timing(ocr_file, **fields):
+    """Start a fresh timing row for a new (or re-uploaded) job."""
+    defaults = {f"{stage}_ms": None for stage in STAGES}
+    defaults["cache_hit"] = False
+    defaults.update(fields)
+    OCRTiming.objects.update_or_create(ocr_file_id=ocr_file.id, defaults=defaults)
+
+
+def record_timing(ocr_file, stage, ms):
+    OCRTiming.objects.update_or_create(
+        ocr_file_id=ocr_file.id, defaults={f"{stage}_ms": round(ms, 1)}
+    )
+
+
+def timing_dict(timing):
+    """The per-stage milliseconds of an ``OCRTiming`` (or None) for API responses."""
+    if timing is None:
+        return None
+    data = {stage: getattr(timing, f"{stage}_ms") for stage in STAGES}
+    data["cache_hit"] = timing.cache_hit
+    return data
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def stage_percentiles(timings):
+    """
+    ``{stage: {"count", "mean", "p50", "p95", "p99"}}`` over an ``OCRTiming``
+    queryset, ignoring stages that did not run. One query.
+    """
+    columns = [f"{stage}_ms" for stage in STAGES]
+    rows = list(timings.values_list(*columns))
+
+    result = {}
+    for index, stage in enumerate(STAGES):
+        values = sorted(row[index] for row in rows if row[index] is not None)
+        if not values:
+            result[stage] = {"count": 0, "mean": None, **{f"p{q}": None for q in PERCENTILES}}
+            continue
+        result[stage] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 1),
+            **{f"p{q}": percentile(values, q) for q in PERCENTILES},
+        }
+    return result
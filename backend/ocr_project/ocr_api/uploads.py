@@ -0,0 +1,77 @@
+"""
+Upload handling for OCR jobs.
+
+The upload handlers hash each file while Django is still parsing the request
+body, so the bytes are hashed and written exactly once. Small files stay in
+memory. Anything above ``FILE_UPLOAD_MAX_MEMORY_SIZE`` is spooled straight to
+``FILE_UPLOAD_TEMP_DIR``, and on local storage that temp file is renamed into
+place as the job input instead of being copied (see ``storage.py``).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+from .storage import delete_file, get_storage
+
+
+class HashingMixin:
+    """Compute the SHA-256 of the chunks this handler stores, exposed as ``file.sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        # Set before super(): MemoryFileUploadHandler raises StopFutureHandlers once activated
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            # This handler kept the chunk, so it is part of the file it builds
+            self.digest.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def save_upload(file_obj, name):
+    """
+    Persist an uploaded file as the job input under storage ``name`` and
+    return its SHA-256.
+
+    On local storage disk-spooled uploads are moved (a rename when the temp
+    dir is on the same volume); on S3 large files go up as multipart uploads.
+    Uploads no handler hashed are hashed here first.
+    """
+    digest = getattr(file_obj, "sha256", None)
+    if not digest:
+        hasher = hashlib.sha256()
+        for chunk in file_obj.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        file_obj.seek(0)
+
+    get_storage().save(name, file_obj)
+    return digest
+
+
+def apply_retention(ocr_file, failed=False):
+    """
+    Delete the job input according to ``OCR_UPLOAD_RETENTION``:
+    ``"delete"`` always, ``"on_error"`` keeps inputs of failed jobs, ``"keep"`` never deletes.
+    """
+    policy = getattr(settings, "OCR_UPLOAD_RETENTION", "delete")
+    if policy == "keep" or (policy == "on_error" and failed):
+        return
+    delete_file(ocr_file.input_path)
@@ -7,9 +7,19 @@ from .views import (
     OCRHistoryView,
     OCRDeleteView,
     OCRDownloadView,
+    OCRExportView,
+    OCRSearchView,
+    JobStatusView,
+    JobPagesView,
+    OCRBatchUploadView,
+    BatchStatusView,
+    OCRCacheStatsView,
+    OCRTimingStatsView,
+    OCRAnalyticsView,
     RegisterView,
     UserProfileView,
     AllUsersView,
+    UserDocumentsView,
     DeleteUserView,
     CustomTokenObtainPairView,
     SetSecurityQuestionsView,
@@ -22,9 +32,18 @@ urlpatterns = [
     # OCR
     # =========================
     path("upload/", OCRUploadView.as_view(), name="ocr-upload"),
+    path("upload/batch/", OCRBatchUploadView.as_view(), name="ocr-batch-upload"),
     path("history/", OCRHistoryView.as_view(), name="ocr-history"),
     path("delete/<str:filename>/", OCRDeleteView.as_view(), name="ocr-delete"),
     path("download/<str:filename>/", OCRDownloadView.as_view(), name="ocr-download"),
+    path("export/zip/", OCRExportView.as_view(), name="ocr-export-zip"),
+    path("search/", OCRSearchView.as_view(), name="ocr-search"),
+    path("jobs/<int:job_id>/", JobStatusView.as_view(), name="ocr-job-status"),
+    path("jobs/<int:job_id>/pages/", JobPagesView.as_view(), name="ocr-job-pages"),
+    path("batches/<int:batch_id>/", BatchStatusView.as_view(), name="ocr-batch-status"),
+    path("cache/stats/", OCRCacheStatsView.as_view(), name="ocr-cache-stats"),
+    path("timings/stats/", OCRTimingStatsView.as_view(), name="ocr-timing-stats"),
+    path("analytics/", OCRAnalyticsView.as_view(), name="ocr-analytics"),
 
     # =========================
     # AUTH
@@ -34,6 +53,7 @@ urlpatterns = [
     path("auth/token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
     path("auth/user/", UserProfileView.as_view(), name="auth-user"),
     path("auth/users/", AllUsersView.as_view(), name="auth-users"),
+    path("auth/users/<str:username>/documents/", UserDocumentsView.as_view(), name="auth-user-documents"),
     path("auth/delete-user/<str:username>/", DeleteUserView.as_view(), name="delete-user"),
     path("auth/security-questions/", SetSecurityQuestionsView.as_view(), name="security-questions"),
     path("auth/forgot-password/", ForgotPasswordView.as_view(), name="forgot-password"),
@@ -43,8 +63,10 @@ urlpatterns = [
     # CHATS
     # =========================
     path("chat/users/", views.chat_users),
+    path("chat/conversations/", views.chat_conversations, name="chat-conversations"),
     path("chat/room/", views.get_or_create_chat_room),
     path("chat/messages/<int:room_id>/", views.chat_messages),
+    path("chat/messages/<int:room_id>/read/", views.mark_messages_read, name="chat-mark-read"),
 
     # DELETE OPTIONS
     path(
@@ -6,19 +6,31 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.conf import settings
 from pathlib import Path
-import os
 import json
-from mistralai import Mistral
-from dotenv import load_dotenv
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from docx import Document
+import time
+from datetime import date, datetime, timedelta
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q, F, Count, OuterRef, Subquery
+from django.urls import reverse
 from django.utils import timezone
-
-from .models import OCRFile
-from django.http import FileResponse, Http404
+from django.utils.dateparse import parse_datetime
+
+from .models import OCRFile, OCRBatch, OCRTiming
+from .jobs import enqueue_job
+from .cache import cache_stats
+from .renderers import FORMATS, artifact_digest, ensure_artifact, delete_artifacts, delete_rendered
+from .uploads import save_upload
+from .downloads import serve_file
+from .exports import export_entries, zip_stream
+from .search import search_pages
+from .pages import read_pages
+from .metrics import registry as metrics_registry
+from .analytics import BUCKETS as ANALYTICS_BUCKETS, analytics_summary, refresh_file_stats, user_usage
+from .timing import STAGES as TIMING_STAGES, reset_timing, stage_percentiles, timing_dict
+from .pagination import InvalidCursor, encode_cursor, decode_datetime_cursor, decode_id_cursor, parse_limit
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status
@@ -32,7 +44,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.models import User
 from .models import ChatRoom, Message
-from .serializers import ChatUserSerializer, ChatRoomSerializer, MessageSerializer
+from .serializers import ChatUserSerializer, ChatRoomSerializer, ConversationSerializer, MessageSerializer
+from .realtime import broadcast_chat_event, broadcast_read_receipt
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -43,13 +56,105 @@ class RegisterView(APIView):
             return Response({"msg":"user created"}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Load API key from .env
-load_dotenv()
-API_KEY = os.getenv("MISTRAL_API_KEY")
-if not API_KEY:
-    raise ValueError("MISTRAL_API_KEY not found in .env")
+def _parse_output_formats(request):
+    # Get selected output formats from request
+    output_formats_json = request.POST.get('output_formats', '["pdf", "txt", "docx"]')
+    try:
+        return json.loads(output_formats_json)
+    except:
+        return ["pdf", "txt", "docx"]  # default to all
+
 
-client = Mistral(api_key=API_KEY)
+def _create_job(request, file_obj, output_formats, batch=None):
+    """
+    Store an upload and create (or reset, on re-upload) its pending OCRFile row.
+    Returns ``(ocr_file, None)`` or ``(None, error_message)`` if the same file
+    is still being processed.
+    """
+    existing = OCRFile.objects.filter(user=request.user, file_name=file_obj.name).first()
+    if existing and existing.status in ("pending", "processing"):
+        if existing.status == "pending":
+            # Nudge the queue in case the job was orphaned by a restart
+            enqueue_job(existing)
+        return existing, "This file is already being processed"
+
+    if existing:
+        # The re-uploaded file gets new outputs; don't serve the old renders meanwhile
+        delete_rendered(existing)
+
+    # Store the upload so a background worker (possibly on another node) can pick it up
+    input_path = f"uploads/{request.user.id}/{file_obj.name}"
+    # Hashed during upload parsing so the worker can look up the OCR result cache
+    write_started = time.perf_counter()
+    sha256 = save_upload(file_obj, input_path)
+    local_write_ms = (time.perf_counter() - write_started) * 1000
+
+    # Outputs are rendered on first download, so URLs point at the download view
+    download_url = request.build_absolute_uri(reverse("ocr-download", args=[file_obj.name]))
+    urls = {}
+    for ext in FORMATS:
+        urls[f"{ext}_url"] = ""
+        if ext in output_formats:
+            urls[f"{ext}_url"] = f"{download_url}?ext={ext}"
+
+    # The row and the counters it feeds commit together
+    with transaction.atomic():
+        ocr_file, _ = OCRFile.objects.update_or_create(
+            user=request.user,
+            file_name=file_obj.name,
+            defaults={
+                **urls,
+                "pdf_size": 0,
+                "txt_size": 0,
+                "txt_stored_size": 0,
+                "docx_size": 0,
+                "output_digests": {},
+                "status": "pending",
+                "stage": "queued",
+                "page_count": None,
+                "pages_done": 0,
+                "output_formats": output_formats,
+                "input_path": input_path,
+                "sha256": sha256,
+                "batch": batch,
+                "error_message": "",
+                "uploaded_at": timezone.now(),
+                "started_at": None,
+                "finished_at": None,
+            },
+        )
+        reset_timing(ocr_file, local_write_ms=round(local_write_ms, 1))
+        if existing:
+            # A re-upload moves the file to today's bucket
+            refresh_file_stats(existing)
+        refresh_file_stats(ocr_file)
+        transaction.on_commit(lambda: enqueue_job(ocr_file))
+    return ocr_file, None
+
+
+def _job_summary(ocr_file):
+    """Status of one job, with output URLs and sizes once it is done."""
+    data = {
+        "job_id": ocr_file.id,
+        "file_name": ocr_file.file_name,
+        "status": ocr_file.status,
+        "stage": ocr_file.stage,
+        "page_count": ocr_file.page_count,
+        "pages_done": ocr_file.pages_done,
+        "uploaded_at": ocr_file.uploaded_at,
+        "started_at": ocr_file.started_at,
+        "finished_at": ocr_file.finished_at,
+    }
+    if ocr_file.status == "error":
+        data["error"] = ocr_file.error_message
+
+    # Same shape as the old synchronous upload response
+    if ocr_file.status == "done":
+        for ext in FORMATS:
+            if ext in ocr_file.output_formats:
+                data[ext] = getattr(ocr_file, f"{ext}_url")
+                data[f"{ext}_size"] = getattr(ocr_file, f"{ext}_size")
+    return data
 
 
 class OCRUploadView(APIView):
@@ -61,156 +166,345 @@ class OCRUploadView(APIView):
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({"error": "No file uploaded"}, status=400)
-        # Get selected output formats from request
-        output_formats_json = request.POST.get('output_formats', '["pdf", "txt", "docx"]')
-        try:
-            output_formats = json.loads(output_formats_json)
-        except:
-            output_formats = ["pdf", "txt", "docx"]  # default to all
+        output_formats = _parse_output_formats(request)
         
         # Validate at least one format is selected
         if not output_formats or len(output_formats) == 0:
             return Response({"error": "At least one output format must be selected"}, status=400)
 
-        # Save uploaded file temporarily
-        user_upload_dir = Path(settings.MEDIA_ROOT) / "uploads" / str(request.user.id)
-        user_upload_dir.mkdir(parents=True, exist_ok=True)
-        input_path = user_upload_dir / file_obj.name
-        with open(input_path, "wb") as f:
-            for chunk in file_obj.chunks():
-                f.write(chunk)
-
-        # Upload to Mistral Files API
-        with open(input_path, "rb") as f:
-            uploaded = client.files.upload(
-                file={"file_name": file_obj.name, "content": f},
-                purpose="ocr"
-            )
+        ocr_file, error = _create_job(request, file_obj, output_formats)
+        if error:
+            return Response({"error": error, "job_id": ocr_file.id}, status=409)
 
-        signed = client.files.get_signed_url(file_id=uploaded.id, expiry=1)
-        url = signed.url
+        return Response({
+            "job_id": ocr_file.id,
+            "file_name": ocr_file.file_name,
+            "status": ocr_file.status,
+            "status_url": request.build_absolute_uri(reverse("ocr-job-status", args=[ocr_file.id])),
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # OCR processing
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest",
-            document={"type": "document_url", "document_url": url},
-            include_image_base64=False
-        )
 
-        all_text = [page.markdown for page in ocr_response.pages]
-        final_text = "\n\n".join(all_text)
+class OCRBatchUploadView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, format=None):
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files uploaded"}, status=400)
+        max_files = getattr(settings, "OCR_BATCH_MAX_FILES", 500)
+        if len(files) > max_files:
+            return Response({"error": f"A batch can contain at most {max_files} files"}, status=400)
+        output_formats = _parse_output_formats(request)
 
-        # Prepare output folder
-        user_output_dir = Path(settings.MEDIA_ROOT) / "outputs" / str(request.user.id)
-        user_output_dir.mkdir(parents=True, exist_ok=True)
+        # Validate at least one format is selected
+        if not output_formats or len(output_formats) == 0:
+            return Response({"error": "At least one output format must be selected"}, status=400)
 
-        base_name = Path(file_obj.name).stem
+        batch = OCRBatch.objects.create(user=request.user, output_formats=output_formats)
+        jobs = []
+        rejected = []
+        for file_obj in files:
+            ocr_file, error = _create_job(request, file_obj, output_formats, batch=batch)
+            if error:
+                rejected.append({"file_name": file_obj.name, "error": error, "job_id": ocr_file.id})
+            else:
+                jobs.append({"job_id": ocr_file.id, "file_name": ocr_file.file_name})
 
-        # Initialize response data
-        response_data = {}
-        
-        # Generate PDF if requested
-        pdf_url = None
-        pdf_size = 0
-        if "pdf" in output_formats:
-            pdf_path = user_output_dir / f"ocr_{base_name}.pdf"
-            doc = SimpleDocTemplate(str(pdf_path), pagesize=A4,
-                                    rightMargin=40, leftMargin=40,
-                                    topMargin=40, bottomMargin=40)
-            story = []
-            styles = getSampleStyleSheet()
-            normal_style = styles['Normal']
-
-            for paragraph in final_text.split("\n\n"):
-                paragraph = paragraph.strip()
-                if paragraph:
-                    story.append(Paragraph(paragraph.replace("\n", "<br/>"), normal_style))
-                    story.append(Spacer(1, 12))
-            doc.build(story)
-            
-            pdf_url = request.build_absolute_uri(settings.MEDIA_URL + f"outputs/{pdf_path.name}")
-            pdf_size = pdf_path.stat().st_size
-            response_data['pdf'] = pdf_url
-            response_data['pdf_size'] = pdf_size
-
-        # Generate TXT if requested
-        txt_url = None
-        txt_size = 0
-        if "txt" in output_formats:
-            txt_path = user_output_dir / f"ocr_{base_name}.txt"
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(final_text)
-            
-            txt_url = request.build_absolute_uri(settings.MEDIA_URL + f"outputs/{txt_path.name}")
-            txt_size = txt_path.stat().st_size
-            response_data['txt'] = txt_url
-            response_data['txt_size'] = txt_size
-
-        # Generate DOCX if requested
-        docx_url = None
-        docx_size = 0
-        if "docx" in output_formats:
-            docx_path = user_output_dir / f"ocr_{base_name}.docx"
-            docx_doc = Document()
-            for paragraph in final_text.split("\n\n"):
-                paragraph = paragraph.strip()
-                if paragraph:
-                    docx_doc.add_paragraph(paragraph)
-                    docx_doc.add_paragraph("")
-            docx_doc.save(docx_path)
-            
-            docx_url = request.build_absolute_uri(settings.MEDIA_URL + f"outputs/{docx_path.name}")
-            docx_size = docx_path.stat().st_size
-            response_data['docx'] = docx_url
-            response_data['docx_size'] = docx_size
-        # Save to DB and associate with requesting user
-        OCRFile.objects.create(
-        file_name=file_obj.name,
-        pdf_url=pdf_url or "",
-        txt_url=txt_url or "",
-        docx_url=docx_url or "",
-        pdf_size=pdf_size,
-        txt_size=txt_size,
-        docx_size=docx_size,
-        status="done",
-        user=request.user,
-        )
+        return Response({
+            "batch_id": batch.id,
+            "jobs": jobs,
+            "rejected": rejected,
+            "status_url": request.build_absolute_uri(reverse("ocr-batch-status", args=[batch.id])),
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatusView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        ocr_file = get_object_or_404(OCRFile, id=job_id)
+
+        # Only owner or Admin can see a job
+        if not (request.user.username == 'Admin' or ocr_file.user_id == request.user.id):
+            return Response({"error": "Forbidden"}, status=403)
+
+        return Response(_job_summary(ocr_file))
+
+
+class JobPagesView(APIView):
+    """
+    Per-page OCR results of a finished job, read without loading the whole
+    document. ``from`` / ``to`` select a 1-based inclusive page range
+    (default: the first 10 pages, at most 50 per request).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        ocr_file = get_object_or_404(OCRFile, id=job_id)
+
+        # Only owner or Admin can read a job's pages
+        if not (request.user.username == 'Admin' or ocr_file.user_id == request.user.id):
+            return Response({"error": "Forbidden"}, status=403)
+        if ocr_file.status != "done":
+            return Response({"error": "File is not ready yet"}, status=409)
 
+        try:
+            first = max(int(request.GET.get("from", 1)), 1)
+            last = int(request.GET.get("to", first + 9))
+        except ValueError:
+            return Response({"error": "from and to must be page numbers"}, status=400)
+        last = min(last, first + 49)
+
+        pages = [
+            {
+                "page": page.page_number,
+                "markdown": page.text,
+                "width": page.width,
+                "height": page.height,
+                "dpi": page.dpi,
+                "images": page.images,
+            }
+            for page in read_pages(ocr_file, first, last)
+        ]
+        return Response({
+            "job_id": ocr_file.id,
+            "page_count": ocr_file.page_count,
+            "pages": pages,
+        })
 
-        return Response(response_data)
+
+class BatchStatusView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, batch_id):
+        batch = get_object_or_404(OCRBatch, id=batch_id)
+
+        # Only owner or Admin can see a batch
+        if not (request.user.username == 'Admin' or batch.user_id == request.user.id):
+            return Response({"error": "Forbidden"}, status=403)
+
+        files = list(batch.files.order_by("id"))
+        counts = {choice: 0 for choice, _ in OCRFile.STATUS_CHOICES}
+        for f in files:
+            counts[f.status] += 1
+        finished = counts["done"] + counts["error"]
+
+        return Response({
+            "batch_id": batch.id,
+            "created_at": batch.created_at,
+            "total": len(files),
+            "counts": counts,
+            "progress": round(finished * 100 / len(files)) if files else 100,
+            "complete": finished == len(files),
+            "jobs": [_job_summary(f) for f in files],
+        })
+
+
+class OCRCacheStatsView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Only admin can access this endpoint
+        if request.user.username != 'Admin':
+            return Response({"error": "Forbidden"}, status=403)
+        return Response(cache_stats())
+
+
+class OCRTimingStatsView(APIView):
+    """
+    p50/p95/p99 (and mean) milliseconds per pipeline stage over the most
+    recent ``OCR_TIMING_WINDOW`` jobs, to see whether time goes to the OCR
+    service or to rendering. Admin sees every job, users their own.
+
+    Query params: ``date_from`` / ``date_to`` (YYYY-MM-DD, inclusive, on upload date).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        timings = OCRTiming.objects.all()
+        if request.user.username != 'Admin':
+            timings = timings.filter(ocr_file__user=request.user)
+        try:
+            if request.GET.get("date_from"):
+                timings = timings.filter(ocr_file__uploaded_at__gte=_start_of_day(request.GET["date_from"]))
+            if request.GET.get("date_to"):
+                timings = timings.filter(
+                    ocr_file__uploaded_at__lt=_start_of_day(request.GET["date_to"]) + timedelta(days=1)
+                )
+        except ValueError:
+            return Response({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+        window = getattr(settings, "OCR_TIMING_WINDOW", 1000)
+        timings = timings.order_by("-id")[:window]
+        return Response({"stages": stage_percentiles(timings)})
+
+
+class OCRAnalyticsView(APIView):
+    """
+    Upload analytics computed from the daily rollup (see ``analytics.py``).
+    Admin sees everyone (plus ``top_users``), users their own uploads.
+
+    Query params: ``bucket`` (day, week or month), ``date_from`` / ``date_to``
+    (YYYY-MM-DD, inclusive), ``top`` (number of top users, admin only).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        is_admin = request.user.username == 'Admin'
+        bucket = request.GET.get("bucket", "day")
+        if bucket not in ANALYTICS_BUCKETS:
+            return Response({"error": f"bucket must be one of {list(ANALYTICS_BUCKETS)}"}, status=400)
+        try:
+            date_from = date.fromisoformat(request.GET["date_from"]) if request.GET.get("date_from") else None
+            date_to = date.fromisoformat(request.GET["date_to"]) if request.GET.get("date_to") else None
+            top = min(int(request.GET.get("top", 10)), 100) if is_admin else 0
+        except ValueError:
+            return Response({"error": "Dates must be YYYY-MM-DD and top a number"}, status=400)
+
+        return Response(analytics_summary(
+            user=None if is_admin else request.user,
+            date_from=date_from,
+            date_to=date_to,
+            bucket=bucket,
+            top_users=top,
+        ))
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint (text exposition format). A plain Django view:
+    scrapers don't carry a JWT, so it is guarded by ``OCR_METRICS_TOKEN``, or
+    without one only open to ``INTERNAL_IPS``.
+    """
+    token = getattr(settings, "OCR_METRICS_TOKEN", None)
+    if token:
+        supplied = request.META.get("HTTP_AUTHORIZATION", "").removeprefix("Bearer ")
+        if not constant_time_compare(supplied, token):
+            return HttpResponse(status=401)
+    elif request.META.get("REMOTE_ADDR") not in getattr(settings, "INTERNAL_IPS", []):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Response field -> model columns it needs (for .only())
+HISTORY_FIELDS = {
+    "id": ["id"],
+    "file_name": ["file_name"],
+    "pdf_url": ["pdf_url"],
+    "txt_url": ["txt_url"],
+    "docx_url": ["docx_url"],
+    "pdf_size": ["pdf_size"],
+    "txt_size": ["txt_size"],
+    "docx_size": ["docx_size"],
+    "uploaded_at": ["uploaded_at"],
+    "status": ["status"],
+    "uploaded_by": ["user__username"],
+    # Per-stage timings (see ocr_api/timing.py); processing_time is the total in ms
+    "processing_time": ["timing__total_ms"],
+    "timing": [f"timing__{stage}_ms" for stage in TIMING_STAGES] + ["timing__cache_hit"],
+}
+
+
+def _start_of_day(value):
+    """Aware datetime for midnight of a YYYY-MM-DD string in the current timezone."""
+    return timezone.make_aware(datetime.combine(date.fromisoformat(value), datetime.min.time()))
 
 
 class OCRHistoryView(APIView):
+    """
+    Paginated upload history, newest first.
+
+    Query params: ``limit``, ``cursor`` (the ``next_cursor`` of the previous
+    page), ``fields`` (comma separated), ``status``, ``date_from`` / ``date_to``
+    (YYYY-MM-DD, inclusive).
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        is_admin = request.user.username == 'Admin'
+
         # Admin user (username 'Admin') sees all files
-        if request.user.username == 'Admin':
-            files = OCRFile.objects.all().order_by('-uploaded_at')
+        if is_admin:
+            files = OCRFile.objects.all()
         else:
-            files = OCRFile.objects.filter(user=request.user).order_by('-uploaded_at')
-        data = []
-
-        for f in files:
-            item = {
-                "file_name": f.file_name,
-                "pdf_url": f.pdf_url if f.pdf_url else None,
-                "txt_url": f.txt_url if f.txt_url else None,
-                "docx_url": f.docx_url if f.docx_url else None,
-                "pdf_size": f.pdf_size,
-                "txt_size": f.txt_size,
-                "docx_size": f.docx_size,
-                "uploaded_at": f.uploaded_at,
-                "status": f.status,
-            }
+            files = OCRFile.objects.filter(user=request.user)
+
+        fields = [name for name in HISTORY_FIELDS if name != "uploaded_by" or is_admin]
+        if request.GET.get("fields"):
+            requested = [name.strip() for name in request.GET["fields"].split(",")]
+            fields = [name for name in fields if name in requested]
+            if not fields:
+                return Response({"error": "No valid fields requested"}, status=400)
+
+        # Filters
+        if request.GET.get("status"):
+            files = files.filter(status=request.GET["status"])
+        try:
+            # Compare against day boundaries rather than __date so the index is usable
+            if request.GET.get("date_from"):
+                files = files.filter(uploaded_at__gte=_start_of_day(request.GET["date_from"]))
+            if request.GET.get("date_to"):
+                files = files.filter(
+                    uploaded_at__lt=_start_of_day(request.GET["date_to"]) + timedelta(days=1)
+                )
+        except ValueError:
+            return Response({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+        # Keyset pagination on (uploaded_at, id)
+        if request.GET.get("cursor"):
+            try:
+                last_uploaded_at, last_id = decode_datetime_cursor(request.GET["cursor"])
+            except InvalidCursor as exc:
+                return Response({"error": str(exc)}, status=400)
+            files = files.filter(
+                Q(uploaded_at__lt=last_uploaded_at) |
+                Q(uploaded_at=last_uploaded_at, id__lt=last_id)
+            )
 
-            # 🔒 Admin-only: include uploader username
-            if request.user.username == "Admin" and f.user:
-                item["uploaded_by"] = f.user.username
+        columns = {"id", "uploaded_at"}
+        for name in fields:
+            columns.update(HISTORY_FIELDS[name])
+        if "uploaded_by" in fields:
+            # One JOIN instead of a query per row for the uploader's username
+            files = files.select_related('user')
+        if "processing_time" in fields or "timing" in fields:
+            files = files.select_related('timing')
+        limit = parse_limit(request)
+        page = list(files.order_by('-uploaded_at', '-id').only(*columns)[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
 
+        data = []
+        for f in page:
+            item = {}
+            for name in fields:
+                if name == "uploaded_by":
+                    # 🔒 Admin-only: include uploader username
+                    if f.user:
+                        item["uploaded_by"] = f.user.username
+                elif name.endswith("_url"):
+                    item[name] = getattr(f, name) or None
+                elif name == "timing":
+                    # Jobs from before timings were recorded have no row
+                    item["timing"] = timing_dict(getattr(f, "timing", None))
+                elif name == "processing_time":
+                    timing = getattr(f, "timing", None)
+                    item["processing_time"] = timing.total_ms if timing else None
+                else:
+                    item[name] = getattr(f, name)
             data.append(item)
-        return Response(data)
+
+        next_cursor = encode_cursor(page[-1].uploaded_at, page[-1].id) if has_more else None
+        return Response({"results": data, "next_cursor": next_cursor})
 
 
 class OCRDeleteView(APIView):
@@ -228,18 +522,16 @@ class OCRDeleteView(APIView):
             # Only owner or Admin can delete
             if not (request.user.username == 'Admin' or ocr_file.user == request.user):
                 return Response({"error": "Forbidden"}, status=403)
-            # Delete local files if they exist
-            user_output_dir = Path(settings.MEDIA_ROOT) / "outputs" / str(ocr_file.user.id)
-            base_name = Path(filename).stem
-            
-            # Try to delete all possible generated files
-            for ext in ['pdf', 'txt', 'docx']:
-                file_path = user_output_dir / f"ocr_{base_name}.{ext}"
-                if file_path.exists():
-                    file_path.unlink()
+            # A worker may be writing this job's outputs right now
+            if ocr_file.status in ("pending", "processing"):
+                return Response({"error": "File is still being processed"}, status=409)
+            # Delete the canonical markdown and any rendered outputs
+            delete_artifacts(ocr_file)
             
-            # Delete the database entry
-            ocr_file.delete()
+            # Delete the database entry and its counts in one transaction
+            with transaction.atomic():
+                ocr_file.delete()
+                refresh_file_stats(ocr_file)
             return Response({"status": "deleted"})
         except OCRFile.DoesNotExist:
             return Response({"error": "File not found"}, status=404)
@@ -262,13 +554,104 @@ class OCRDownloadView(APIView):
         if not (request.user.username == 'Admin' or ocr_file.user == request.user):
             return Response({"error": "Forbidden"}, status=403)
 
-        base_name = Path(filename).stem
-        user_output_dir = Path(settings.MEDIA_ROOT) / "outputs" / str(ocr_file.user.id)
-        file_path = user_output_dir / f"ocr_{base_name}.{ext}"
+        if ext not in FORMATS:
+            return Response({"error": f"Unsupported format: {ext}"}, status=400)
+        if ocr_file.status != "done":
+            return Response({"error": "File is not ready yet"}, status=409)
 
-        if not file_path.exists():
+        # Renders PDF/DOCX on first request and keeps them in storage
+        name = ensure_artifact(ocr_file, ext)
+        if name is None:
             raise Http404("File not found")
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=file_path.name)
+        download_name = f"ocr_{Path(filename).stem}.{ext}"
+        # ETag/304, Range/206, proxy offload or a presigned redirect on S3
+        return serve_file(request, name, download_name, artifact_digest(ocr_file, ext, name))
+
+
+class OCRExportView(APIView):
+    """
+    Stream a ZIP of many OCR outputs.
+
+    JSON body, all optional: ``ids`` (OCRFile ids), ``date_from`` / ``date_to``
+    (YYYY-MM-DD, inclusive), ``formats`` (subset of pdf/txt/docx, default
+    all). Only finished jobs are exported. Admin exports span all users, with
+    one folder per user.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        is_admin = request.user.username == 'Admin'
+        files = OCRFile.objects.filter(status="done")
+        if not is_admin:
+            files = files.filter(user=request.user)
+
+        ids = request.data.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({"error": "ids must be a list of integers"}, status=400)
+            files = files.filter(id__in=ids)
+
+        try:
+            if request.data.get("date_from"):
+                files = files.filter(uploaded_at__gte=_start_of_day(request.data["date_from"]))
+            if request.data.get("date_to"):
+                files = files.filter(
+                    uploaded_at__lt=_start_of_day(request.data["date_to"]) + timedelta(days=1)
+                )
+        except (TypeError, ValueError):
+            return Response({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+        formats = request.data.get("formats") or FORMATS
+        if not isinstance(formats, list) or any(ext not in FORMATS for ext in formats):
+            return Response({"error": f"formats must be a subset of {FORMATS}"}, status=400)
+
+        max_files = getattr(settings, "OCR_EXPORT_MAX_FILES", 5000)
+        if files.count() > max_files:
+            return Response({"error": f"Select at most {max_files} files per export"}, status=400)
+
+        # iterator() streams rows from the cursor instead of caching the queryset
+        files = files.select_related('user').order_by('id').iterator(chunk_size=200)
+        entries = export_entries(files, formats, prefix_user=is_admin)
+        response = StreamingHttpResponse(zip_stream(entries), content_type="application/zip")
+        name = f"ocr-documents-{timezone.localdate().isoformat()}.zip"
+        response["Content-Disposition"] = f'attachment; filename="{name}"'
+        return response
+
+
+class OCRSearchView(APIView):
+    """
+    Full-text search over the extracted text of finished documents.
+
+    ``q`` is the query, ``limit`` the number of hits (default 20). Each hit
+    is one page, with its rank score and a snippet.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return Response({"error": "q is required"}, status=400)
+
+        is_admin = request.user.username == 'Admin'
+        files = OCRFile.objects.filter(status="done")
+        if not is_admin:
+            files = files.filter(user=request.user)
+
+        results = []
+        for page, score, snippet in search_pages(files, query, parse_limit(request, default=20, maximum=100)):
+            item = {
+                "job_id": page.ocr_file_id,
+                "file_name": page.ocr_file.file_name,
+                "page": page.page_number,
+                "score": round(float(score), 4),
+                "snippet": snippet,
+            }
+            if is_admin and page.ocr_file.user:
+                item["uploaded_by"] = page.ocr_file.user.username
+            results.append(item)
+        return Response({"results": results})
 
 
 class UserProfileView(APIView):
@@ -296,6 +679,14 @@ class UserProfileView(APIView):
 
 
 class AllUsersView(APIView):
+    """
+    Admin-only user list with upload stats, paginated by user id.
+
+    Stats are read from each user's ``UserUsage`` counters in the same
+    query; each user's documents are served separately by
+    ``UserDocumentsView``. The first page also carries a ``summary`` of
+    user counts.
+    """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
@@ -304,48 +695,99 @@ class AllUsersView(APIView):
         if request.user.username != 'Admin':
             return Response({"error": "Forbidden"}, status=403)
         
-        # Get all users except the admin
-        all_users = User.objects.all()
+        users = (
+            User.objects
+            .select_related('profile', 'usage')
+            .order_by('id')
+        )
+        if request.GET.get("cursor"):
+            try:
+                last_id = decode_id_cursor(request.GET["cursor"])
+            except InvalidCursor as exc:
+                return Response({"error": str(exc)}, status=400)
+            users = users.filter(id__gt=last_id)
+
+        limit = parse_limit(request, default=100)
+        page = list(users[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
         users_data = []
-        
-        for u in all_users:
+        for u in page:
             try:
                 profile = u.profile
                 role = profile.role
             except:
                 role = 'admin' if u.username == 'Admin' else 'user'
-            
-            # Get user's documents
-            user_files = OCRFile.objects.filter(user=u).order_by('-uploaded_at')
-            total_uploads = user_files.count()
-            total_size = sum([f.pdf_size + f.txt_size + f.docx_size for f in user_files])
-            
-            # Get last upload date
-            last_upload = None
-            if total_uploads > 0:
-                last_upload = user_files.first().uploaded_at.isoformat()
-            
+            usage = user_usage(u)
+
             users_data.append({
                 "username": u.username,
                 "email": u.email,
                 "role": role,
-                "total_uploads": total_uploads,
-                "total_size": total_size,
-                "last_upload": last_upload,
-                "documents": [
-                    {
-                        "file_name": f.file_name,
-                        "uploaded_at": f.uploaded_at,
-                        "status": f.status,
-                        "pdf_size": f.pdf_size,
-                        "txt_size": f.txt_size,
-                        "docx_size": f.docx_size
-                    }
-                    for f in user_files
-                ]
+                "total_uploads": usage.uploads,
+                # Disk usage, so compressed text counts at its stored size
+                "total_size": usage.total_bytes,
+                "last_upload": usage.last_upload_at.isoformat() if usage.last_upload_at else None,
+                "documents_url": request.build_absolute_uri(
+                    reverse("auth-user-documents", args=[u.username])
+                ),
             })
-        
-        return Response(users_data)
+
+        next_cursor = encode_cursor(page[-1].id) if has_more else None
+        data = {"results": users_data, "next_cursor": next_cursor}
+        if not request.GET.get("cursor"):
+            # Headline counts over all users, so clients needn't load every page
+            data["summary"] = User.objects.aggregate(
+                total=Count('id'),
+                admins=Count('id', filter=Q(profile__role='admin') | Q(username='Admin')),
+                active=Count('id', filter=Q(usage__uploads__gt=0)),
+            )
+        return Response(data)
+
+
+class UserDocumentsView(APIView):
+    """Admin-only, cursor-paginated list of one user's documents, newest first."""
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, username):
+        # Only admin can access this endpoint
+        if request.user.username != 'Admin':
+            return Response({"error": "Forbidden"}, status=403)
+
+        user = get_object_or_404(User, username=username)
+        files = OCRFile.objects.filter(user=user).only(
+            "id", "file_name", "uploaded_at", "status", "pdf_size", "txt_size", "docx_size"
+        )
+        if request.GET.get("cursor"):
+            try:
+                last_uploaded_at, last_id = decode_datetime_cursor(request.GET["cursor"])
+            except InvalidCursor as exc:
+                return Response({"error": str(exc)}, status=400)
+            files = files.filter(
+                Q(uploaded_at__lt=last_uploaded_at) |
+                Q(uploaded_at=last_uploaded_at, id__lt=last_id)
+            )
+
+        limit = parse_limit(request)
+        page = list(files.order_by('-uploaded_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        documents = [
+            {
+                "file_name": f.file_name,
+                "uploaded_at": f.uploaded_at,
+                "status": f.status,
+                "pdf_size": f.pdf_size,
+                "txt_size": f.txt_size,
+                "docx_size": f.docx_size
+            }
+            for f in page
+        ]
+        next_cursor = encode_cursor(page[-1].uploaded_at, page[-1].id) if has_more else None
+        return Response({"results": documents, "next_cursor": next_cursor})
 
 
 class SetSecurityQuestionsView(APIView):
@@ -484,6 +926,66 @@ def chat_users(request):
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_conversations(request):
+    """
+    Rooms the user belongs to, with last message preview and unread count,
+    most recently active first. One query: the preview comes from correlated
+    subqueries and the unread count from a conditional Count.
+    """
+    me = request.user
+    latest = (
+        Message.objects
+        .filter(room=OuterRef('pk'))
+        .exclude(deleted_for=me)
+        .order_by('-created_at', '-id')
+    )
+    rooms = (
+        ChatRoom.objects
+        .filter(Q(user1=me) | Q(user2=me))
+        .select_related('user1', 'user2')
+        .annotate(
+            last_message_id=Subquery(latest.values('id')[:1]),
+            last_message_sender=Subquery(latest.values('sender_id')[:1]),
+            last_message_content=Subquery(latest.values('content')[:1]),
+            last_message_at=Subquery(latest.values('created_at')[:1]),
+            unread_count=Count(
+                'messages',
+                filter=Q(messages__is_read=False) & ~Q(messages__sender=me),
+            ),
+        )
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
+    serializer = ConversationSerializer(rooms, many=True, context={"request": request})
+    return Response(serializer.data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_messages_read(request, room_id):
+    """
+    Mark the other member's messages in a room as read, up to and including
+    ``up_to`` (a message id; everything if omitted), in a single UPDATE.
+    """
+    room = get_object_or_404(ChatRoom, Q(user1=request.user) | Q(user2=request.user), id=room_id)
+
+    unread = Message.objects.filter(room=room, is_read=False).exclude(sender=request.user)
+    up_to = request.data.get("up_to")
+    if up_to is not None:
+        try:
+            up_to = int(up_to)
+        except (TypeError, ValueError):
+            return Response({"error": "up_to must be a message id"}, status=400)
+        unread = unread.filter(id__lte=up_to)
+
+    # update() skips auto_now, and ?since= syncs rely on updated_at
+    marked = unread.update(is_read=True, updated_at=timezone.now())
+    if marked:
+        broadcast_read_receipt(room.id, request.user.id, up_to)
+    return Response({"marked_read": marked})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def get_or_create_chat_room(request):
@@ -511,19 +1013,63 @@ def chat_messages(request, room_id):
     room = get_object_or_404(ChatRoom, id=room_id)
 
     if request.method == 'GET':
+        # ==========================
+        # GET → newest-first pages, or everything changed ?since=<id|timestamp>
+        # ==========================
         messages = (
             Message.objects
             .filter(room=room)
             .exclude(deleted_for=request.user)
-            .order_by('created_at')
+            .select_related('sender')
         )
+        server_time = timezone.now()
+
+        since = request.GET.get("since")
+        if since:
+            # New messages plus any edited/deleted since the client's last sync
+            if since.isdigit():
+                last = Message.objects.filter(room=room, id=int(since)).only("updated_at").first()
+                changed_after = last.updated_at if last else None
+                changed = Q(id__gt=int(since))
+            else:
+                changed_after = parse_datetime(since)
+                if changed_after is None:
+                    return Response({"error": "since must be a message id or ISO timestamp"}, status=400)
+                changed = Q(created_at__gt=changed_after)
+            if changed_after is not None:
+                changed |= Q(updated_at__gt=changed_after)
+
+            messages = messages.filter(changed).order_by('created_at', 'id')
+            serializer = MessageSerializer(messages, many=True, context={"request": request})
+            return Response({"results": serializer.data, "server_time": server_time})
+
+        if request.GET.get("cursor"):
+            try:
+                last_created_at, last_id = decode_datetime_cursor(request.GET["cursor"])
+            except InvalidCursor as exc:
+                return Response({"error": str(exc)}, status=400)
+            messages = messages.filter(
+                Q(created_at__lt=last_created_at) |
+                Q(created_at=last_created_at, id__lt=last_id)
+            )
 
+        limit = parse_limit(request, default=50, maximum=200)
+        page = list(messages.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        # Pages walk backwards in time, but each page reads oldest → newest
         serializer = MessageSerializer(
-            messages,
+            list(reversed(page)),
             many=True,
             context={"request": request}
         )
-        return Response(serializer.data)
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if has_more else None
+        return Response({
+            "results": serializer.data,
+            "next_cursor": next_cursor,
+            "server_time": server_time,
+        })
 
     # ==========================
     # POST → SEND MESSAGE
@@ -542,6 +1088,7 @@ def chat_messages(request, room_id):
             sender=request.user,
             content=content
         )
+        broadcast_chat_event("message.created", message)
 
         serializer = MessageSerializer(
             message,
@@ -564,7 +1111,8 @@ def delete_message_for_everyone(request, message_id):
 
     message.is_deleted_for_everyone = True
     message.content = "This message was deleted"
-    message.save(update_fields=["is_deleted_for_everyone", "content"])
+    message.save(update_fields=["is_deleted_for_everyone", "content", "updated_at"])
+    broadcast_chat_event("message.deleted", message)
 
     return Response({"status": "deleted_for_everyone"})
 
@@ -588,6 +1136,7 @@ def edit_message(request, message_id):
     message.is_edited = True
     message.edited_at = timezone.now()
     message.save()
+    broadcast_chat_event("message.updated", message)
 
     return Response(MessageSerializer(message).data)
 
@@ -0,0 +1,30 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError, AuthenticationFailed
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections with the same JWT access tokens as the
+    REST API. Browsers cannot set headers on WebSockets, so the token is
+    passed as ``?token=...``.
+    """
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get("query_string", b"").decode())
+        token = params.get("token", [None])[0]
+        scope["user"] = await get_user_for_token(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -2,6 +2,8 @@
 ASGI config for ocr_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django as usual; WebSocket connections are routed to the
+consumers in ``ocr_api.routing`` after JWT authentication.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ocr_project.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from ocr_api.routing import websocket_urlpatterns  # noqa: E402
+from ocr_api.jobs import resume_jobs  # noqa: E402
+from ocr_api.ws_auth import JWTAuthMiddleware  # noqa: E402
+
+# Restart jobs left pending or orphaned before this process started
+resume_jobs()
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
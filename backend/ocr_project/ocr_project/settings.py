@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import json
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +36,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # makes runserver serve ASGI (WebSockets)
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,10 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     'rest_framework',
+    'channels',
     'ocr_api',
 ]
 
 MIDDLEWARE = [
+    # Outermost, so request latency covers every other middleware
+    "ocr_api.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,6 +84,17 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ocr_project.wsgi.application'
+ASGI_APPLICATION = 'ocr_project.asgi.application'
+
+# Channel layer for WebSocket push (see ocr_api/realtime.py). The in-memory
+# layer only reaches clients of the same process; for several app nodes point
+# CHANNEL_LAYER_BACKEND at a shared layer such as channels_redis.core.RedisChannelLayer.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': os.getenv('CHANNEL_LAYER_BACKEND', 'channels.layers.InMemoryChannelLayer'),
+        'CONFIG': json.loads(os.getenv('CHANNEL_LAYER_CONFIG', '{}')),
+    },
+}
 
 
 # Database
@@ -154,4 +170,100 @@ STATIC_URL = 'static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# OCR background jobs (see ocr_api/jobs.py)
+# "database" polls pending OCRFile rows, so separate `manage.py run_ocr_worker`
+# processes can share the queue. "thread" runs jobs in an in-process pool only.
+OCR_JOB_QUEUE = os.getenv("OCR_JOB_QUEUE", "database")
+OCR_WORKER_THREADS = int(os.getenv("OCR_WORKER_THREADS", "2"))
+OCR_RUN_WORKERS_IN_PROCESS = True   # start worker threads inside web processes
+OCR_JOB_POLL_INTERVAL = 2.0         # seconds between queue polls when idle
+OCR_JOB_STALE_AFTER = 3600          # requeue jobs stuck in "processing" this long (seconds)
+
+# OCR result cache keyed by upload SHA-256 (see ocr_api/cache.py)
+OCR_CACHE_ENABLED = True
+OCR_CACHE_MAX_BYTES = 512 * 1024 * 1024   # evict LRU entries above this total
+OCR_CACHE_MAX_ENTRIES = 10000
+
+# Per-page parallel OCR for large PDFs (see ocr_api/pipeline.py)
+OCR_PARALLEL_PAGES = True
+OCR_PARALLEL_MIN_PAGES = 20       # PDFs with fewer pages go in a single request
+OCR_PAGE_CHUNK_SIZE = 10          # pages per ocr.process call
+OCR_MAX_CONCURRENT_CHUNKS = 4     # concurrent page-range requests per job
+OCR_CHUNK_RETRIES = 2             # retries per page range before the job fails (Mistral retries per request instead, see MISTRAL_CLIENT_OPTIONS)
+OCR_CHUNK_RETRY_DELAY = 1.0       # seconds, doubled on each retry
+
+# OCR engine (see ocr_api/backends.py). Use "ocr_api.backends.FakeOCRBackend"
+# for CI/load tests without the live service, or TesseractBackend offline.
+OCR_BACKEND = os.getenv("OCR_BACKEND", "ocr_api.backends.MistralBackend")
+OCR_BACKEND_OPTIONS = {}   # constructor kwargs, e.g. {"latency": 0.5, "pages": 3} for the fake
+
+# Uploads are hashed while the request body is parsed (see ocr_api/uploads.py).
+# Files above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to FILE_UPLOAD_TEMP_DIR,
+# which sits on the media volume so handing them to a job is a rename, not a copy.
+FILE_UPLOAD_HANDLERS = [
+    'ocr_api.uploads.HashingMemoryFileUploadHandler',
+    'ocr_api.uploads.HashingTemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'tmp')
+# What happens to the uploaded input once its job finishes:
+# "delete" (always), "on_error" (keep inputs of failed jobs), or "keep"
+OCR_UPLOAD_RETENTION = "delete"
+
+# Batch uploads (upload/batch/)
+OCR_BATCH_MAX_FILES = 500
+OCR_MAX_JOBS_PER_USER = 2   # concurrent jobs per user, on either queue (0 = no cap)
+
+# Downloads (see ocr_api/downloads.py). Set to "x-accel-redirect" (nginx) or
+# "x-sendfile" (Apache/lighttpd) to let the front proxy send artifact bytes;
+# nginx needs an `internal` location at OCR_DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT.
+OCR_DOWNLOAD_OFFLOAD = os.getenv("OCR_DOWNLOAD_OFFLOAD") or None
+OCR_DOWNLOAD_ACCEL_PREFIX = "/protected-media/"
+
+# Streamed ZIP exports (export/zip/, see ocr_api/exports.py)
+OCR_EXPORT_MAX_FILES = 5000   # documents per export
+
+# Store the canonical OCR text compressed: None, "gzip" or "zstd" (needs
+# zstandard). Downloads send it with Content-Encoding or decompress on the fly.
+OCR_TEXT_COMPRESSION = os.getenv("OCR_TEXT_COMPRESSION") or None
+
+# Where uploads and outputs live (see ocr_api/storage.py). The default is
+# MEDIA_ROOT on local disk; "ocr_api.storage.S3Storage" uses any S3-compatible
+# store (needs boto3), e.g. OCR_STORAGE_OPTIONS = {"bucket": "ocr",
+# "endpoint_url": "http://localhost:9000"} for a local MinIO. Unset S3 options
+# fall back to the OCR_S3_* environment variables.
+OCR_STORAGE = os.getenv("OCR_STORAGE", "ocr_api.storage.OCRFileSystemStorage")
+OCR_STORAGE_OPTIONS = {}
+# Redirect downloads from remote storage to short-lived presigned URLs
+# instead of streaming the bytes through Django
+OCR_STORAGE_PRESIGNED_DOWNLOADS = True
+
+# Mistral API client (see ocr_api/mistral_client.py). One pooled client per
+# process; 429/5xx/connection errors are retried with jittered exponential
+# backoff, and requests beyond `rate` per second (bursts up to `burst`) wait
+# for a token instead of failing. MISTRAL_SERVER_URL points it at a fake server.
+MISTRAL_CLIENT_OPTIONS = {
+    "timeout": 120.0,          # read timeout per request (seconds)
+    "connect_timeout": 10.0,
+    "max_connections": 20,
+    "max_retries": 4,
+    "backoff": 0.5,            # first retry waits up to this long, doubling each time
+    "backoff_max": 30.0,
+    "rate": 5.0,               # requests per second across all jobs in this process (0 = unlimited)
+    "burst": 10,
+}
+
+# Per-stage job timings (see ocr_api/timing.py); timings/stats/ reports
+# percentiles over this many most recent jobs
+OCR_TIMING_WINDOW = 1000
+
+# Prometheus metrics at /metrics (see ocr_api/metrics.py). With several
+# worker processes, point OCR_METRICS_DIR at a directory they share (cleared
+# on deploy) so a scrape sums all of them. Set OCR_METRICS_TOKEN to require
+# "Authorization: Bearer <token>" from the scraper; without a token only
+# addresses in INTERNAL_IPS may scrape.
+OCR_METRICS_DIR = os.getenv("OCR_METRICS_DIR") or None
+OCR_METRICS_FLUSH_INTERVAL = 10   # seconds between per-process snapshots
+OCR_METRICS_TOKEN = os.getenv("OCR_METRICS_TOKEN") or None
@@ -19,9 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from ocr_api.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/ocr/', include('ocr_api.urls')), # OCR app URLs
+    path('metrics', metrics, name='metrics'),  # Prometheus scrape endpoint
 ]
 
 if settings.DEBUG:
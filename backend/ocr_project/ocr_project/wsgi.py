@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ocr_project.settings')
 
 application = get_wsgi_application()
+
+from ocr_api.jobs import resume_jobs  # noqa: E402
+
+# Restart jobs left pending or orphaned before this process started
+resume_jobs()
@@ -28,11 +28,37 @@ import {
 
 // API Base URL
 const API_BASE_URL = "http://127.0.0.1:8000/api/ocr";
+const WS_BASE_URL = "ws://127.0.0.1:8000/ws";
+// History rows per request; more are loaded on demand
+const HISTORY_PAGE_SIZE = 100;
+// While the progress socket is open, still check the job this often (ms)
+const JOB_SAFETY_POLL_MS = 10000;
+
+// Server job stage -> upload queue status and progress (see UploadQueue.jsx)
+const jobProgress = job => {
+  switch (job.stage) {
+    case "queued":
+      return { status: "pending", progress: 30 };
+    case "uploading":
+      return { status: "processing", progress: 35 };
+    case "ocr":
+      return {
+        status: "processing",
+        progress: job.page_count ? 40 + Math.round((45 * job.pages_done) / job.page_count) : 40
+      };
+    case "rendering":
+      return { status: "generating", progress: 90 };
+    default:
+      return null;
+  }
+};
 
 function App() {
   const [activeTab, setActiveTab] = useState("upload");
   const [files, setFiles] = useState([]);
   const [history, setHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [loadingMoreHistory, setLoadingMoreHistory] = useState(false);
   const [searchTerm, setSearchTerm] = useState("");
   const [isDragging, setIsDragging] = useState(false);
   const [selectedFiles, setSelectedFiles] = useState([]);
@@ -103,25 +129,52 @@ function App() {
     window.location.href = '/login';
   };
 
-  const fetchHistory = async () => {
-    try {
-      const res = await axios.get(`${API_BASE_URL}/history/`);
-
-      const savedTimes = JSON.parse(
-        localStorage.getItem("processingTimes") || "{}"
-      );
+  const enrichHistory = files => {
+    const savedTimes = JSON.parse(
+      localStorage.getItem("processingTimes") || "{}"
+    );
 
-      const enrichedHistory = res.data.map(file => ({
-        ...file,
-        processing_time: savedTimes[file.file_name] || null
-      }));
+    // The server records processing_time per job; the locally measured
+    // time only fills in for jobs from before it did
+    return files.map(file => ({
+      ...file,
+      processing_time: file.processing_time ?? savedTimes[file.file_name] ?? null
+    }));
+  };
 
-      setHistory(enrichedHistory);
+  // History is paginated with a cursor: load the newest page, and further
+  // pages only when the user asks for them (loadMoreHistory)
+  const fetchHistory = async () => {
+    try {
+      const res = await axios.get(`${API_BASE_URL}/history/`, {
+        params: { limit: HISTORY_PAGE_SIZE }
+      });
+      setHistory(enrichHistory(res.data.results));
+      setHistoryCursor(res.data.next_cursor);
     } catch (err) {
       console.error("Failed to fetch history", err);
     }
   };
 
+  const loadMoreHistory = async () => {
+    if (!historyCursor || loadingMoreHistory) return;
+    setLoadingMoreHistory(true);
+    try {
+      const res = await axios.get(`${API_BASE_URL}/history/`, {
+        params: { limit: HISTORY_PAGE_SIZE, cursor: historyCursor }
+      });
+      setHistory(prev => {
+        const seen = new Set(prev.map(file => file.id));
+        return [...prev, ...enrichHistory(res.data.results).filter(file => !seen.has(file.id))];
+      });
+      setHistoryCursor(res.data.next_cursor);
+    } catch (err) {
+      console.error("Failed to load more history", err);
+    } finally {
+      setLoadingMoreHistory(false);
+    }
+  };
+
 
   // Drag & Drop
   const handleDragOver = e => {
@@ -168,6 +221,89 @@ function App() {
     setFiles(prev => [...prev, ...fileObjects]);
   };
 
+  const pollJob = async (jobId, index) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1500));
+      const res = await axios.get(`${API_BASE_URL}/jobs/${jobId}/`);
+      if (res.data.status === "done" || res.data.status === "error") {
+        return res.data;
+      }
+      updateJobProgress(res.data, index);
+    }
+  };
+
+  const updateJobProgress = (job, index) => {
+    const progress = jobProgress(job);
+    if (!progress) return;
+    setFiles(prev =>
+      prev.map((f, i) => (i === index ? { ...f, ...progress } : f))
+    );
+  };
+
+  // Follow a job over the progress WebSocket; falls back to polling if it
+  // can't connect, and polls slowly while open in case an event never arrives
+  const watchJob = (jobId, index) =>
+    new Promise((resolve, reject) => {
+      const token = localStorage.getItem("access");
+      const socket = new WebSocket(`${WS_BASE_URL}/jobs/?token=${token}`);
+      let settled = false;
+      let safetyPoll = null;
+
+      const settle = () => {
+        if (settled) return false;
+        settled = true;
+        clearInterval(safetyPoll);
+        socket.close();
+        return true;
+      };
+
+      const finish = async () => {
+        if (!settle()) return;
+        try {
+          // The status endpoint carries the output URLs and sizes
+          const res = await axios.get(`${API_BASE_URL}/jobs/${jobId}/`);
+          resolve(res.data);
+        } catch (err) {
+          reject(err);
+        }
+      };
+
+      const fallBackToPolling = () => {
+        if (!settle()) return;
+        pollJob(jobId, index).then(resolve, reject);
+      };
+
+      const handle = job => {
+        if (job.status === "done" || job.status === "error") {
+          finish();
+        } else {
+          updateJobProgress(job, index);
+        }
+      };
+
+      const refresh = async () => {
+        try {
+          const res = await axios.get(`${API_BASE_URL}/jobs/${jobId}/`);
+          if (!settled) handle(res.data);
+        } catch (err) {
+          console.error("Failed to refresh job status", err);
+        }
+      };
+
+      socket.onopen = () => {
+        // Catch up on anything that happened before the socket was open
+        refresh();
+        safetyPoll = setInterval(refresh, JOB_SAFETY_POLL_MS);
+      };
+      socket.onmessage = e => {
+        const { job } = JSON.parse(e.data);
+        if (job && job.job_id === jobId) handle(job);
+      };
+      socket.onerror = fallBackToPolling;
+      // Closed by the server (auth failure, restart) before the job finished
+      socket.onclose = fallBackToPolling;
+    });
+
   const uploadFile = async (fileObj, index) => {
   const startTime = Date.now(); // ⏱️ Start timer
 
@@ -205,18 +341,17 @@ function App() {
       }
     );
 
-    // UI stages
-    setFiles(prev =>
-      prev.map((f, i) =>
-        i === index ? { ...f, status: "processing", progress: 65 } : f
-      )
-    );
-    
+    // Upload returns a job id right away; follow the job until the worker is done
     setFiles(prev =>
       prev.map((f, i) =>
-        i === index ? { ...f, status: "generating", progress: 85 } : f
+        i === index ? { ...f, status: "processing", progress: 40 } : f
       )
     );
+
+    const job = await watchJob(response.data.job_id, index);
+    if (job.status !== "done") {
+      throw new Error(job.error || "OCR job failed");
+    }
     
     setFiles(prev =>
       prev.map((f, i) =>
@@ -238,7 +373,7 @@ function App() {
               ...f,
               status: "done",
               progress: 100,
-              result: response.data,
+              result: job,
               finishedAt: endTime,
               processingTime: processingTime
             }
@@ -429,6 +564,9 @@ function App() {
                 setFilterStatus={setFilterStatus}
                 sortBy={sortBy}
                 setSortBy={setSortBy}
+                hasMore={!!historyCursor}
+                loadingMore={loadingMoreHistory}
+                onLoadMore={loadMoreHistory}
                 theme={theme}
               />
             )}
@@ -444,6 +582,9 @@ function App() {
                 setSearchTerm={setSearchTerm}
                 sortBy={sortBy}
                 setSortBy={setSortBy}
+                hasMore={!!historyCursor}
+                loadingMore={loadingMoreHistory}
+                onLoadMore={loadMoreHistory}
                 theme={theme}
               />
             )}
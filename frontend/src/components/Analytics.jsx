@@ -1,4 +1,5 @@
-import React, { useState, useRef, useMemo } from 'react';
+import React, { useState, useRef, useMemo, useEffect } from 'react';
+import axios from 'axios';
 import html2canvas from 'html2canvas';
 import jsPDF from 'jspdf';
 import {
@@ -14,201 +15,85 @@ import {
   ResponsiveContainer
 } from 'recharts';
 
+const API_BASE = "http://127.0.0.1:8000/api/ocr";
+
+// YYYY-MM-DD in local time, the format the analytics API uses for days
+const toISODate = (date) => {
+  const pad = (n) => String(n).padStart(2, '0');
+  return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}`;
+};
+
+const fromISODate = (value) => {
+  const [year, month, day] = value.split('-').map(Number);
+  return new Date(year, month - 1, day);
+};
+
 const Analytics = ({ history, theme }) => {
   const [dateRange, setDateRange] = useState('7'); // 7, 30, 90, all
   const chartRef = useRef(null);
 
-  // Process data based on date range
+  // Daily counts are aggregated by the server (analytics/) from its rollup
+  // table instead of crunching the full history here
+  const [summary, setSummary] = useState(null);
+
+  useEffect(() => {
+    const params = { bucket: 'day' };
+    if (dateRange !== 'all') {
+      const from = new Date();
+      from.setDate(from.getDate() - Number(dateRange));
+      params.date_from = toISODate(from);
+    }
+    axios.get(`${API_BASE}/analytics/`, { params })
+      .then(res => setSummary(res.data))
+      .catch(err => console.error("Failed to fetch analytics", err));
+    // history changes whenever an upload finishes, so refetch with it
+  }, [dateRange, history]);
+
+  // One entry per day of the range, zero-filled where nothing was uploaded
   const chartData = useMemo(() => {
-    const now = new Date();
-    const ranges = {
-      '7': 7,
-      '30': 30,
-      '90': 90,
-      'all': Infinity
-    };
+    if (!summary) return [];
+    const byDay = {};
+    summary.series.forEach(item => { byDay[item.period] = item; });
 
-    const daysToShow = ranges[dateRange];
-    
-    // For 'all' time, we'll use the earliest upload date
+    const endDate = new Date();
+    endDate.setHours(0, 0, 0, 0);
     let startDate;
-    if (daysToShow === Infinity && history.length > 0) {
-      const earliestDate = new Date(
-        Math.min(...history.map(file => new Date(file.uploaded_at).getTime()))
-      );
-      startDate = new Date(earliestDate);
-      startDate.setHours(0, 0, 0, 0);
+    if (dateRange === 'all') {
+      if (summary.series.length === 0) return [];
+      startDate = fromISODate(summary.series[0].period);
     } else {
-      startDate = new Date(now);
-      startDate.setDate(startDate.getDate() - daysToShow);
-      startDate.setHours(0, 0, 0, 0);
+      startDate = new Date(endDate);
+      startDate.setDate(startDate.getDate() - Number(dateRange));
     }
 
-    const endDate = new Date(now);
-    endDate.setHours(0, 0, 0, 0);
-
-    // Create all dates in range with zero values
-    const allDates = {};
-    const currentDate = new Date(startDate);
-    
-    while (currentDate <= endDate) {
-      const dateKey = currentDate.toLocaleDateString('en-US', { 
-        month: 'short', 
-        day: 'numeric',
-        year: dateRange === 'all' ? 'numeric' : undefined
+    const days = [];
+    for (const current = new Date(startDate); current <= endDate; current.setDate(current.getDate() + 1)) {
+      const item = byDay[toISODate(current)];
+      days.push({
+        date: current.toLocaleDateString('en-US', {
+          month: 'short',
+          day: 'numeric',
+          year: dateRange === 'all' ? 'numeric' : undefined
+        }),
+        total: item ? item.total : 0,
+        success: item ? item.done : 0,
+        failed: item ? item.error : 0
       });
-      
-      allDates[dateKey] = {
-        date: dateKey,
-        total: 0,
-        success: 0,
-        failed: 0,
-        timestamp: currentDate.getTime()
-      };
-      
-      currentDate.setDate(currentDate.getDate() + 1);
-    }
-
-    // Filter and group history by date
-    history.forEach(file => {
-  const fileDate = new Date(file.uploaded_at);
-  fileDate.setHours(0, 0, 0, 0);
-
-  if (fileDate >= startDate && fileDate <= endDate) {
-    const dateKey = fileDate.toLocaleDateString('en-US', { 
-      month: 'short', 
-      day: 'numeric',
-      year: dateRange === 'all' ? 'numeric' : undefined
-    });
-
-    if (allDates[dateKey]) {
-      allDates[dateKey].total += 1;
-
-      if (file.status === 'done') {
-        allDates[dateKey].success += 1;
-      } else if (file.status === 'error') {
-        allDates[dateKey].failed += 1;
-      }
     }
-  }
-});
-
-
+    return days;
+  }, [summary, dateRange]);
 
-    // Convert to array and sort by timestamp
-    return Object.values(allDates)
-      .sort((a, b) => a.timestamp - b.timestamp)
-      .map(({ date, total, success, failed }) => ({
-        date,
-        total,
-        success,
-        failed
-      }));
-  }, [history, dateRange]);
-
-  // Calculate summary statistics
+  // Summary statistics for the selected range
   const stats = useMemo(() => {
-    const total = history.length;
-    const success = history.filter(f => f.status === 'done').length;
-    const failed = history.filter(f => f.status === 'error').length;
-    const successRate = total > 0 ? ((success / total) * 100).toFixed(1) : 0;
-
-    // Documents in selected range
-    const rangeTotal = chartData.reduce((sum, day) => sum + day.total, 0);
-    const rangeSuccess = chartData.reduce((sum, day) => sum + day.success, 0);
-    const rangeFailed = chartData.reduce((sum, day) => sum + day.failed, 0);
-
-    // Calculate average processing time (in seconds)
+    const status = summary ? summary.status : { total: 0, done: 0, error: 0 };
     return {
-      total,
-      success,
-      failed,
-      successRate,
-      rangeTotal,
-      rangeSuccess,
-      rangeFailed,
-    };
-  }, [history, chartData]);
-
-  // Processing time chart data
-  const processingTimeData = useMemo(() => {
-    const now = new Date();
-    const ranges = {
-      '7': 7,
-      '15': 15,
-      '30': 30,
-      '90': 90,
-      'all': Infinity
+      rangeTotal: status.total,
+      rangeSuccess: status.done,
+      rangeFailed: status.error,
+      successRate: status.total > 0 ? ((status.done / status.total) * 100).toFixed(1) : 0,
     };
-    
+  }, [summary]);
 
-    const daysToShow = ranges[dateRange];
-    
-    let startDate;
-    if (daysToShow === Infinity && history.length > 0) {
-      const earliestDate = new Date(
-        Math.min(...history.map(file => new Date(file.uploaded_at).getTime()))
-      );
-      startDate = new Date(earliestDate);
-      startDate.setHours(0, 0, 0, 0);
-    } else {
-      startDate = new Date(now);
-      startDate.setDate(startDate.getDate() - daysToShow);
-      startDate.setHours(0, 0, 0, 0);
-    }
-
-    const endDate = new Date(now);
-    endDate.setHours(0, 0, 0, 0);
-
-    // Create all dates with zero/null values
-    const allDates = {};
-    const currentDate = new Date(startDate);
-    
-    while (currentDate <= endDate) {
-      const dateKey = currentDate.toLocaleDateString('en-US', { 
-        month: 'short', 
-        day: 'numeric',
-        year: dateRange === 'all' ? 'numeric' : undefined
-      });
-      
-      allDates[dateKey] = {
-        date: dateKey,
-        avgTime: 0,
-        count: 0,
-        totalTime: 0,
-        timestamp: currentDate.getTime()
-      };
-      
-      currentDate.setDate(currentDate.getDate() + 1);
-    }
-
-    // Calculate average processing time per day
-    history.forEach(file => {
-      const fileDate = new Date(file.uploaded_at);
-      fileDate.setHours(0, 0, 0, 0);
-
-       if (fileDate >= startDate && fileDate <= endDate && typeof file.processing_time === "number" && file.processing_time > 0) {
-        const dateKey = fileDate.toLocaleDateString('en-US', { 
-          month: 'short', 
-          day: 'numeric',
-          year: dateRange === 'all' ? 'numeric' : undefined
-        });
-        
-        if (allDates[dateKey]) {
-          allDates[dateKey].totalTime += file.processing_time;
-          allDates[dateKey].count += 1;
-        }
-      }
-    });
-
-    // Calculate averages and convert to seconds
-    return Object.values(allDates)
-      .sort((a, b) => a.timestamp - b.timestamp)
-      .map(({ date, totalTime, count }) => ({
-        date,
-        avgTime: count > 0 ? parseFloat((totalTime / count / 1000).toFixed(2)) : 0
-      }));
-  }, [history, dateRange]);
   const documentCompletionData = useMemo(() => {
     return history
       .filter(
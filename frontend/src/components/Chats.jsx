@@ -2,6 +2,7 @@ import React, { useEffect, useState, useRef } from "react";
 import { Send, Search, MoreVertical, Trash2 } from "lucide-react";
 
 const API_BASE = "http://127.0.0.1:8000/api/ocr";
+const WS_BASE = "ws://127.0.0.1:8000/ws";
 
 const Chats = ({ theme }) => {
   const [users, setUsers] = useState([]);
@@ -36,6 +37,28 @@ const Chats = ({ theme }) => {
     scrollToBottom();
   }, [messages]);
 
+  // Live updates for the open room; sending still goes through the REST API
+  useEffect(() => {
+    if (!room) return;
+    const token = localStorage.getItem("access");
+    const socket = new WebSocket(`${WS_BASE}/chat/${room.id}/?token=${token}`);
+
+    socket.onmessage = (e) => {
+      const data = JSON.parse(e.data);
+      // message.created / message.updated / message.deleted carry the message;
+      // messages.read receipts don't, and messages don't show read state
+      if (!data.event?.startsWith("message.") || !data.message) return;
+      const { message } = data;
+      setMessages((prev) =>
+        prev.some((m) => m.id === message.id)
+          ? prev.map((m) => (m.id === message.id ? message : m))
+          : [...prev, message]
+      );
+    };
+
+    return () => socket.close();
+  }, [room]);
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
@@ -43,14 +66,33 @@ const Chats = ({ theme }) => {
   const fetchUsers = async () => {
     try {
       const token = localStorage.getItem('access');
-      const res = await fetch(`${API_BASE}/chat/users/`, {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
+      const headers = {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json'
+      };
+      const [usersRes, convRes] = await Promise.all([
+        fetch(`${API_BASE}/chat/users/`, { headers }),
+        fetch(`${API_BASE}/chat/conversations/`, { headers })
+      ]);
+      const data = await usersRes.json();
+      const conversations = await convRes.json();
+
+      // Last message preview and unread badge per contact
+      const byUser = {};
+      conversations.forEach((c) => {
+        byUser[c.other_user.id] = c;
       });
-      const data = await res.json();
-      const sorted = [...data].sort((a, b) => {
+      const merged = data.map((u) => {
+        const conv = byUser[u.id];
+        return {
+          ...u,
+          last_message: conv?.last_message?.content,
+          last_message_time: conv?.last_message?.created_at,
+          unread_count: conv?.unread_count || 0,
+        };
+      });
+
+      const sorted = [...merged].sort((a, b) => {
         if (!a.last_message_time) return 1;
         if (!b.last_message_time) return -1;
         return new Date(b.last_message_time) - new Date(a.last_message_time);
@@ -63,6 +105,21 @@ const Chats = ({ theme }) => {
     }
   };
 
+  const markRead = async (roomId, userId) => {
+    const token = localStorage.getItem('access');
+    await fetch(`${API_BASE}/chat/messages/${roomId}/read/`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({})
+    });
+    setUsers((prev) =>
+      prev.map((u) => (u.id === userId ? { ...u, unread_count: 0 } : u))
+    );
+  };
+
   const openChat = async (user) => {
     setSelectedUser(user);
     setMessages([]);
@@ -83,6 +140,7 @@ const Chats = ({ theme }) => {
 
       setRoom(data);
       await fetchMessages(data.id);
+      if (user.unread_count) markRead(data.id, user.id);
     } catch (err) {
       console.error("Failed to open chat", err);
     } finally {
@@ -100,7 +158,8 @@ const Chats = ({ theme }) => {
         }
       });
       const data = await res.json();
-      setMessages(data);
+      // Newest page of messages, oldest → newest within the page
+      setMessages(data.results);
     } catch (err) {
       console.error("Failed to load messages", err);
     }
@@ -122,8 +181,10 @@ const sendMessage = async () => {
 
     const data = await res.json();
 
-    // ✅ update messages
-    setMessages((prev) => [...prev, data]);
+    // ✅ update messages (the WebSocket may already have delivered it)
+    setMessages((prev) =>
+      prev.some((m) => m.id === data.id) ? prev : [...prev, data]
+    );
 
     // ✅ update users list (ONLY HERE)
     setUsers((prev) => {
@@ -591,6 +652,23 @@ const deleteForEveryone = async () => {
                       {u.username.charAt(0).toUpperCase()}
                     </div>
                     <div style={styles.userName}>{u.username}</div>
+                    {u.unread_count > 0 && (
+                      <span
+                        style={{
+                          marginLeft: 6,
+                          minWidth: 18,
+                          padding: "0 6px",
+                          borderRadius: 9,
+                          backgroundColor: "#3b82f6",
+                          color: "#fff",
+                          fontSize: 11,
+                          lineHeight: "18px",
+                          textAlign: "center",
+                        }}
+                      >
+                        {u.unread_count}
+                      </span>
+                    )}
                     <div style={styles.userStatus}>
                     {u.last_message || "No messages yet"}
                     </div>
@@ -1,6 +1,9 @@
 import React, { useState } from 'react';
-import JSZip from 'jszip';
+import axios from 'axios';
 import { saveAs } from 'file-saver';
+import LoadMoreButton from './LoadMoreButton';
+
+const API_BASE_URL = "http://127.0.0.1:8000/api/ocr";
 
 // Format completion time
 const formatCompletionTime = (ms) => {
@@ -24,6 +27,9 @@ const DocumentsGrid = ({
   setSearchTerm,
   sortBy,
   setSortBy,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
   theme
 }) => {
   const [selectedDocs, setSelectedDocs] = useState([]);
@@ -67,55 +73,19 @@ const DocumentsGrid = ({
     setIsDownloading(true);
 
     try {
-      const zip = new JSZip();
-
       // Get selected file objects
       const selectedFiles = filteredHistory.filter(f =>
       selectedDocs.includes(`${f.file_name}__${f.uploaded_by || "self"}`)
       );
 
-      // Fetch and add each file to ZIP
-      for (const fileObj of selectedFiles) {
-        const baseName = fileObj.file_name.replace(/\.[^/.]+$/, "");
-        
-        // Add PDF
-        if (fileObj.pdf_url) {
-          try {
-            const response = await fetch(fileObj.pdf_url);
-            const blob = await response.blob();
-            zip.file(`${baseName}.pdf`, blob);
-          } catch (err) {
-            console.error(`Failed to fetch PDF for ${baseName}`, err);
-          }
-        }
-
-        // Add TXT
-        if (fileObj.txt_url) {
-          try {
-            const response = await fetch(fileObj.txt_url);
-            const blob = await response.blob();
-            zip.file(`${baseName}.txt`, blob);
-          } catch (err) {
-            console.error(`Failed to fetch TXT for ${baseName}`, err);
-          }
-        }
-
-        // Add DOCX
-        if (fileObj.docx_url) {
-          try {
-            const response = await fetch(fileObj.docx_url);
-            const blob = await response.blob();
-            zip.file(`${baseName}.docx`, blob);
-          } catch (err) {
-            console.error(`Failed to fetch DOCX for ${baseName}`, err);
-          }
-        }
-      }
-
-      // Generate ZIP and download
-      const content = await zip.generateAsync({ type: "blob" });
+      // The server streams one ZIP with every output of the selected files
+      const response = await axios.post(
+        `${API_BASE_URL}/export/zip/`,
+        { ids: selectedFiles.map(f => f.id) },
+        { responseType: "blob" }
+      );
       const timestamp = new Date().toISOString().split('T')[0];
-      saveAs(content, `ocr-documents-${timestamp}.zip`);
+      saveAs(response.data, `ocr-documents-${timestamp}.zip`);
 
       // Clear selection
       setSelectedDocs([]);
@@ -629,6 +599,7 @@ const DocumentsGrid = ({
               {selectedDocs.length} selected
             </span>
           )}
+          <LoadMoreButton hasMore={hasMore} loading={loadingMore} onLoadMore={onLoadMore} theme={theme} />
         </div>
       </div>
     </div>
@@ -1,4 +1,5 @@
 import React, { useState } from 'react';
+import LoadMoreButton from './LoadMoreButton';
 
 const HistoryTable = ({
   history = [],
@@ -13,6 +14,9 @@ const HistoryTable = ({
   setFilterStatus,
   sortBy,
   setSortBy,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
   theme
 }) => {
   const [localSearch, setLocalSearch] = useState('');
@@ -267,8 +271,11 @@ const HistoryTable = ({
         </table>
       </div>
 
-      <div style={{ marginTop: '1rem', fontSize: '0.875rem', color: isDark ? '#888' : '#666' }}>
-        Showing {localFilteredHistory.length} of {(history || []).length} files
+      <div style={{ marginTop: '1rem', fontSize: '0.875rem', color: isDark ? '#888' : '#666', display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
+        <span>
+          Showing {localFilteredHistory.length} of {(history || []).length}{hasMore ? '+' : ''} files
+        </span>
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onLoadMore={onLoadMore} theme={theme} />
       </div>
     </div>
   );
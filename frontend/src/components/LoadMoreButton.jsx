@@ -0,0 +1,29 @@
+import React from 'react';
+
+// "Load more" for cursor-paginated lists; renders nothing once the last page is loaded
+const LoadMoreButton = ({ hasMore, loading, onLoadMore, theme }) => {
+  if (!hasMore) return null;
+  const isDark = theme === 'dark';
+
+  return (
+    <button
+      onClick={onLoadMore}
+      disabled={loading}
+      style={{
+        padding: '0.4rem 1rem',
+        backgroundColor: isDark ? '#2a2a2a' : '#f0f0f0',
+        color: isDark ? '#e0e0e0' : '#333',
+        border: `1px solid ${isDark ? '#444' : '#ddd'}`,
+        borderRadius: '4px',
+        cursor: loading ? 'default' : 'pointer',
+        fontSize: '0.8rem',
+        fontWeight: 500,
+        opacity: loading ? 0.6 : 1
+      }}
+    >
+      {loading ? 'Loading…' : 'Load more'}
+    </button>
+  );
+};
+
+export default LoadMoreButton;
@@ -1,18 +1,25 @@
 import React, { useEffect, useMemo, useState } from "react";
+import LoadMoreButton from "./LoadMoreButton";
 import axios from "axios";
 import { Search, Filter, Download, RefreshCw, AlertCircle, CheckCircle, Clock, Trash2, ChevronDown, ChevronRight, User } from "lucide-react";
 
 const API_BASE = "http://127.0.0.1:8000/api/ocr";
+const USERS_PAGE_SIZE = 100;
 
 export default function Users({ theme = 'light' }) {
   const [users, setUsers] = useState([]);
   const [expanded, setExpanded] = useState(null);
+  const [documents, setDocuments] = useState({});
   const [search, setSearch] = useState("");
   const [roleFilter, setRoleFilter] = useState("all");
   const [sortBy, setSortBy] = useState("username");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [refreshing, setRefreshing] = useState(false);
+  const [totals, setTotals] = useState({ uploads: 0, storage: 0 });
+  const [summary, setSummary] = useState({ total: 0, admins: 0, active: 0 });
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const isDark = theme === 'dark';
 
@@ -23,8 +30,18 @@ export default function Users({ theme = 'light' }) {
   const fetchUsers = async () => {
     try {
       setLoading(true);
-      const res = await axios.get(`${API_BASE}/auth/users/`);
-      setUsers(res.data);
+      // Users are paginated with a cursor: load the first page here and
+      // the rest on demand (loadMoreUsers)
+      const res = await axios.get(`${API_BASE}/auth/users/`, {
+        params: { limit: USERS_PAGE_SIZE }
+      });
+      setUsers(res.data.results);
+      setNextCursor(res.data.next_cursor);
+      setSummary(res.data.summary);
+      // Upload and storage totals are aggregated server-side
+      const analytics = await axios.get(`${API_BASE}/analytics/`, { params: { bucket: "month", top: 0 } });
+      setTotals({ uploads: analytics.data.status.total, storage: analytics.data.storage.total });
+      setDocuments({});
       setError(null);
     } catch (err) {
       setError("Failed to load users");
@@ -33,6 +50,43 @@ export default function Users({ theme = 'light' }) {
     }
   };
 
+  const loadMoreUsers = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const res = await axios.get(`${API_BASE}/auth/users/`, {
+        params: { limit: USERS_PAGE_SIZE, cursor: nextCursor }
+      });
+      setUsers(prev => [...prev, ...res.data.results]);
+      setNextCursor(res.data.next_cursor);
+    } catch (err) {
+      setError("Failed to load users");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Per-user documents are fetched lazily the first time a row is expanded
+  const fetchDocuments = async (username) => {
+    try {
+      const res = await axios.get(`${API_BASE}/auth/users/${username}/documents/`, {
+        params: { limit: 100 }
+      });
+      setDocuments(prev => ({ ...prev, [username]: res.data.results }));
+    } catch (err) {
+      setDocuments(prev => ({ ...prev, [username]: [] }));
+    }
+  };
+
+  const toggleExpanded = (username) => {
+    if (expanded === username) {
+      setExpanded(null);
+      return;
+    }
+    setExpanded(username);
+    if (!documents[username]) fetchDocuments(username);
+  };
+
   const handleRefresh = async () => {
     setRefreshing(true);
     await fetchUsers();
@@ -53,7 +107,7 @@ export default function Users({ theme = 'light' }) {
     const csv = [
       ["Username", "Email", "Role", "Total Uploads", "Storage Used", "Last Activity"].join(","),
       ...filteredUsers.map(u => 
-        [u.username, u.email, u.role, u.total_uploads, u.total_size || 0, u.documents[0]?.uploaded_at || "N/A"].join(",")
+        [u.username, u.email, u.role, u.total_uploads, u.total_size || 0, u.last_upload || "N/A"].join(",")
       )
     ].join("\n");
     
@@ -104,13 +158,14 @@ export default function Users({ theme = 'light' }) {
     return filtered;
   }, [users, search, roleFilter, sortBy]);
 
+  // Counted server-side, since only some pages of users may be loaded
   const stats = useMemo(() => ({
-    total: users.length,
-    admins: users.filter(u => u.role === "admin").length,
-    activeUsers: users.filter(u => u.total_uploads > 0).length,
-    totalUploads: users.reduce((a, b) => a + b.total_uploads, 0),
-    totalStorage: users.reduce((a, b) => a + (b.total_size || 0), 0),
-  }), [users]);
+    total: summary.total,
+    admins: summary.admins,
+    activeUsers: summary.active,
+    totalUploads: totals.uploads,
+    totalStorage: totals.storage,
+  }), [summary, totals]);
 
   /* ---------- Theme-aware Styles ---------- */
 
@@ -591,7 +646,7 @@ export default function Users({ theme = 'light' }) {
 
       {/* Results Info */}
       <div style={styles.resultsInfo}>
-        Showing <strong>{filteredUsers.length}</strong> of <strong>{users.length}</strong> users
+        Showing <strong>{filteredUsers.length}</strong> of <strong>{summary.total}</strong> users
       </div>
 
       {/* Users Table */}
@@ -614,7 +669,7 @@ export default function Users({ theme = 'light' }) {
           filteredUsers.map((u) => (
             <div key={u.username} style={styles.userRow}>
               <div
-                onClick={() => setExpanded(expanded === u.username ? null : u.username)}
+                onClick={() => toggleExpanded(u.username)}
                 style={styles.userRowMain}
                 onMouseEnter={(e) => e.currentTarget.style.backgroundColor = isDark ? "#374151" : "#f9fafb"}
                 onMouseLeave={(e) => e.currentTarget.style.backgroundColor = "transparent"}
@@ -625,9 +680,9 @@ export default function Users({ theme = 'light' }) {
                   </div>
                   <div>
                     <div style={styles.username}>{u.username}</div>
-                    {u.documents.length > 0 && (
+                    {u.last_upload && (
                       <div style={styles.lastActive}>
-                        Last active: {getRelativeTime(u.documents[0].uploaded_at)}
+                        Last active: {getRelativeTime(u.last_upload)}
                       </div>
                     )}
                   </div>
@@ -673,17 +728,21 @@ export default function Users({ theme = 'light' }) {
               {expanded === u.username && (
                 <div style={styles.expandedContent}>
                   <h4 style={styles.expandedTitle}>
-                    Documents ({u.documents.length})
+                    Documents ({u.total_uploads})
                   </h4>
                   
-                  {u.documents.length === 0 ? (
+                  {!documents[u.username] ? (
+                    <div style={styles.noDocuments}>
+                      <p style={{ marginTop: 8 }}>Loading documents...</p>
+                    </div>
+                  ) : documents[u.username].length === 0 ? (
                     <div style={styles.noDocuments}>
                       <AlertCircle size={24} color={isDark ? "#4b5563" : "#d1d5db"} />
                       <p style={{ marginTop: 8 }}>No documents uploaded yet</p>
                     </div>
                   ) : (
                     <div style={styles.documentGrid}>
-                      {u.documents.map((d, i) => (
+                      {documents[u.username].map((d, i) => (
                         <div key={i} style={styles.documentCard}>
                           <div style={styles.documentHeader}>
                             <div style={{ flex: 1 }}>
@@ -711,6 +770,10 @@ export default function Users({ theme = 'light' }) {
           ))
         )}
       </div>
+
+      <div style={{ display: "flex", justifyContent: "center", marginTop: 16 }}>
+        <LoadMoreButton hasMore={!!nextCursor} loading={loadingMore} onLoadMore={loadMoreUsers} theme={theme} />
+      </div>
     </div>
   );
 }